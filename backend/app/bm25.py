@@ -0,0 +1,111 @@
+"""
+BM25 keyword index over a document's passages.
+
+Retrieval that needs no embedding service: it works in local development
+without a GEMINI_API_KEY and keeps the AI Tutor's context selection working
+when the provider is down. It also backs the in-document search endpoint.
+
+The index is stored compactly in arrays. `terms` is the sorted vocabulary.
+The postings of term i are `passages[offsets[i]:offsets[i+1]]`, and the
+matching `freqs` hold the term's count in each of those passages. `lengths`
+has the token count of every passage. to_bytes() packs the arrays into one
+npz blob (stored in TutorLexicalIndex).
+"""
+import io
+import re
+from typing import Dict, List, NamedTuple
+
+import numpy as np
+
+K1 = 1.2
+B = 0.75
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have he her his how i if in into is it its
+of on or our she so that the their them then there these they this to was we were
+what when where which who why will with you your
+""".split())
+
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased words, without stopwords and single characters."""
+    return [w for w in _WORD.findall(text.lower()) if len(w) > 1 and w not in STOPWORDS]
+
+
+class Hit(NamedTuple):
+    ordinal: int  # Passage position within the document
+    score: float
+
+
+class BM25Index:
+    def __init__(self, terms: List[str], offsets: np.ndarray, passages: np.ndarray,
+                 freqs: np.ndarray, lengths: np.ndarray):
+        self.terms = terms
+        self.offsets = offsets
+        self.passages = passages
+        self.freqs = freqs
+        self.lengths = lengths
+        self._term_ids: Dict[str, int] = {term: i for i, term in enumerate(terms)}
+        self._avg_length = float(lengths.mean()) if lengths.size else 0.0
+
+    @classmethod
+    def build(cls, passages: List[str]) -> "BM25Index":
+        postings: Dict[str, Dict[int, int]] = {}
+        lengths = []
+        for ordinal, passage in enumerate(passages):
+            tokens = tokenize(passage)
+            lengths.append(len(tokens))
+            for token in tokens:
+                counts = postings.setdefault(token, {})
+                counts[ordinal] = counts.get(ordinal, 0) + 1
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(postings[t]) for t in terms])
+        ordinals = np.fromiter((o for t in terms for o in postings[t]), dtype=np.uint32, count=int(offsets[-1]))
+        freqs = np.fromiter((min(c, 65535) for t in terms for c in postings[t].values()),
+                            dtype=np.uint16, count=int(offsets[-1]))
+        return cls(terms, offsets, ordinals, freqs, np.array(lengths, dtype=np.uint32))
+
+    def to_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            terms=np.frombuffer("\n".join(self.terms).encode(), dtype=np.uint8),
+            offsets=self.offsets, passages=self.passages, freqs=self.freqs, lengths=self.lengths,
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "BM25Index":
+        with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+            vocabulary = arrays["terms"].tobytes().decode()
+            return cls(
+                vocabulary.split("\n") if vocabulary else [],
+                arrays["offsets"], arrays["passages"], arrays["freqs"], arrays["lengths"],
+            )
+
+    def search(self, query: str, k: int) -> List[Hit]:
+        """The k passages scoring highest for the query, best first; passages without any query term are left out."""
+        count = self.lengths.size
+        scores = np.zeros(count, dtype=np.float64)
+        for token in set(tokenize(query)):
+            term_id = self._term_ids.get(token)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            passages = self.passages[start:end]
+            tf = self.freqs[start:end].astype(np.float64)
+            idf = np.log(1 + (count - passages.size + 0.5) / (passages.size + 0.5))
+            norm = K1 * (1 - B + B * self.lengths[passages] / (self._avg_length or 1.0))
+            scores[passages] += idf * tf * (K1 + 1) / (tf + norm)
+
+        matched = np.flatnonzero(scores)
+        if matched.size == 0:
+            return []
+        k = min(k, matched.size)
+        top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [Hit(int(i), float(scores[i])) for i in top]
@@ -0,0 +1,123 @@
+"""
+Persistent cache of generated quizzes and flashcard sets.
+
+Students press "Generate" again and again on the same document, and many of
+them upload the same shared textbooks. Each such request used to call Gemini
+from scratch. Generated items are now stored in the database (so every worker
+shares them), keyed by (content hash, generator kind, prompt version, model).
+Changing a prompt or the model therefore never serves stale output; bump the
+prompt version when a prompt changes.
+
+Entries expire GENERATION_CACHE_TTL_S after they were generated. When there are
+more than GENERATION_CACHE_MAX_ENTRIES entries, the least recently used ones
+are evicted. A caller asking for a fresh variant skips the lookup, and the new
+result replaces the cached one.
+"""
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, List, Optional
+
+from sqlalchemy import delete, func
+from sqlmodel import Session, select
+
+from .schemas import GenerationCacheEntry
+
+logger = logging.getLogger(__name__)
+
+GENERATION_CACHE_TTL_S = int(os.getenv("GENERATION_CACHE_TTL_S", str(7 * 24 * 3600)))
+GENERATION_CACHE_MAX_ENTRIES = int(os.getenv("GENERATION_CACHE_MAX_ENTRIES", "5000"))
+
+
+def _utcnow() -> datetime:
+    # Naive UTC, as the timestamps come back from the database
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def _naive(timestamp: datetime) -> datetime:
+    return timestamp.astimezone(timezone.utc).replace(tzinfo=None) if timestamp.tzinfo else timestamp
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class GenerationCache:
+    def __init__(self, ttl_s: int = GENERATION_CACHE_TTL_S, max_entries: int = GENERATION_CACHE_MAX_ENTRIES):
+        self.ttl = timedelta(seconds=ttl_s)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > timedelta(0)
+
+    @staticmethod
+    def key(kind: str, content: str, prompt_version: int, model: str) -> str:
+        return hashlib.sha256(f"{kind}\0{prompt_version}\0{model}\0{content_hash(content)}".encode()).hexdigest()
+
+    def get(self, session: Session, key: str) -> Optional[List[Any]]:
+        """The cached items for a key, or None on a miss (expired entries are removed)."""
+        if not self.enabled:
+            return None
+        entry = session.get(GenerationCacheEntry, key)
+        now = _utcnow()
+        if entry is not None and _naive(entry.created_at) + self.ttl <= now:
+            session.delete(entry)
+            session.commit()
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        entry.hits += 1
+        entry.last_used_at = now
+        session.add(entry)
+        session.commit()
+        self.hits += 1
+        return json.loads(entry.payload)
+
+    def put(self, session: Session, key: str, *, kind: str, content: str, prompt_version: int,
+            model: str, items: List[Any]):
+        """Store freshly generated items (replacing any earlier variant), then evict expired and surplus entries."""
+        if not self.enabled:
+            return
+        now = _utcnow()
+        try:
+            session.merge(GenerationCacheEntry(
+                key=key, kind=kind, model=model, prompt_version=prompt_version,
+                content_hash=content_hash(content), payload=json.dumps(items),
+                created_at=now, last_used_at=now,
+            ))
+            session.commit()
+            self._evict(session, now)
+        except Exception:
+            # Another worker stored the same key first; the cache is best-effort
+            logger.exception("Could not store generated content in the cache")
+            session.rollback()
+
+    def _evict(self, session: Session, now: datetime):
+        session.exec(delete(GenerationCacheEntry).where(GenerationCacheEntry.created_at <= now - self.ttl))
+        count = session.exec(select(func.count()).select_from(GenerationCacheEntry)).one()
+        if count > self.max_entries:
+            oldest = session.exec(
+                select(GenerationCacheEntry.key)
+                .order_by(GenerationCacheEntry.last_used_at)
+                .limit(count - self.max_entries)
+            ).all()
+            session.exec(delete(GenerationCacheEntry).where(GenerationCacheEntry.key.in_(oldest)))
+        session.commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "ttl_s": int(self.ttl.total_seconds()),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Global cache instance
+generation_cache = GenerationCache()
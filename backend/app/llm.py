@@ -0,0 +1,120 @@
+"""
+Async Gemini calls shared by the tutor and flashcard routes.
+
+The routes are async, so the SDK's synchronous surface froze the whole worker
+for the seconds each generation takes. Every call here goes through client.aio
+instead, with a deadline of LLM_TIMEOUT_S (504 when it passes). Given the
+incoming Request, the call is also cancelled as soon as the HTTP client
+disconnects (499), so abandoned generations stop using a provider connection.
+
+Streamed replies come from chat_stream(); read them with next_chunk(), which
+applies the same deadline to every chunk. create_cache() registers a long prompt
+prefix once, so later chats can reference it, and count_tokens() sizes it first
+(see app/prompt_cache.py).
+"""
+import asyncio
+import logging
+import os
+from typing import Any, AsyncIterator, Awaitable, List, Optional
+
+from fastapi import HTTPException, Request
+from google import genai
+
+logger = logging.getLogger(__name__)
+
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "60"))
+# How often an in-flight call checks whether its HTTP client is still there
+DISCONNECT_POLL_S = 0.5
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "gemini-embedding-001")
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "768"))
+EMBEDDING_BATCH = 100  # Texts per embed_content request
+
+client: Optional[genai.Client] = None
+if GEMINI_API_KEY:
+    client = genai.Client(api_key=GEMINI_API_KEY)
+else:
+    logger.warning("GEMINI_API_KEY not set. AI Tutor features will not work.")
+
+
+def is_configured() -> bool:
+    return client is not None
+
+async def _wait_for_disconnect(request: Request):
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_S)
+
+async def call(coro: Awaitable, request: Optional[Request] = None, timeout: Optional[float] = None) -> Any:
+    """Await an SDK call; cancel it on timeout or when the request's client disconnects."""
+    timeout = LLM_TIMEOUT_S if timeout is None else timeout
+    task = asyncio.ensure_future(coro)
+    waiters = {task}
+    watcher = None
+    if request is not None:
+        watcher = asyncio.ensure_future(_wait_for_disconnect(request))
+        waiters.add(watcher)
+    try:
+        done, _ = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for waiter in waiters:
+            waiter.cancel()  # No-op when already finished
+
+    if task in done:
+        return task.result()
+    if watcher is not None and watcher in done:
+        logger.info("Client disconnected; cancelled the AI call")
+        raise HTTPException(status_code=499, detail="Client closed request")
+    raise HTTPException(status_code=504, detail=f"The AI provider did not respond within {timeout:.0f}s")
+
+async def generate(contents: Any, *, model: str, config: Optional[dict] = None,
+                   request: Optional[Request] = None, timeout: Optional[float] = None):
+    return await call(client.aio.models.generate_content(model=model, contents=contents, config=config),
+                      request, timeout)
+
+async def chat(message: str, *, model: str, history: List[dict], config: Optional[dict] = None,
+               request: Optional[Request] = None, timeout: Optional[float] = None):
+    conversation = client.aio.chats.create(model=model, history=history, config=config)
+    return await call(conversation.send_message(message), request, timeout)
+
+async def upload_file(path: str, mime_type: str, request: Optional[Request] = None, timeout: Optional[float] = None):
+    return await call(client.aio.files.upload(file=path, config={"mime_type": mime_type}), request, timeout)
+
+async def chat_stream(message: str, *, model: str, history: List[dict], config: Optional[dict] = None,
+                      request: Optional[Request] = None, timeout: Optional[float] = None) -> AsyncIterator:
+    """Start a streamed chat reply; returns the async iterator of response chunks."""
+    conversation = client.aio.chats.create(model=model, history=history, config=config)
+    return await call(conversation.send_message_stream(message), request, timeout)
+
+async def next_chunk(stream: AsyncIterator, request: Optional[Request] = None, timeout: Optional[float] = None):
+    """The next chunk of a stream, or None once it has ended."""
+    return await call(anext(stream, None), request, timeout)
+
+async def embed(texts: List[str], *, task_type: str,
+                request: Optional[Request] = None, timeout: Optional[float] = None) -> List[List[float]]:
+    """Embedding vectors for texts; task_type is "RETRIEVAL_DOCUMENT" for passages, "RETRIEVAL_QUERY" for questions."""
+    vectors = []
+    for start in range(0, len(texts), EMBEDDING_BATCH):
+        response = await call(client.aio.models.embed_content(
+            model=EMBEDDING_MODEL,
+            contents=texts[start:start + EMBEDDING_BATCH],
+            config={"task_type": task_type, "output_dimensionality": EMBEDDING_DIMENSIONS},
+        ), request, timeout)
+        vectors.extend(embedding.values for embedding in response.embeddings)
+    return vectors
+
+async def count_tokens(contents: Any, *, model: str, timeout: Optional[float] = None) -> int:
+    response = await call(client.aio.models.count_tokens(model=model, contents=contents), timeout=timeout)
+    return response.total_tokens
+
+async def create_cache(*, model: str, system_instruction: str, contents: List[dict], ttl_s: int,
+                       display_name: Optional[str] = None, timeout: Optional[float] = None):
+    """Register a prompt prefix with the provider; pass {"cached_content": cache.name} as a chat's config to use it."""
+    return await call(client.aio.caches.create(model=model, config={
+        "system_instruction": system_instruction,
+        "contents": contents,
+        "ttl": f"{ttl_s}s",
+        "display_name": display_name,
+    }), timeout=timeout)
+
+async def delete_cache(name: str, timeout: Optional[float] = None):
+    return await call(client.aio.caches.delete(name=name), timeout=timeout)
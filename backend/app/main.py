@@ -32,6 +32,12 @@ from .schemas import (
 
 from .routes import community, websocket, flashcards, tutor, notes, reviews, subjects, users, system, subscriptions, upload, data_entry
 from .dependencies import get_current_user, settings, create_access_token
+from .message_ingest import ingest_queue
+from .message_cache import message_cache
+from .prompt_cache import prompt_cache
+from .pdf_extract import pdf_extractor
+from .websocket_manager import manager, channel_topic
+from .pubsub import create_broker
 
 # --- Password Utility Functions ---
 from .utils import verify_password, get_password_hash
@@ -40,6 +46,33 @@ from .utils import verify_password, get_password_hash
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# --- Cross-worker real-time wiring ---
+# New messages are appended to the same channel's cache on the other workers;
+# edits, deletes and votes invalidate it there
+message_cache.add_append_hook(
+    lambda channel_id, entry: manager.forward_soon({"kind": "cache_append", "channel_id": channel_id, "entry": entry})
+)
+manager.add_event_handler(
+    "cache_append", lambda event: message_cache.append(event["channel_id"], event["entry"], propagate=False)
+)
+message_cache.add_invalidation_hook(
+    lambda channel_id: manager.forward_soon({"kind": "cache_invalidate", "channel_id": channel_id})
+)
+manager.add_event_handler(
+    "cache_invalidate", lambda event: message_cache.invalidate(event["channel_id"], propagate=False)
+)
+
+# Write-behind messages that could not be persisted were already broadcast; withdraw them
+async def withdraw_dropped_messages(items):
+    for item in items:
+        message_cache.remove(item["channel_id"], [item["id"]])
+        await manager.publish(
+            channel_topic(item["channel_id"]),
+            {"type": "message_deleted", "id": item["id"], "channel_id": item["channel_id"]},
+        )
+
+ingest_queue.add_drop_hook(withdraw_dropped_messages)
+
 # --- Lifespan Context Manager (replaces deprecated @app.on_event) ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -128,11 +161,29 @@ async def lifespan(app: FastAPI):
                 session.commit()
                 logger.info(f"Backfilled {added} existing user(s) into The Workshop.")
 
+    # Uploads whose processing died with a previous run would otherwise stay "processing" forever
+    with Session(engine) as session:
+        stale_uploads = tutor.fail_stale_uploads(session)
+    if stale_uploads:
+        logger.warning(f"Marked {stale_uploads} interrupted tutor upload(s) as failed.")
+
+    # Real-time events reach sockets held by other workers through the pub/sub broker
+    await manager.start(create_broker())
+    logger.info(f"Real-time broker: {type(manager.broker).__name__}")
+
+    if ingest_queue.enabled:
+        await ingest_queue.start()  # Refuses databases without a shared ID sequence; reserves the first IDs
+
     logger.info("All routers loaded. Application ready.")
     
     yield  # Application runs
     
     # --- SHUTDOWN ---
+    if ingest_queue.enabled:
+        await ingest_queue.stop()  # Persist any messages still buffered
+    await manager.stop()
+    await prompt_cache.close()
+    pdf_extractor.shutdown()
     logger.info("Application shutdown.")
 
 
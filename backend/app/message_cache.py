@@ -0,0 +1,167 @@
+"""
+In-process cache of the most recent messages per channel.
+
+get_channel_messages is dominated by the "latest page" of a few busy channels.
+Each channel gets a ring buffer of its newest MESSAGE_CACHE_SIZE serialized
+messages (including every user's vote, so the per-caller user_vote can be
+computed without a query). The buffer is filled from the first database read
+and then kept current by the create / edit / delete / vote handlers.
+
+Writes made by other worker processes are not visible here. New messages are
+reported through append hooks, so a cross-worker transport can forward the entry
+and call append(..., propagate=False) on the receiving side; edits, deletes and
+votes are reported through invalidation hooks, answered with
+invalidate(..., propagate=False). Busy channels therefore stay warm everywhere.
+"""
+import os
+import logging
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_CACHE_SIZE = int(os.getenv("MESSAGE_CACHE_SIZE", "100"))
+
+
+class ChannelMessageCache:
+    """Ring buffer of the newest serialized messages for each channel."""
+
+    def __init__(self, capacity: int = MESSAGE_CACHE_SIZE):
+        self.capacity = capacity
+        # channel_id -> entries in ascending timestamp order (oldest first)
+        self._buffers: Dict[str, Deque[dict]] = {}
+        # channel_ids whose buffer holds every message in the channel
+        self._complete: set = set()
+        self._invalidation_hooks: List[Callable[[str], None]] = []
+        self._append_hooks: List[Callable[[str, dict], None]] = []
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    # --- Reads ---
+
+    def get_latest(self, channel_id: str, limit: int) -> Optional[List[dict]]:
+        """Return the newest `limit` entries (oldest first), or None on a miss."""
+        buffer = self._buffers.get(channel_id)
+        if buffer is None or limit > self.capacity or (
+            len(buffer) < limit and channel_id not in self._complete
+        ):
+            self.misses += 1
+            return None
+        self.hits += 1
+        entries = list(buffer)
+        return entries[-limit:] if limit else []
+
+    def fill(self, channel_id: str, entries: List[dict], complete: bool):
+        """
+        Warm a channel from a database read of its newest messages (oldest first).
+        `complete` means the read returned every message in the channel.
+        """
+        if not self.enabled or (len(entries) < self.capacity and not complete):
+            return
+        self._buffers[channel_id] = deque(entries[-self.capacity:], maxlen=self.capacity)
+        if complete and len(entries) <= self.capacity:
+            self._complete.add(channel_id)
+        else:
+            self._complete.discard(channel_id)
+
+    # --- Writes (called by the message handlers after a successful change) ---
+
+    def append(self, channel_id: str, entry: dict, propagate: bool = True):
+        buffer = self._buffers.get(channel_id)
+        # A worker that loaded the channel after the insert already has the message
+        if buffer is not None and self._find(channel_id, entry["id"]) is None:
+            if len(buffer) == self.capacity:
+                # Oldest message falls out, so the buffer is no longer the whole channel
+                self._complete.discard(channel_id)
+            buffer.append(entry)
+        if propagate:
+            for hook in self._append_hooks:
+                try:
+                    hook(channel_id, entry)
+                except Exception:
+                    logger.exception("Message cache append hook failed")
+
+    def edit(self, channel_id: str, message_id: int, content: str):
+        entry = self._find(channel_id, message_id)
+        if entry is not None:
+            entry["content"] = content
+        self._notify(channel_id)
+
+    def vote(self, channel_id: str, message_id: int, user_id: str, value: int):
+        entry = self._find(channel_id, message_id)
+        if entry is not None:
+            if value == 0:
+                entry["votes"].pop(user_id, None)
+            else:
+                entry["votes"][user_id] = value
+            entry["score"] = sum(entry["votes"].values())
+        self._notify(channel_id)
+
+    def remove(self, channel_id: str, message_ids: List[int]):
+        buffer = self._buffers.get(channel_id)
+        if buffer is not None:
+            doomed = set(message_ids)
+            if channel_id in self._complete:
+                self._buffers[channel_id] = deque(
+                    (e for e in buffer if e["id"] not in doomed), maxlen=self.capacity
+                )
+            elif any(e["id"] in doomed for e in buffer):
+                # An older message we never loaded would have to slide in; reload instead
+                self._drop(channel_id)
+        self._notify(channel_id)
+
+    def invalidate(self, channel_id: str, propagate: bool = True):
+        """Forget a channel; the next read goes to the database and re-warms it."""
+        self._drop(channel_id)
+        if propagate:
+            self._notify(channel_id)
+
+    # --- Cross-worker invalidation ---
+
+    def add_invalidation_hook(self, hook: Callable[[str], None]):
+        """Register a callback invoked with channel_id after a local edit, delete or vote."""
+        self._invalidation_hooks.append(hook)
+
+    def add_append_hook(self, hook: Callable[[str, dict], None]):
+        """Register a callback invoked with (channel_id, entry) after a local append."""
+        self._append_hooks.append(hook)
+
+    def _notify(self, channel_id: str):
+        for hook in self._invalidation_hooks:
+            try:
+                hook(channel_id)
+            except Exception:
+                logger.exception("Message cache invalidation hook failed")
+
+    # --- Helpers ---
+
+    def _drop(self, channel_id: str):
+        if self._buffers.pop(channel_id, None) is not None:
+            self.invalidations += 1
+        self._complete.discard(channel_id)
+
+    def _find(self, channel_id: str, message_id: int) -> Optional[dict]:
+        buffer = self._buffers.get(channel_id)
+        if buffer is None:
+            return None
+        return next((e for e in buffer if e["id"] == message_id), None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "capacity": self.capacity,
+            "channels": len(self._buffers),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+# Global cache instance
+message_cache = ChannelMessageCache()
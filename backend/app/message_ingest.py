@@ -0,0 +1,315 @@
+"""
+Write-behind ingestion pipeline for channel messages.
+
+When enabled (MESSAGE_INGEST_BATCHING=true), create_message / create_reply assign
+the message ID up front, broadcast and acknowledge immediately, and leave the
+database work to a background flusher. The flusher collects everything submitted
+in the last few milliseconds and persists it in one transaction: message rows,
+per-user total_messages increments, parent reply_count increments and a single
+badge check per affected user.
+
+A batch that fails is retried with exponential backoff, then row by row. Messages
+that still cannot be written were already acknowledged and broadcast, so they are
+appended to a dead-letter file (MESSAGE_INGEST_DEAD_LETTER, one JSON object per
+line) for recovery and handed to the drop hooks, which withdraw them from clients.
+"""
+import os
+import json
+import asyncio
+import logging
+import threading
+from collections import Counter, deque
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set
+
+from sqlalchemy import text, update
+from sqlmodel import Session, select, func
+
+from .database import engine
+from .schemas import Message, User
+
+logger = logging.getLogger(__name__)
+
+INGEST_ENABLED = os.getenv("MESSAGE_INGEST_BATCHING", "false").lower() == "true"
+FLUSH_INTERVAL_MS = int(os.getenv("MESSAGE_INGEST_FLUSH_MS", "5"))
+MAX_BATCH_SIZE = int(os.getenv("MESSAGE_INGEST_MAX_BATCH", "500"))
+MAX_RETRIES = int(os.getenv("MESSAGE_INGEST_MAX_RETRIES", "3"))
+RETRY_BACKOFF_MS = int(os.getenv("MESSAGE_INGEST_RETRY_BACKOFF_MS", "200"))
+DEAD_LETTER_PATH = os.getenv("MESSAGE_INGEST_DEAD_LETTER", "failed_messages.jsonl")
+ID_BLOCK_SIZE = 100
+
+
+class MessageIdAllocator:
+    """
+    Hands out Message primary keys before the row is inserted.
+
+    IDs are reserved in blocks on a worker thread, and the flusher tops the pool
+    up whenever it runs low, so submit() never waits on the database in the
+    common case. On PostgreSQL blocks come from the table's serial sequence, so
+    several workers can allocate safely. Other dialects seed from MAX(id) once and
+    count up in-process, which collides as soon as a second process writes
+    (uvicorn --workers, gunicorn), and nothing in-process can tell whether one
+    does. That path only backs tests of the queue itself;
+    MessageIngestQueue.start() refuses to run the application on it.
+    """
+
+    def __init__(self, db_engine=engine, block_size: int = ID_BLOCK_SIZE):
+        self.engine = db_engine
+        self.block_size = block_size
+        self.low_water = max(1, block_size // 4)
+        self._ids: Deque[int] = deque()
+        self._next_local: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running_low(self) -> bool:
+        return len(self._ids) < self.low_water
+
+    async def next_id(self) -> int:
+        while not self._ids:
+            await asyncio.to_thread(self.refill)
+        return self._ids.popleft()
+
+    def refill(self):
+        """Reserve another block of IDs if the pool is low (blocking; call from a worker thread)."""
+        with self._lock:
+            if not self.running_low:
+                return
+            if self.engine.dialect.name == "postgresql":
+                self._ids.extend(self._reserve_block())
+                return
+
+            if self._next_local is None:
+                with Session(self.engine) as session:
+                    current_max = session.exec(select(func.max(Message.id))).one()
+                self._next_local = (current_max or 0) + 1
+            self._ids.extend(range(self._next_local, self._next_local + self.block_size))
+            self._next_local += self.block_size
+
+    def _reserve_block(self) -> List[int]:
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT nextval(pg_get_serial_sequence('message', 'id')) "
+                    "FROM generate_series(1, :n)"
+                ),
+                {"n": self.block_size},
+            ).all()
+        return [row[0] for row in rows]
+
+
+class MessageIngestQueue:
+    """Buffers new messages and persists them in batched transactions."""
+
+    def __init__(
+        self,
+        db_engine=engine,
+        flush_interval_ms: int = FLUSH_INTERVAL_MS,
+        max_batch_size: int = MAX_BATCH_SIZE,
+        enabled: bool = INGEST_ENABLED,
+        max_retries: int = MAX_RETRIES,
+        retry_backoff_ms: int = RETRY_BACKOFF_MS,
+        dead_letter_path: str = DEAD_LETTER_PATH,
+    ):
+        self.engine = db_engine
+        self.enabled = enabled
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff_ms / 1000
+        self.dead_letter_path = dead_letter_path
+        self.dropped = 0
+        self._drop_hooks: List[Callable[[List[dict]], Awaitable[None]]] = []
+        self.allocator = MessageIdAllocator(db_engine)
+        self._pending: List[dict] = []
+        self._pending_ids: Set[int] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+    async def start(self):
+        """
+        Check the database can allocate IDs across processes and reserve the first
+        block (application startup).
+        """
+        if self.engine.dialect.name != "postgresql":
+            raise RuntimeError(
+                "MESSAGE_INGEST_BATCHING needs PostgreSQL to allocate message IDs; on "
+                f"{self.engine.dialect.name} every worker process would hand out the same IDs. "
+                "Disable batching or use PostgreSQL"
+            )
+        await asyncio.to_thread(self.allocator.refill)
+
+    # --- Producer side ---
+
+    async def submit(
+        self,
+        content: str,
+        channel_id: str,
+        user_id: str,
+        parent_id: Optional[int] = None,
+    ) -> Message:
+        """
+        Assign an ID and timestamp to a new message and queue it for persistence.
+        Returns a detached Message carrying the assigned values for the response
+        and broadcast.
+        """
+        message = Message(
+            id=await self.allocator.next_id(),
+            content=content,
+            channel_id=channel_id,
+            user_id=user_id,
+            parent_id=parent_id,
+            timestamp=datetime.now(timezone.utc),
+        )
+        self._pending.append({
+            "id": message.id,
+            "content": message.content,
+            "channel_id": message.channel_id,
+            "user_id": message.user_id,
+            "parent_id": message.parent_id,
+            "timestamp": message.timestamp,
+        })
+        self._pending_ids.add(message.id)
+        self._ensure_worker()
+        if len(self._pending) >= self.max_batch_size:
+            self._wakeup.set()
+        return message
+
+    def is_pending(self, message_id: int) -> bool:
+        """True if the message was acknowledged but is not in the database yet."""
+        return message_id in self._pending_ids
+
+    def add_drop_hook(self, hook: Callable[[List[dict]], Awaitable[None]]):
+        """Register a coroutine called with the queued items of messages that could not be persisted."""
+        self._drop_hooks.append(hook)
+
+    # --- Flusher ---
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._worker.get_loop() is not loop:
+            self._wakeup = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._worker = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+                if self.allocator.running_low:
+                    await asyncio.to_thread(self.allocator.refill)
+            except Exception:
+                logger.exception("Message ingest flush failed")
+
+    async def flush(self):
+        """Persist everything queued so far."""
+        if self._flush_lock is None:
+            return
+        async with self._flush_lock:
+            while self._pending:
+                batch = self._pending[:self.max_batch_size]
+                del self._pending[:self.max_batch_size]
+                try:
+                    await self._persist(batch)
+                finally:
+                    for item in batch:
+                        self._pending_ids.discard(item["id"])
+
+    async def stop(self):
+        """Drain the queue and stop the background flusher (application shutdown)."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        await self.flush()
+
+    async def _persist(self, batch: List[dict]):
+        for attempt in range(self.max_retries):
+            try:
+                await asyncio.to_thread(self._write_batch, batch)
+                return
+            except Exception:
+                logger.exception(
+                    "Batched insert of %d messages failed (attempt %d/%d)", len(batch), attempt + 1, self.max_retries
+                )
+                await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+
+        # Row by row, so one bad message does not take the rest of the batch with it
+        failed = await asyncio.to_thread(self._write_individually, batch)
+        if failed:
+            await self._drop(failed)
+
+    def _write_individually(self, batch: List[dict]) -> List[dict]:
+        failed = []
+        for item in batch:
+            try:
+                self._write_batch([item])
+            except Exception:
+                logger.exception("Message %s could not be persisted", item["id"])
+                failed.append(item)
+        return failed
+
+    async def _drop(self, items: List[dict]):
+        self.dropped += len(items)
+        try:
+            await asyncio.to_thread(self._write_dead_letters, items)
+        except Exception:
+            logger.exception("Could not write dead letters; lost messages: %s", items)
+        for hook in self._drop_hooks:
+            try:
+                await hook(items)
+            except Exception:
+                logger.exception("Message ingest drop hook failed")
+
+    def _write_dead_letters(self, items: List[dict]):
+        with open(self.dead_letter_path, "a", encoding="utf-8") as dead_letters:
+            for item in items:
+                dead_letters.write(json.dumps({**item, "timestamp": item["timestamp"].isoformat()}) + "\n")
+        logger.error("Wrote %d unpersisted message(s) to %s", len(items), self.dead_letter_path)
+
+    def _write_batch(self, batch: List[dict]):
+        # Imported lazily: the badge rules live with the community routes
+        from .routes.community import award_badges
+
+        message_counts: Dict[str, int] = Counter(item["user_id"] for item in batch)
+        reply_counts: Dict[int, int] = Counter(
+            item["parent_id"] for item in batch if item["parent_id"] is not None
+        )
+
+        with Session(self.engine) as session:
+            session.add_all([Message(**item) for item in batch])
+            session.flush()
+
+            for user_id, count in message_counts.items():
+                session.exec(
+                    update(User)
+                    .where(User.id == user_id)
+                    .values(total_messages=User.total_messages + count)
+                )
+            for parent_id, count in reply_counts.items():
+                session.exec(
+                    update(Message)
+                    .where(Message.id == parent_id)
+                    .values(reply_count=Message.reply_count + count)
+                )
+
+            # One badge evaluation per author, against the post-increment counters
+            for user_id in message_counts:
+                user = session.get(User, user_id, populate_existing=True)
+                if user:
+                    award_badges(session, user)
+
+            session.commit()
+
+
+# Global queue instance
+ingest_queue = MessageIngestQueue()
@@ -0,0 +1,105 @@
+"""
+PDF text extraction in a process pool.
+
+pypdf is pure Python. Extracting a 300-page textbook on the event loop froze the
+worker for seconds, and a thread would still hold the GIL. Extraction therefore
+runs in a pool of PDF_WORKERS processes. A document's pages are split into
+contiguous ranges that are extracted in parallel, one task per range, and then
+joined in order. The workers read the PDF from a temporary file, so the bytes are
+never held in the web worker's memory or pickled between processes.
+
+Workers are started with "spawn": forking a process that runs an event loop and
+threads is unsafe. This module imports nothing heavier than pypdf, which keeps
+spawned workers cheap to start.
+"""
+import asyncio
+import logging
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional
+
+import pypdf
+
+logger = logging.getLogger(__name__)
+
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "1000"))
+# Every task parses the PDF's structure again, so ranges are not made smaller than this
+MIN_PAGES_PER_TASK = 8
+
+
+class PdfError(Exception):
+    """The PDF cannot be used; the message is shown to the user."""
+
+
+def _page_count(path: str) -> int:
+    return len(pypdf.PdfReader(path).pages)
+
+def _extract_pages(path: str, start: int, end: int) -> List[str]:
+    reader = pypdf.PdfReader(path)
+    texts = []
+    for number in range(start, end):
+        try:
+            texts.append(reader.pages[number].extract_text() or "")
+        except Exception:
+            texts.append("")  # One damaged page should not lose the rest of the book
+    return texts
+
+
+class PdfExtractor:
+    def __init__(self, workers: int = PDF_WORKERS, max_pages: int = PDF_MAX_PAGES):
+        self.workers = max(1, workers)
+        self.max_pages = max_pages
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    async def _run(self, fn, *args):
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor(), fn, *args)
+        except BrokenProcessPool:
+            # A worker died (for example on a hostile file); start a fresh pool for the next upload
+            logger.error("PDF worker process died; restarting the pool")
+            self._pool = None
+            raise PdfError("Could not extract text from PDF.")
+
+    async def page_count(self, path: str) -> int:
+        """The number of pages; PdfError when the file is not a readable PDF or has too many pages."""
+        try:
+            pages = await self._run(_page_count, path)
+        except PdfError:
+            raise
+        except Exception as e:
+            logger.info(f"Unreadable PDF: {e}")
+            raise PdfError("Could not extract text from PDF.")
+        if pages > self.max_pages:
+            raise PdfError(f"PDF has {pages} pages; the limit is {self.max_pages}.")
+        return pages
+
+    async def extract(self, path: str, pages: int) -> str:
+        """The text of every page, with the page ranges extracted in parallel."""
+        per_task = max(MIN_PAGES_PER_TASK, math.ceil(pages / self.workers))
+        ranges = [(start, min(start + per_task, pages)) for start in range(0, pages, per_task)]
+        try:
+            parts = await asyncio.gather(*(self._run(_extract_pages, path, start, end) for start, end in ranges))
+        except PdfError:
+            raise
+        except Exception as e:
+            logger.info(f"PDF extraction failed: {e}")
+            raise PdfError("Could not extract text from PDF.")
+        return "".join(text + "\n" for part in parts for text in part if text)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# Global instance
+pdf_extractor = PdfExtractor()
@@ -0,0 +1,163 @@
+"""
+Provider-side caching of tutor documents for multi-turn chat.
+
+Retrieval (app/tutor_index.py) keeps the chat prompt small, but each turn still
+re-sends the tutor instructions, and the model only sees the chosen passages.
+For a document of [PROMPT_CACHE_MIN_TOKENS, PROMPT_CACHE_MAX_TOKENS] tokens, the
+tutor instructions and the whole document are registered once with Gemini's
+cached-content feature. Every turn of the study session then references that
+cache by name and sends only the passages retrieved for its question plus the
+question, which point the model at the relevant parts of the cached document.
+Cached input tokens are billed at a discount and are not re-processed on each
+turn. Below the minimum (4096 tokens for Gemini) the provider refuses to cache,
+and above the maximum storing the whole document costs more than it saves.
+
+Sizes are counted by the provider's tokenizer when a document is first
+registered; documents with fewer characters than PROMPT_CACHE_MIN_TOKENS cannot
+reach the minimum and are skipped without asking. Counts are kept per worker,
+since a document's content never changes.
+
+Registrations are tracked per worker by (document, model) with their expiry.
+Entries within PROMPT_CACHE_REFRESH_S of expiring are dropped and registered
+again, and the provider deletes expired caches itself. Any failure to register
+falls back to the retrieval prompt, and registration is not retried for that
+document until the TTL has passed.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException
+
+from . import llm
+from .schemas import TutorDocument
+
+logger = logging.getLogger(__name__)
+
+PROMPT_CACHE_TTL_S = int(os.getenv("PROMPT_CACHE_TTL_S", "900"))
+PROMPT_CACHE_MIN_TOKENS = int(os.getenv("PROMPT_CACHE_MIN_TOKENS", "4096"))  # The provider minimum
+PROMPT_CACHE_MAX_TOKENS = int(os.getenv("PROMPT_CACHE_MAX_TOKENS", "50000"))
+# An entry this close to expiry is registered again, so no turn references a cache that vanishes mid-request
+PROMPT_CACHE_REFRESH_S = 60
+
+
+class CachedPrefix(NamedTuple):
+    name: str  # The provider's cachedContents/... resource
+    expires_at: float  # time.monotonic()
+
+
+class PromptCache:
+    def __init__(self, ttl_s: int = PROMPT_CACHE_TTL_S, min_tokens: int = PROMPT_CACHE_MIN_TOKENS,
+                 max_tokens: int = PROMPT_CACHE_MAX_TOKENS):
+        self.ttl_s = ttl_s
+        self.min_tokens = min_tokens
+        self.max_tokens = max_tokens
+        self._entries: Dict[Tuple[str, str], CachedPrefix] = {}
+        self._pending: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._failed: Dict[Tuple[str, str], float] = {}  # key -> monotonic time to try again
+        self._tokens: Dict[Tuple[str, str], int] = {}  # key -> size of the cached prefix
+        self.hits = 0
+        self.created = 0
+        self.failures = 0
+        self.expired = 0
+        self.skipped = 0
+
+    def applies(self, doc: TutorDocument) -> bool:
+        # A token spans at least one character, so shorter documents cannot reach the minimum
+        return self.ttl_s > 0 and len(doc.content) >= self.min_tokens
+
+    def fits(self, tokens: int) -> bool:
+        return self.min_tokens <= tokens <= self.max_tokens
+
+    def _evict_expired(self, now: float):
+        for key, entry in list(self._entries.items()):
+            if entry.expires_at - PROMPT_CACHE_REFRESH_S <= now:
+                del self._entries[key]
+                self.expired += 1
+        for key, retry_at in list(self._failed.items()):
+            if retry_at <= now:
+                del self._failed[key]
+
+    async def prefix_for(self, doc: TutorDocument, model: str, system_instruction: str) -> Optional[str]:
+        """
+        The name of a provider cache holding the instructions and the whole document,
+        registering it on first use; None when the document should be sent inline instead.
+        """
+        if not llm.is_configured() or not self.applies(doc):
+            return None
+        key = (doc.id, model)
+        now = time.monotonic()
+        self._evict_expired(now)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry.name
+        if key in self._failed or not self.fits(self._tokens.get(key, self.min_tokens)):
+            return None
+
+        pending = self._pending.get(key)
+        if pending is None:
+            # Shared by concurrent turns and kept running if the request that started it goes away
+            pending = self._pending[key] = asyncio.ensure_future(self._register(key, doc, model, system_instruction))
+            pending.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(pending)
+
+    async def _register(self, key: Tuple[str, str], doc: TutorDocument, model: str,
+                        system_instruction: str) -> Optional[str]:
+        contents = [{"role": "user", "parts": [{"text": f"Document \"{doc.filename}\":\n{doc.content}"}]}]
+        try:
+            if key not in self._tokens:
+                self._tokens[key] = await llm.count_tokens(
+                    [{"role": "user", "parts": [{"text": system_instruction}]}] + contents, model=model
+                )
+            if not self.fits(self._tokens[key]):
+                self.skipped += 1
+                return None
+            cache = await llm.create_cache(
+                model=model,
+                system_instruction=system_instruction,
+                contents=contents,
+                ttl_s=self.ttl_s,
+                display_name=f"tutor-{doc.id}",
+            )
+        except HTTPException as e:
+            logger.warning(f"Could not cache tutor document {doc.id}: {e.detail}")
+        except Exception:
+            logger.exception(f"Could not cache tutor document {doc.id}")
+        else:
+            self._entries[key] = CachedPrefix(cache.name, time.monotonic() + self.ttl_s)
+            self.created += 1
+            return cache.name
+        self.failures += 1
+        self._failed[key] = time.monotonic() + self.ttl_s
+        return None
+
+    def forget(self, document_id: str, model: str):
+        """Drop a registration the provider no longer honours (a chat referencing it failed)."""
+        self._entries.pop((document_id, model), None)
+
+    async def close(self):
+        """Delete this worker's live caches so their storage stops being billed."""
+        entries, self._entries = list(self._entries.values()), {}
+        for entry in entries:
+            try:
+                await llm.delete_cache(entry.name, timeout=5)
+            except Exception as e:
+                logger.warning(f"Could not delete prompt cache {entry.name}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "ttl_s": self.ttl_s,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "created": self.created,
+            "failures": self.failures,
+            "expired": self.expired,
+            "skipped": self.skipped,
+        }
+
+
+# Global cache instance
+prompt_cache = PromptCache()
@@ -0,0 +1,182 @@
+"""
+Cross-process pub/sub for the WebSocket connection manager.
+
+Each uvicorn worker only holds its own sockets. To run several workers, every
+worker publishes its real-time events to a broker and delivers the events it
+receives from the others to its local subscribers.
+
+- InMemoryBroker: single process (the default). Brokers created on the same
+  InMemoryHub see each other's events, which is how tests simulate workers.
+- RedisBroker: Redis PUBLISH/SUBSCRIBE through redis.asyncio, so auth, TLS
+  (rediss://) and reconnects come from the client library. Works against Redis
+  itself or the stand-in pubsub_broker.py for local development. Selected by
+  PUBSUB_URL=redis://... or rediss://...
+
+A broker that cannot be reached does not stop the application: events are
+delivered to this worker's own sockets while RedisBroker keeps reconnecting
+in the background. Events published meanwhile are lost, so the on_connect
+callback runs after every (re)connection for the worker to resynchronize.
+"""
+import asyncio
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, List, Optional
+
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+PUBSUB_URL = os.getenv("PUBSUB_URL", "")
+PUBSUB_CHANNEL = os.getenv("PUBSUB_CHANNEL", "theworkshop:realtime")
+
+EventHandler = Callable[[dict], Awaitable[None]]
+ConnectHandler = Callable[[], Awaitable[None]]
+
+
+class Broker(ABC):
+    """Interface for fanning events out to every worker process."""
+
+    @abstractmethod
+    async def start(self, handler: EventHandler, on_connect: Optional[ConnectHandler] = None):
+        """
+        Begin delivering events published by any worker to handler. on_connect runs
+        whenever the connection to the other workers is (re)established.
+        """
+
+    @abstractmethod
+    async def publish(self, event: dict):
+        """Send an event to every worker (including this one)."""
+
+    @abstractmethod
+    async def stop(self):
+        """Stop delivering events and release connections."""
+
+
+class InMemoryHub:
+    """Shared bus for InMemoryBrokers living in the same process."""
+
+    def __init__(self):
+        self.handlers: List[EventHandler] = []
+
+
+class InMemoryBroker(Broker):
+    def __init__(self, hub: Optional[InMemoryHub] = None):
+        self.hub = hub or InMemoryHub()
+        self.handler: Optional[EventHandler] = None
+
+    async def start(self, handler: EventHandler, on_connect: Optional[ConnectHandler] = None):
+        self.handler = handler
+        self.hub.handlers.append(handler)
+        if on_connect is not None:
+            await on_connect()
+
+    async def publish(self, event: dict):
+        for handler in list(self.hub.handlers):
+            await handler(event)
+
+    async def stop(self):
+        if self.handler in self.hub.handlers:
+            self.hub.handlers.remove(self.handler)
+        self.handler = None
+
+
+class RedisBroker(Broker):
+    """Publishes through a redis.asyncio client and listens on its pub/sub connection."""
+
+    CONNECT_TIMEOUT = 5.0
+    RECONNECT_DELAY = 0.5
+    MAX_RECONNECT_DELAY = 30.0
+
+    def __init__(self, url: str, channel: str = PUBSUB_CHANNEL):
+        self.url = url
+        self.channel = channel
+        self.handler: Optional[EventHandler] = None
+        self.on_connect: Optional[ConnectHandler] = None
+        # RESP2 is understood by every Redis version and by pubsub_broker.py; no read
+        # timeout, because the subscriber connection is quiet whenever nothing is happening
+        self.client = redis.from_url(
+            url, protocol=2, socket_connect_timeout=self.CONNECT_TIMEOUT, socket_timeout=None
+        )
+        self._listener: Optional[asyncio.Task] = None
+        self._subscribed = asyncio.Event()
+
+    @property
+    def connected(self) -> bool:
+        return self._subscribed.is_set()
+
+    async def start(self, handler: EventHandler, on_connect: Optional[ConnectHandler] = None):
+        self.handler = handler
+        self.on_connect = on_connect
+        self._listener = asyncio.create_task(self._listen())
+        try:
+            await asyncio.wait_for(self._subscribed.wait(), timeout=self.CONNECT_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.error(
+                f"Pub/sub broker at {self.url} is unreachable; events stay on this worker until it reconnects"
+            )
+
+    async def _listen(self):
+        delay = self.RECONNECT_DELAY
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                self._subscribed.set()
+                delay = self.RECONNECT_DELAY
+                await self._connected()
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        await self._dispatch(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except (RedisError, OSError) as e:
+                logger.warning(f"Pub/sub subscriber lost its broker connection: {e}; retrying in {delay:.1f}s")
+            finally:
+                self._subscribed.clear()
+                await pubsub.aclose()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.MAX_RECONNECT_DELAY)
+
+    async def _connected(self):
+        if self.on_connect is None:
+            return
+        try:
+            await self.on_connect()
+        except Exception:
+            logger.exception("Pub/sub connect handler failed")
+
+    async def _dispatch(self, payload: bytes):
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.warning("Dropping malformed pub/sub payload")
+            return
+        try:
+            await self.handler(event)
+        except Exception:
+            logger.exception("Pub/sub event handler failed")
+
+    async def publish(self, event: dict):
+        if not self.connected:
+            logger.warning("Pub/sub broker unavailable; event delivered to this worker only")
+            return
+        try:
+            await self.client.publish(self.channel, json.dumps(event))
+        except (RedisError, OSError) as e:
+            logger.warning(f"Pub/sub publish failed: {e}")
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        await self.client.aclose()
+
+
+def create_broker(url: str = PUBSUB_URL) -> Broker:
+    if url.startswith(("redis://", "rediss://")):
+        return RedisBroker(url)
+    return InMemoryBroker()
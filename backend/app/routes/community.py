@@ -8,6 +8,7 @@ from ..schemas import (
     Community, CommunityCreate, CommunityResponse, 
     CommunityMember, CommunityMemberResponse,
     Channel, ChannelCreate, ChannelResponse,
+    ChannelReadState, ChannelReadUpdate, ChannelUnreadResponse,
     Message, MessageCreate, MessageResponse, MessageVote, ThreadResponse,
     DMConversation, DMConversationResponse,
     DMMessage, DMMessageCreate, DMMessageResponse,
@@ -20,9 +21,16 @@ from ..schemas import (
     PeerReviewSubmissionCreate, PeerReviewFeedbackCreate,
     PeerReviewSubmissionResponse, PeerReviewFeedbackResponse,
 )
-from ..websocket_manager import manager
+from ..websocket_manager import manager, channel_topic, community_topic, dm_topic
+from ..message_ingest import ingest_queue
+from ..message_cache import message_cache
+from sqlalchemy import case, delete, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
 from uuid import uuid4
 import re
+from datetime import datetime, timezone
 
 router = APIRouter(
     prefix="/api/v1/community",
@@ -311,6 +319,134 @@ async def create_channel(
         community_id=channel.community_id
     )
 
+# ==================== READ STATE / UNREAD COUNTS ====================
+
+@router.get("/communities/{community_id}/unread", response_model=List[ChannelUnreadResponse])
+async def get_unread_counts(
+    community_id: str,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    """Unread message counts for every channel the user can see in a community (one query)."""
+    read_state = (
+        select(ChannelReadState.channel_id, ChannelReadState.last_read_message_id)
+        .where(ChannelReadState.user_id == current_user.id)
+        .subquery()
+    )
+    # Pending (unapproved) members cannot read a group's private channels
+    my_group_ids = (
+        select(StudyGroupMember.group_id)
+        .where(StudyGroupMember.user_id == current_user.id)
+        .where(StudyGroupMember.status == "approved")
+    )
+    last_read = func.coalesce(read_state.c.last_read_message_id, 0)
+    
+    rows = session.exec(
+        select(Channel.id, last_read, func.count(Message.id))
+        .outerjoin(read_state, read_state.c.channel_id == Channel.id)
+        .outerjoin(
+            Message,
+            and_(
+                Message.channel_id == Channel.id,
+                Message.id > last_read,
+                Message.user_id != current_user.id  # Your own messages are never unread
+            )
+        )
+        .where(Channel.community_id == community_id)
+        .where(or_(Channel.study_group_id.is_(None), Channel.study_group_id.in_(my_group_ids)))
+        .group_by(Channel.id, read_state.c.last_read_message_id)
+    ).all()
+    
+    return [
+        ChannelUnreadResponse(channel_id=channel_id, last_read_message_id=last_read_id, unread_count=unread)
+        for channel_id, last_read_id, unread in rows
+    ]
+
+def can_read_channel(session: Session, user_id: str, channel: Channel) -> bool:
+    """Private study-group channels are readable by the group's approved members only."""
+    if not channel.study_group_id:
+        return True
+    return session.exec(
+        select(StudyGroupMember)
+        .where(StudyGroupMember.group_id == channel.study_group_id)
+        .where(StudyGroupMember.user_id == user_id)
+        .where(StudyGroupMember.status == "approved")
+    ).first() is not None
+
+@router.put("/channels/{channel_id}/read", response_model=ChannelUnreadResponse)
+async def mark_channel_read(
+    channel_id: str,
+    read_data: ChannelReadUpdate,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    """Advance the user's read pointer for a channel. Pointers never move backwards."""
+    channel = session.get(Channel, channel_id)
+    if not channel:
+        raise HTTPException(status_code=404, detail="Channel not found")
+    if not can_read_channel(session, current_user.id, channel):
+        raise HTTPException(status_code=403, detail="You must be an approved member of this study group")
+    
+    def load_state():
+        return session.exec(
+            select(ChannelReadState)
+            .where(ChannelReadState.user_id == current_user.id)
+            .where(ChannelReadState.channel_id == channel_id)
+        ).first()
+    
+    state = load_state()
+    if not state:
+        state = ChannelReadState(user_id=current_user.id, channel_id=channel_id)
+        session.add(state)
+        try:
+            session.commit()
+        except IntegrityError:
+            # Another tab created the pointer concurrently; use that row
+            session.rollback()
+            state = load_state()
+    
+    if read_data.message_id > state.last_read_message_id:
+        state.last_read_message_id = read_data.message_id
+        state.updated_at = datetime.now(timezone.utc)
+        session.add(state)
+        session.commit()
+    
+    unread = session.exec(
+        select(func.count(Message.id))
+        .where(Message.channel_id == channel_id)
+        .where(Message.id > state.last_read_message_id)
+        .where(Message.user_id != current_user.id)
+    ).one()
+    
+    return ChannelUnreadResponse(
+        channel_id=channel_id,
+        last_read_message_id=state.last_read_message_id,
+        unread_count=unread
+    )
+
+async def publish_unread_delta(session: Session, channel: Channel, message_id: int, author_id: str):
+    """Tell everyone who can see the channel (except the author) that it has one more unread message."""
+    event = {
+        "type": "unread_delta",
+        "channel_id": channel.id,
+        "community_id": channel.community_id,
+        "message_id": message_id,
+        "delta": 1,
+    }
+    if channel.study_group_id:
+        member_ids = session.exec(
+            select(StudyGroupMember.user_id)
+            .where(StudyGroupMember.group_id == channel.study_group_id)
+            .where(StudyGroupMember.status == "approved")
+            .where(StudyGroupMember.user_id != author_id)
+        ).all()
+        await manager.broadcast_to_users(event, list(member_ids))
+    elif channel.community_id:
+        await manager.publish(community_topic(channel.community_id), event, exclude_user=author_id)
+    else:
+        # Legacy channels outside any community have no community topic
+        await manager.broadcast_all(event, exclude_user=author_id)
+
 # ==================== MESSAGE ENDPOINTS ====================
 
 @router.get("/channels/{channel_id}/messages", response_model=List[MessageResponse])
@@ -320,7 +456,12 @@ async def get_channel_messages(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
-    """Get messages from a channel."""
+    """Get messages from a channel. The latest page of busy channels is served from the hot cache."""
+    if message_cache.enabled:
+        cached = message_cache.get_latest(channel_id, limit)
+        if cached is not None:
+            return [_message_response_from_cache(entry, current_user.id) for entry in cached]
+    
     channel = session.get(Channel, channel_id)
     if not channel:
         raise HTTPException(status_code=404, detail="Channel not found")
@@ -332,25 +473,50 @@ async def get_channel_messages(
         .limit(limit)
     ).all()
     
-    response_messages = []
+    cache_entries = []
     for msg in messages:
-        score = sum(v.value for v in msg.votes) if msg.votes else 0
-        user_vote = next((v.value for v in msg.votes if v.user_id == current_user.id), 0) if msg.votes else 0
         user = session.get(User, msg.user_id)
-        
-        response_messages.append(MessageResponse(
-            id=msg.id,
-            content=msg.content,
-            timestamp=msg.timestamp,
-            user_id=msg.user_id,
-            channel_id=msg.channel_id,
-            user_email=user.email if user else None,
-            user_profile_pic=user.profile_pic if user else None,
-            score=score,
-            user_vote=user_vote
-        ))
+        cache_entries.append(_message_cache_entry(msg, user, {v.user_id: v.value for v in msg.votes}))
+    cache_entries.reverse()
     
-    return list(reversed(response_messages))
+    if message_cache.enabled:
+        message_cache.fill(channel_id, cache_entries, complete=len(messages) < limit)
+    
+    return [_message_response_from_cache(entry, current_user.id) for entry in cache_entries]
+
+def _message_cache_entry(msg: Message, user: Optional[User], votes: dict) -> dict:
+    """
+    Serialize a message for the hot cache: the channel listing's MessageResponse as
+    JSON, plus every user's vote so user_vote can be filled in per caller.
+    """
+    response = MessageResponse(
+        id=msg.id,
+        content=msg.content,
+        timestamp=_stored_timestamp(msg.timestamp),
+        user_id=msg.user_id,
+        channel_id=msg.channel_id,
+        user_email=user.email if user else None,
+        user_profile_pic=user.profile_pic if user else None,
+        score=sum(votes.values())
+    )
+    return {**response.model_dump(mode="json", exclude={"user_vote"}), "votes": votes}
+
+def _stored_timestamp(timestamp: datetime) -> datetime:
+    """
+    A timestamp as the database hands it back for a loaded row, so messages that
+    were never read back (just created, or still in the ingest queue) serialize
+    the same way: aware UTC for timezone-aware columns, naive UTC otherwise.
+    """
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc)
+        if not Message.__table__.c.timestamp.type.timezone:
+            timestamp = timestamp.replace(tzinfo=None)
+    elif Message.__table__.c.timestamp.type.timezone:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp
+
+def _message_response_from_cache(entry: dict, current_user_id: str) -> MessageResponse:
+    return MessageResponse.model_validate({**entry, "user_vote": entry["votes"].get(current_user_id, 0)})
 
 @router.post("/channels/{channel_id}/messages", response_model=MessageResponse)
 async def create_message(
@@ -364,25 +530,30 @@ async def create_message(
     if not channel:
         raise HTTPException(status_code=404, detail="Channel not found")
     
-    db_message = Message(
-        content=message_data.content,
-        channel_id=channel_id,
-        user_id=current_user.id
-    )
-    session.add(db_message)
-    
-    # Increment user's message count for badges
-    current_user.total_messages += 1
-    session.add(current_user)
-    
-    session.commit()
-    session.refresh(db_message)
-    
-    # Check for new badges
-    await check_and_award_badges(session, current_user)
+    if ingest_queue.enabled:
+        # Write-behind: ID assigned now; row, counter and badges flushed in a batch
+        db_message = await ingest_queue.submit(message_data.content, channel_id, current_user.id)
+    else:
+        db_message = Message(
+            content=message_data.content,
+            channel_id=channel_id,
+            user_id=current_user.id
+        )
+        session.add(db_message)
+        
+        # Increment user's message count for badges
+        current_user.total_messages += 1
+        session.add(current_user)
+        
+        session.commit()
+        session.refresh(db_message)
+        
+        # Check for new badges
+        await check_and_award_badges(session, current_user)
     
     # Broadcast via WebSocket
-    await manager.broadcast_all(
+    await manager.publish(
+        channel_topic(db_message.channel_id),
         {
             "type": "message",
             "id": db_message.id,
@@ -394,6 +565,8 @@ async def create_message(
             "user_profile_pic": current_user.profile_pic
         }
     )
+    message_cache.append(db_message.channel_id, _message_cache_entry(db_message, current_user, {}))
+    await publish_unread_delta(session, channel, db_message.id, current_user.id)
     
     return MessageResponse(
         id=db_message.id,
@@ -407,6 +580,54 @@ async def create_message(
         user_vote=0
     )
 
+def apply_vote(session: Session, message_id: int, user_id: str, vote_value: int) -> int:
+    """
+    Set (or clear, for 0) a user's vote in a single statement and return the previous value.
+    The caller commits.
+    """
+    votes = MessageVote.__table__
+    if vote_value == 0:
+        old_value = session.exec(
+            delete(votes)
+            .where(votes.c.message_id == message_id)
+            .where(votes.c.user_id == user_id)
+            .returning(votes.c.value)
+        ).scalar()
+        return old_value or 0
+    
+    insert = pg_insert if session.get_bind().dialect.name == "postgresql" else sqlite_insert
+    stmt = insert(votes).values(message_id=message_id, user_id=user_id, value=vote_value, previous_value=0)
+    # SET expressions see the pre-update row, so previous_value captures the old vote atomically
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[votes.c.message_id, votes.c.user_id],
+        set_={"previous_value": votes.c.value, "value": stmt.excluded.value}
+    ).returning(votes.c.previous_value)
+    return session.exec(stmt).scalar()
+
+def _clamped(column, delta: int):
+    """column + delta, floored at zero, evaluated in the database."""
+    return case((column + delta < 0, 0), else_=column + delta)
+
+def adjust_reputation(session: Session, author_id: str, old_vote_value: int, vote_value: int) -> bool:
+    """
+    Apply a vote change to the author's counters with an atomic UPDATE (no read-modify-write).
+    Returns True if any counter changed. The caller commits.
+    """
+    vote_delta = vote_value - old_vote_value
+    # Only count upvotes received (positive votes) for the helpful_votes badge metric
+    helpful_delta = int(vote_value == 1) - int(old_vote_value == 1)
+    if vote_delta == 0 and helpful_delta == 0:
+        return False
+    session.exec(
+        update(User)
+        .where(User.id == author_id)
+        .values(
+            reputation_points=_clamped(User.reputation_points, vote_delta),
+            helpful_votes=_clamped(User.helpful_votes, helpful_delta)
+        )
+    )
+    return True
+
 @router.post("/channels/{channel_id}/messages/{message_id}/vote", response_model=MessageResponse)
 async def vote_message(
     channel_id: str,
@@ -423,51 +644,25 @@ async def vote_message(
     if not message:
         raise HTTPException(status_code=404, detail="Message not found")
     
-    # Get message author for reputation update
-    message_author = session.get(User, message.user_id)
+    old_vote_value = apply_vote(session, message_id, current_user.id, vote_value)
     
-    existing_vote = session.exec(
-        select(MessageVote)
-        .where(MessageVote.user_id == current_user.id)
-        .where(MessageVote.message_id == message_id)
-    ).first()
-    
-    old_vote_value = existing_vote.value if existing_vote else 0
+    # Update message author's reputation based on vote change
+    reputation_changed = False
+    if message.user_id != current_user.id:
+        reputation_changed = adjust_reputation(session, message.user_id, old_vote_value, vote_value)
     
-    if vote_value == 0:
-        if existing_vote:
-            session.delete(existing_vote)
-    else:
-        if existing_vote:
-            existing_vote.value = vote_value
-            session.add(existing_vote)
-        else:
-            new_vote = MessageVote(
-                user_id=current_user.id,
-                message_id=message_id,
-                value=vote_value
-            )
-            session.add(new_vote)
+    session.commit()
     
-    # Update message author's reputation based on vote change
-    if message_author and message_author.id != current_user.id:
-        vote_delta = vote_value - old_vote_value
-        message_author.reputation_points = max(0, message_author.reputation_points + vote_delta)
-        # Only count upvotes received (positive votes) for the helpful_votes badge metric
-        if vote_value == 1 and old_vote_value != 1:
-            message_author.helpful_votes += 1
-        elif vote_value != 1 and old_vote_value == 1 and message_author.helpful_votes > 0:
-            message_author.helpful_votes -= 1
-        session.add(message_author)
-        
+    message_author = session.get(User, message.user_id, populate_existing=True)
+    if reputation_changed and message_author:
         # Check for badge achievements after reputation update
         await check_and_award_badges(session, message_author)
     
-    session.commit()
-    session.refresh(message)
+    message_cache.vote(message.channel_id, message_id, current_user.id, vote_value)
     
-    score = sum(v.value for v in message.votes) if message.votes else 0
-    user = session.get(User, message.user_id)
+    score = session.exec(
+        select(func.coalesce(func.sum(MessageVote.value), 0)).where(MessageVote.message_id == message_id)
+    ).one()
     
     return MessageResponse(
         id=message.id,
@@ -475,8 +670,8 @@ async def vote_message(
         timestamp=message.timestamp,
         user_id=message.user_id,
         channel_id=message.channel_id,
-        user_email=user.email if user else None,
-        user_profile_pic=user.profile_pic if user else None,
+        user_email=message_author.email if message_author else None,
+        user_profile_pic=message_author.profile_pic if message_author else None,
         score=score,
         user_vote=vote_value,
         parent_id=message.parent_id,
@@ -504,13 +699,15 @@ async def edit_message(
     session.add(message)
     session.commit()
     session.refresh(message)
+    message_cache.edit(message.channel_id, message.id, message.content)
 
     user = session.get(User, message.user_id)
     score = sum(v.value for v in message.votes) if message.votes else 0
     user_vote = next((v.value for v in message.votes if v.user_id == current_user.id), 0) if message.votes else 0
 
     channel = session.get(Channel, channel_id)
-    await manager.broadcast_all(
+    await manager.publish(
+        channel_topic(message.channel_id),
         {
             "type": "message_edited",
             "id": message.id,
@@ -582,11 +779,14 @@ async def delete_message(
             parent.reply_count -= 1
             session.add(parent)
 
+    message_channel_id = message.channel_id
     session.delete(message)
     session.commit()
+    message_cache.remove(message_channel_id, [message_id] + [reply.id for reply in child_replies])
 
     channel = session.get(Channel, channel_id)
-    await manager.broadcast_all(
+    await manager.publish(
+        channel_topic(message_channel_id),
         {
             "type": "message_deleted",
             "id": message_id,
@@ -608,38 +808,43 @@ async def create_reply(
 ):
     """Create a reply to a message (threaded discussion)."""
     parent_message = session.get(Message, message_id)
-    if not parent_message:
+    if not parent_message and not ingest_queue.is_pending(message_id):
         raise HTTPException(status_code=404, detail="Parent message not found")
     
     channel = session.get(Channel, channel_id)
     if not channel:
         raise HTTPException(status_code=404, detail="Channel not found")
     
-    # Create reply
-    reply = Message(
-        content=message_data.content,
-        channel_id=channel_id,
-        user_id=current_user.id,
-        parent_id=message_id
-    )
-    session.add(reply)
-    
-    # Increment parent's reply count
-    parent_message.reply_count += 1
-    session.add(parent_message)
-    
-    # Increment user's message count
-    current_user.total_messages += 1
-    session.add(current_user)
-    
-    session.commit()
-    session.refresh(reply)
-    
-    # Check for badges
-    await check_and_award_badges(session, current_user)
+    if ingest_queue.enabled:
+        # Write-behind: parent reply_count and user counters are batched by the flusher
+        reply = await ingest_queue.submit(message_data.content, channel_id, current_user.id, parent_id=message_id)
+    else:
+        # Create reply
+        reply = Message(
+            content=message_data.content,
+            channel_id=channel_id,
+            user_id=current_user.id,
+            parent_id=message_id
+        )
+        session.add(reply)
+        
+        # Increment parent's reply count
+        parent_message.reply_count += 1
+        session.add(parent_message)
+        
+        # Increment user's message count
+        current_user.total_messages += 1
+        session.add(current_user)
+        
+        session.commit()
+        session.refresh(reply)
+        
+        # Check for badges
+        await check_and_award_badges(session, current_user)
     
     # Broadcast via WebSocket
-    await manager.broadcast_all(
+    await manager.publish(
+        channel_topic(reply.channel_id),
         {
             "type": "reply",
             "id": reply.id,
@@ -652,6 +857,8 @@ async def create_reply(
             "user_profile_pic": current_user.profile_pic
         }
     )
+    message_cache.append(reply.channel_id, _message_cache_entry(reply, current_user, {}))
+    await publish_unread_delta(session, channel, reply.id, current_user.id)
     
     return MessageResponse(
         id=reply.id,
@@ -887,30 +1094,21 @@ async def send_dm_message(
     session.commit()
     session.refresh(msg)
     
-    # Broadcast via WebSocket (using conversation_id as channel)
-    await manager.send_personal_message(
-        {
-            "type": "dm_message",
-            "id": msg.id,
-            "content": msg.content,
-            "sender_id": msg.sender_id,
-            "conversation_id": msg.conversation_id,
-            "timestamp": msg.timestamp.isoformat(),
-            "sender_email": current_user.email,
-            "sender_profile_pic": current_user.profile_pic
-        }, conversation.user1_id)
-    if conversation.user1_id != conversation.user2_id:
-        await manager.send_personal_message(
-            {
-            "type": "dm_message",
-            "id": msg.id,
-            "content": msg.content,
-            "sender_id": msg.sender_id,
-            "conversation_id": msg.conversation_id,
-            "timestamp": msg.timestamp.isoformat(),
-            "sender_email": current_user.email,
-            "sender_profile_pic": current_user.profile_pic
-        }, conversation.user2_id)
+    event = {
+        "type": "dm_message",
+        "id": msg.id,
+        "content": msg.content,
+        "sender_id": msg.sender_id,
+        "conversation_id": msg.conversation_id,
+        "timestamp": msg.timestamp.isoformat(),
+        "sender_email": current_user.email,
+        "sender_profile_pic": current_user.profile_pic
+    }
+    # Sequenced (and replayed after a reconnect) for the sockets that have the conversation open
+    await manager.publish(dm_topic(msg.conversation_id), event)
+    # Both participants also get it on every device, so a conversation that is not open is flagged
+    # as unread; clients drop the second copy by id
+    await manager.broadcast_to_users(event, list({conversation.user1_id, conversation.user2_id}))
     
     return DMMessageResponse(
         id=msg.id,
@@ -1063,24 +1261,29 @@ async def create_message_by_slug(
     if not channel:
         raise HTTPException(status_code=404, detail="Channel not found")
     
-    db_message = Message(
-        content=message_data.content,
-        channel_id=channel.id,
-        user_id=current_user.id
-    )
-    session.add(db_message)
-    
-    # Track stats (same as primary endpoint)
-    current_user.total_messages += 1
-    session.add(current_user)
-    
-    session.commit()
-    session.refresh(db_message)
-    
-    # Award badges
-    await check_and_award_badges(session, current_user)
+    if ingest_queue.enabled:
+        # Same write-behind path as the primary endpoint (shares its ID allocator)
+        db_message = await ingest_queue.submit(message_data.content, channel.id, current_user.id)
+    else:
+        db_message = Message(
+            content=message_data.content,
+            channel_id=channel.id,
+            user_id=current_user.id
+        )
+        session.add(db_message)
+        
+        # Track stats (same as primary endpoint)
+        current_user.total_messages += 1
+        session.add(current_user)
+        
+        session.commit()
+        session.refresh(db_message)
+        
+        # Award badges
+        await check_and_award_badges(session, current_user)
     
-    await manager.broadcast_all(
+    await manager.publish(
+        channel_topic(db_message.channel_id),
         {
             "type": "message",
             "id": db_message.id,
@@ -1091,6 +1294,8 @@ async def create_message_by_slug(
             "user_email": current_user.email
         }
     )
+    message_cache.append(db_message.channel_id, _message_cache_entry(db_message, current_user, {}))
+    await publish_unread_delta(session, channel, db_message.id, current_user.id)
     
     return MessageResponse(
         id=db_message.id,
@@ -1121,34 +1326,17 @@ async def vote_message_by_slug(
     if not message:
         raise HTTPException(status_code=404, detail="Message not found")
     
-    existing_vote = session.exec(
-        select(MessageVote)
-        .where(MessageVote.user_id == current_user.id)
-        .where(MessageVote.message_id == message_id)
-    ).first()
-    
-    if vote_value == 0:
-        if existing_vote:
-            session.delete(existing_vote)
-    else:
-        if existing_vote:
-            existing_vote.value = vote_value
-            session.add(existing_vote)
-        else:
-            new_vote = MessageVote(
-                user_id=current_user.id,
-                message_id=message_id,
-                value=vote_value
-            )
-            session.add(new_vote)
-    
+    apply_vote(session, message_id, current_user.id, vote_value)
     session.commit()
-    session.refresh(message)
+    message_cache.vote(message.channel_id, message_id, current_user.id, vote_value)
     
-    score = sum(v.value for v in message.votes) if message.votes else 0
+    score = session.exec(
+        select(func.coalesce(func.sum(MessageVote.value), 0)).where(MessageVote.message_id == message_id)
+    ).one()
     user = session.get(User, message.user_id)
     
-    await manager.broadcast_all(
+    await manager.publish(
+        channel_topic(channel.id),
         {
             "type": "vote_update",
             "message_id": message_id,
@@ -1171,15 +1359,29 @@ async def vote_message_by_slug(
 
 @router.get("/users/online")
 async def get_online_users(
+    community_id: Optional[str] = None,
+    session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
-    """Get list of online users."""
-    return manager.online_users_list
+    """Get list of online users (from the connection manager's presence), optionally only a community's members."""
+    online = manager.online_users_list
+    if community_id is None or not online:
+        return online
+    return list(session.exec(
+        select(CommunityMember.user_id)
+        .where(CommunityMember.community_id == community_id)
+        .where(CommunityMember.user_id.in_(online))
+    ).all())
 
 # ==================== GAMIFICATION HELPER FUNCTIONS ====================
 
 async def check_and_award_badges(session: Session, user: User):
     """Check if user qualifies for any new badges and award them."""
+    award_badges(session, user)
+    session.commit()
+
+def award_badges(session: Session, user: User):
+    """Add any newly qualified badges for user to the session (caller commits)."""
     # Get all badges user doesn't have yet
     user_badge_ids = [ub.badge_id for ub in session.exec(
         select(UserBadge).where(UserBadge.user_id == user.id)
@@ -1202,8 +1404,6 @@ async def check_and_award_badges(session: Session, user: User):
         if qualified:
             new_badge = UserBadge(user_id=user.id, badge_id=badge.id)
             session.add(new_badge)
-    
-    session.commit()
 
 # ==================== GAMIFICATION ENDPOINTS ====================
 
@@ -1491,47 +1691,78 @@ async def create_study_group(
         is_member=True
     )
 
+def _study_group_listing_query(current_user_id: str):
+    """
+    Build a single SELECT returning (StudyGroup, approved member count, caller's
+    membership status) so group listings never issue per-group queries.
+    """
+    member_counts = (
+        select(
+            StudyGroupMember.group_id.label("group_id"),
+            func.count(StudyGroupMember.id).label("member_count")
+        )
+        .where(StudyGroupMember.status == "approved")
+        .group_by(StudyGroupMember.group_id)
+        .subquery()
+    )
+    my_membership = (
+        select(
+            StudyGroupMember.group_id.label("group_id"),
+            StudyGroupMember.status.label("status")
+        )
+        .where(StudyGroupMember.user_id == current_user_id)
+        .subquery()
+    )
+    query = (
+        select(
+            StudyGroup,
+            func.coalesce(member_counts.c.member_count, 0),
+            my_membership.c.status
+        )
+        .outerjoin(member_counts, member_counts.c.group_id == StudyGroup.id)
+        .outerjoin(my_membership, my_membership.c.group_id == StudyGroup.id)
+    )
+    return query, my_membership
+
+def _study_group_response(group: StudyGroup, member_count: int, is_member: bool) -> StudyGroupResponse:
+    return StudyGroupResponse(
+        id=group.id,
+        name=group.name,
+        description=group.description,
+        community_id=group.community_id,
+        creator_id=group.creator_id,
+        is_public=group.is_public,
+        max_members=group.max_members,
+        created_at=group.created_at,
+        member_count=member_count,
+        is_member=is_member
+    )
+
 @router.get("/communities/{community_id}/groups", response_model=List[StudyGroupResponse])
 async def get_community_study_groups(
     community_id: str,
+    search: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=200),
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
-    """Get all study groups in a community."""
-    groups = session.exec(
-        select(StudyGroup).where(StudyGroup.community_id == community_id)
-    ).all()
-    
-    result = []
-    for group in groups:
-        # Count only approved members (not pending)
-        member_count = session.exec(
-            select(func.count(StudyGroupMember.id))
-            .where(StudyGroupMember.group_id == group.id)
-            .where(StudyGroupMember.status == "approved")
-        ).one()
-        
-        is_member = session.exec(
-            select(StudyGroupMember)
-            .where(StudyGroupMember.group_id == group.id)
-            .where(StudyGroupMember.user_id == current_user.id)
-            .where(StudyGroupMember.status == "approved")
-        ).first() is not None
-        
-        result.append(StudyGroupResponse(
-            id=group.id,
-            name=group.name,
-            description=group.description,
-            community_id=group.community_id,
-            creator_id=group.creator_id,
-            is_public=group.is_public,
-            max_members=group.max_members,
-            created_at=group.created_at,
-            member_count=member_count,
-            is_member=is_member
-        ))
-    
-    return result
+    """Get study groups in a community, optionally filtered by name and paged with skip/limit."""
+    query, my_membership = _study_group_listing_query(current_user.id)
+    query = query.where(StudyGroup.community_id == community_id)
+    if search:
+        query = query.where(StudyGroup.name.ilike(f"%{search.strip()}%"))
+    
+    query = query.order_by(StudyGroup.created_at, StudyGroup.id).offset(skip)
+    if limit is not None:
+        query = query.limit(limit)
+    rows = session.exec(query).all()
+    
+    # Count only approved members (not pending); is_member likewise requires approval
+    return [
+        _study_group_response(group, member_count, membership_status == "approved")
+        for group, member_count, membership_status in rows
+    ]
 
 @router.get("/groups/{group_id}", response_model=StudyGroupDetailResponse)
 async def get_study_group(
@@ -1737,38 +1968,28 @@ async def remove_group_member(
 
 @router.get("/users/me/groups", response_model=List[StudyGroupResponse])
 async def get_my_study_groups(
+    search: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=200),
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
-    """Get all study groups the current user is a member of."""
-    memberships = session.exec(
-        select(StudyGroupMember).where(StudyGroupMember.user_id == current_user.id)
-    ).all()
-    
-    result = []
-    for membership in memberships:
-        group = session.get(StudyGroup, membership.group_id)
-        if group:
-            member_count = session.exec(
-                select(func.count(StudyGroupMember.id))
-                .where(StudyGroupMember.group_id == group.id)
-                .where(StudyGroupMember.status == "approved")
-            ).one()
-            
-            result.append(StudyGroupResponse(
-                id=group.id,
-                name=group.name,
-                description=group.description,
-                community_id=group.community_id,
-                creator_id=group.creator_id,
-                is_public=group.is_public,
-                max_members=group.max_members,
-                created_at=group.created_at,
-                member_count=member_count,
-                is_member=True
-            ))
+    """Get all study groups the current user is a member of (optionally paged with skip/limit)."""
+    query, my_membership = _study_group_listing_query(current_user.id)
+    # Any membership row (approved or pending) lists the group, as before
+    query = query.where(my_membership.c.status.is_not(None))
+    if search:
+        query = query.where(StudyGroup.name.ilike(f"%{search.strip()}%"))
+    
+    query = query.order_by(StudyGroup.created_at, StudyGroup.id).offset(skip)
+    if limit is not None:
+        query = query.limit(limit)
+    rows = session.exec(query).all()
     
-    return result
+    return [
+        _study_group_response(group, member_count, True)
+        for group, member_count, _ in rows
+    ]
 
 # ==================== CHANNEL MANAGEMENT ====================
 
@@ -1854,8 +2075,14 @@ async def delete_channel(
     for note in notes:
         session.delete(note)
     
+    # Delete read pointers
+    read_states = session.exec(select(ChannelReadState).where(ChannelReadState.channel_id == channel_id)).all()
+    for rs in read_states:
+        session.delete(rs)
+    
     session.delete(channel)
     session.commit()
+    message_cache.invalidate(channel_id)
 
 # ==================== STUDY GROUP MANAGEMENT ====================
 
@@ -1943,10 +2170,14 @@ async def delete_study_group(
             votes = session.exec(select(MessageVote).where(MessageVote.message_id == msg.id)).all()
             for v in votes: session.delete(v)
             session.delete(msg)
+        read_states = session.exec(select(ChannelReadState).where(ChannelReadState.channel_id == group_channel.id)).all()
+        for rs in read_states: session.delete(rs)
         session.delete(group_channel)
     
     session.delete(group)
     session.commit()
+    if group_channel:
+        message_cache.invalidate(group_channel.id)
 
 # ==================== SHARED NOTES ENDPOINTS ====================
 
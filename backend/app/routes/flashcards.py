@@ -1,11 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Request, status, UploadFile, File, Form
 from sqlmodel import Session, select
 from typing import List
 import os
-from google import genai
 from uuid import uuid4
 from datetime import datetime, timezone
 
+from .. import llm
 from ..database import get_session
 from ..dependencies import get_current_user
 from ..schemas import (
@@ -23,12 +23,6 @@ router = APIRouter(
     tags=["flashcards"]
 )
 
-# Configure Gemini
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-client = None
-if GEMINI_API_KEY:
-    client = genai.Client(api_key=GEMINI_API_KEY)
-
 
 @router.get("/collections", response_model=List[FlashcardCollectionResponse])
 async def get_collections(
@@ -60,13 +54,14 @@ async def get_collection(
 
 @router.post("/generate/file", response_model=FlashcardSetDetailResponse, status_code=status.HTTP_201_CREATED)
 async def generate_flashcards_from_file(
+    http_request: Request,
     title: str = Form(...),
     category: str = Form(...),
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_user),
     session: Session = Depends(get_session)
 ):
-    if not client:
+    if not llm.is_configured():
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
             detail="Gemini API Key not configured."
@@ -93,7 +88,7 @@ async def generate_flashcards_from_file(
 
     try:
         # Upload to Gemini
-        uploaded_file = client.files.upload(path=tmp_path, config={'mime_type': file.content_type})
+        uploaded_file = await llm.upload_file(tmp_path, file.content_type, request=http_request)
         
         prompt = (
             "Generate exactly 20 question-and-answer pairs based on the content of the attached file. "
@@ -102,10 +97,11 @@ async def generate_flashcards_from_file(
         )
         
         # Generate content with file and prompt
-        response = client.models.generate_content(
+        response = await llm.generate(
+            [uploaded_file, prompt],
             model='gemini-2.5-flash',
-            contents=[uploaded_file, prompt],
-            config={"response_mime_type": "application/json"}
+            config={"response_mime_type": "application/json"},
+            request=http_request
         )
         
         generated_text = response.text
@@ -119,6 +115,8 @@ async def generate_flashcards_from_file(
             os.remove(tmp_path)
         except:
             pass
+        if isinstance(e, HTTPException):
+            raise  # Timed out or the client went away
         raise HTTPException(status_code=500, detail=f"AI Generation failed: {str(e)}")
     
     # Clean up local temp file
@@ -2,7 +2,12 @@ from fastapi import APIRouter, Depends, status
 from sqlmodel import Session, select
 from datetime import datetime, timezone
 from ..database import get_session
-from ..schemas import KeepAlive
+from ..dependencies import get_current_admin_user
+from ..schemas import KeepAlive, User
+from ..message_cache import message_cache
+from ..generation_cache import generation_cache
+from ..prompt_cache import prompt_cache
+from ..websocket_manager import manager
 
 router = APIRouter(
     prefix="/api/system",
@@ -30,3 +35,16 @@ async def ping_database(session: Session = Depends(get_session)):
     session.commit()
     
     return {"status": "alive", "timestamp": keep_alive.timestamp}
+
+@router.get("/metrics", status_code=status.HTTP_200_OK, summary="In-process cache and connection metrics")
+async def get_metrics(current_admin: User = Depends(get_current_admin_user)):
+    """
+    Reports counters for this worker process only (hit rates, sizes,
+    open WebSocket connections, send queue depths, reaped sockets). Admins only.
+    """
+    return {
+        "message_cache": message_cache.stats(),
+        "generation_cache": generation_cache.stats(),
+        "prompt_cache": prompt_cache.stats(),
+        "websocket": manager.stats(),
+    }
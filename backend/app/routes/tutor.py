@@ -1,19 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response, status, UploadFile, File
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlmodel import Session, select
 from typing import List, Optional
 import os
 import json
-import io
-import pypdf
-from google import genai
+import tempfile
+import anyio
 from uuid import uuid4
-from datetime import datetime, timezone, date
+from datetime import datetime, timedelta, timezone, date
 from pydantic import BaseModel
 import shutil
 from pathlib import Path
 
-from ..database import get_session
+from .. import llm
+from ..tutor_index import tutor_index
+from ..generation_cache import generation_cache
+from ..prompt_cache import prompt_cache
+from ..pdf_extract import PdfError, pdf_extractor
+from ..database import engine, get_session
 from ..dependencies import get_current_user
 from ..schemas import User, TutorDocument, TutorChatRequest, TutorChatResponse
 
@@ -22,19 +26,22 @@ router = APIRouter(
     tags=["tutor"]
 )
 
-# Configure Gemini
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-client = None
-if GEMINI_API_KEY:
-    client = genai.Client(api_key=GEMINI_API_KEY)
-else:
-    print("WARNING: GEMINI_API_KEY not set. AI Tutor features will not work.")
-
 # Removed local uploads directory creation
 
+TUTOR_UPLOAD_MAX_BYTES = int(os.getenv("TUTOR_UPLOAD_MAX_BYTES", str(25 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+# A PDF still "processing" after this long lost its worker (restart or crash) along with its temporary file
+TUTOR_PROCESSING_TIMEOUT_S = int(os.getenv("TUTOR_PROCESSING_TIMEOUT_S", "900"))
+
+GENERATION_MODEL = 'gemini-2.0-flash'
+# Bump when a generation prompt changes, so results cached from the old prompt are not served
+QUIZ_PROMPT_VERSION = 1
+FLASHCARDS_PROMPT_VERSION = 1
+
 # --- Request/Response Schemas for Generation ---
 class GenerateRequest(BaseModel):
     document_id: str
+    fresh: bool = False  # Generate a new variant instead of returning the cached one
 
 class QuizQuestion(BaseModel):
     question: str
@@ -43,6 +50,7 @@ class QuizQuestion(BaseModel):
 
 class QuizResponse(BaseModel):
     questions: List[QuizQuestion]
+    cached: bool = False
 
 class FlashcardItem(BaseModel):
     term: str
@@ -50,6 +58,16 @@ class FlashcardItem(BaseModel):
 
 class FlashcardsResponse(BaseModel):
     flashcards: List[FlashcardItem]
+    cached: bool = False
+
+class SearchResult(BaseModel):
+    passage: int  # 1-based position of the passage in the document
+    score: float
+    content: str
+
+class DocumentSearchResponse(BaseModel):
+    query: str
+    results: List[SearchResult]
 
 class DocumentContentResponse(BaseModel):
     id: str
@@ -57,83 +75,216 @@ class DocumentContentResponse(BaseModel):
     content: str
     file_path: Optional[str]
     file_type: str
+    status: str = "ready"
+    error: Optional[str] = None
     created_at: datetime
 
+class DocumentStatusResponse(BaseModel):
+    id: str
+    status: str
+    error: Optional[str] = None
+
 # --- Endpoints ---
 
+async def save_upload(file: UploadFile, suffix: str) -> str:
+    """Stream an upload to a temporary file, refusing more than TUTOR_UPLOAD_MAX_BYTES; returns its path."""
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+                size += len(chunk)
+                if size > TUTOR_UPLOAD_MAX_BYTES:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File is larger than {TUTOR_UPLOAD_MAX_BYTES // (1024 * 1024)} MB."
+                    )
+                out.write(chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
+
+def store_original_pdf(storage_path: str, local_path: str):
+    """Save the PDF file to Supabase (blocking; run in a thread)."""
+    from supabase import create_client, Client
+    url = os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_KEY")
+    if url and key:
+        supabase: Client = create_client(url, key)
+        supabase.storage.from_("tutor_documents").upload(
+            storage_path,
+            local_path,
+            file_options={"cache-control": "3600", "upsert": "true"}
+        )
+    else:
+        print("WARNING: Supabase not configured. Tutor docs won't be saved.")
+
+async def index_for_retrieval(session: Session, doc: TutorDocument, http_request: Optional[Request] = None) -> int:
+    """Passages and keyword index for retrieval, then embeddings (retried on the first chat if this fails)."""
+    chunks = len(tutor_index.store_passages(session, doc))
+    if llm.is_configured():
+        try:
+            await tutor_index.embed_document(session, doc, request=http_request)
+        except HTTPException as he:
+            if he.status_code == 499:
+                raise he
+            print(f"Tutor embedding error: {he.detail}")
+        except Exception as e:
+            print(f"Tutor embedding error: {e}")
+    return chunks
+
+def mark_failed(document_id: str, error: str):
+    with Session(engine) as session:
+        doc = session.get(TutorDocument, document_id)
+        if doc:
+            doc.status = "failed"
+            doc.error = error
+            session.add(doc)
+            session.commit()
+
+def fail_stale_uploads(session: Session, older_than_s: int = TUTOR_PROCESSING_TIMEOUT_S) -> int:
+    """Mark PDFs that have been "processing" for longer than older_than_s as failed; returns how many."""
+    # Naive UTC, as the timestamps come back from the database
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=older_than_s)
+    stale = session.exec(
+        select(TutorDocument)
+        .where(TutorDocument.status == "processing")
+        .where(TutorDocument.created_at < cutoff)
+    ).all()
+    for doc in stale:
+        doc.status = "failed"
+        doc.error = "Processing was interrupted. Please upload the file again."
+        session.add(doc)
+    session.commit()
+    return len(stale)
+
+async def process_pdf_upload(document_id: str, path: str, pages: int):
+    """
+    The rest of a PDF upload, after the response: extract the text in the process pool,
+    save the original to Supabase, index it, and mark the document "ready" (or "failed").
+    """
+    try:
+        content = await pdf_extractor.extract(path, pages)
+        if not content.strip():
+            raise PdfError("File is empty or could not be parsed.")
+
+        with Session(engine) as session:
+            doc = session.get(TutorDocument, document_id)
+            if not doc:
+                return
+            await anyio.to_thread.run_sync(store_original_pdf, doc.file_path, path)
+            doc.content = content
+            doc.status = "ready"
+            session.add(doc)
+            session.commit()
+            session.refresh(doc)
+            await index_for_retrieval(session, doc)
+    except PdfError as e:
+        mark_failed(document_id, str(e))
+    except Exception as e:
+        print(f"PDF processing error: {e}")
+        mark_failed(document_id, "Could not process PDF.")
+    finally:
+        os.unlink(path)
+
+def require_ready(doc: TutorDocument):
+    if doc.status == "processing":
+        raise HTTPException(status_code=409, detail="Document is still being processed. Please try again shortly.")
+    if doc.status == "failed":
+        raise HTTPException(status_code=409, detail=doc.error or "Document could not be processed.")
+
 @router.post("/upload", response_model=dict)
 async def upload_document(
+    http_request: Request,
+    response: Response,
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_user),
     session: Session = Depends(get_session)
 ):
-    """Upload a text or PDF file for the AI Tutor."""
-    content = ""
+    """
+    Upload a text or PDF file for the AI Tutor.
+    A PDF is answered right away with 202 and status "processing"; its text is extracted
+    in the background (see process_pdf_upload). Poll /documents/{id}/status until "ready".
+    """
     filename = file.filename.lower() if file.filename else ""
-    file_path = None
-    file_type = "text"
+    is_pdf = filename.endswith(".pdf")
 
     try:
-        content_bytes = await file.read()
-        
-        if filename.endswith(".pdf"):
-            file_type = "pdf"
-            # Save the PDF file to Supabase
-            doc_id = str(uuid4())
-            file_path = f"{doc_id}_{file.filename}"
-            
-            from supabase import create_client, Client
-            url = os.getenv("SUPABASE_URL")
-            key = os.getenv("SUPABASE_KEY")
-            if url and key:
-                supabase: Client = create_client(url, key)
-                supabase.storage.from_("tutor_documents").upload(
-                    file_path,
-                    content_bytes,
-                    file_options={"cache-control": "3600", "upsert": "true"}
-                )
-            else:
-                print("WARNING: Supabase not configured. Tutor docs won't be saved.")
-            
-            # Extract text for AI processing
-            try:
-                pdf_reader = pypdf.PdfReader(io.BytesIO(content_bytes))
-                for page in pdf_reader.pages:
-                    text = page.extract_text()
-                    if text:
-                        content += text + "\n"
-            except Exception as e:
-                print(f"PDF Extraction Error: {e}")
-                # Delete the saved file if extraction fails
-                if url and key:
-                    supabase.storage.from_("tutor_documents").remove([file_path])
-                raise HTTPException(status_code=400, detail="Could not extract text from PDF.")
-        else:
-            # Assume text/markdown
-            content = content_bytes.decode("utf-8", errors="ignore")
-
+        path = await save_upload(file, ".pdf" if is_pdf else ".txt")
     except HTTPException as he:
         raise he
     except Exception as e:
         raise HTTPException(status_code=400, detail="Could not read file.")
 
+    if is_pdf:
+        try:
+            pages = await pdf_extractor.page_count(path)
+        except PdfError as e:
+            os.unlink(path)
+            raise HTTPException(status_code=400, detail=str(e))
+
+        doc_id = str(uuid4())
+        doc = TutorDocument(
+            id=doc_id,
+            user_id=current_user.id,
+            filename=file.filename,
+            content="",
+            file_path=f"{doc_id}_{file.filename}",
+            file_type="pdf",
+            status="processing",
+            created_at=datetime.now(timezone.utc)
+        )
+        session.add(doc)
+        session.commit()
+        background_tasks.add_task(process_pdf_upload, doc_id, path, pages)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"id": doc_id, "filename": file.filename, "file_type": "pdf", "status": "processing", "pages": pages, "chunks": 0}
+
+    try:
+        # Assume text/markdown
+        with open(path, "rb") as f:
+            content = f.read().decode("utf-8", errors="ignore")
+    except Exception as e:
+        raise HTTPException(status_code=400, detail="Could not read file.")
+    finally:
+        os.unlink(path)
+
     if not content.strip():
         raise HTTPException(status_code=400, detail="File is empty or could not be parsed.")
 
     doc = TutorDocument(
-        id=doc_id if file_type == "pdf" else str(uuid4()),
+        id=str(uuid4()),
         user_id=current_user.id,
         filename=file.filename,
         content=content,
-        file_path=file_path,
-        file_type=file_type,
+        file_type="text",
         created_at=datetime.now(timezone.utc)
     )
     session.add(doc)
     session.commit()
     session.refresh(doc)
 
-    return {"id": doc.id, "filename": doc.filename, "file_type": doc.file_type}
+    chunks = await index_for_retrieval(session, doc, http_request)
+    return {"id": doc.id, "filename": doc.filename, "file_type": doc.file_type, "status": doc.status, "chunks": chunks}
+
+@router.get("/documents/{document_id}/status", response_model=DocumentStatusResponse)
+async def get_document_status(
+    document_id: str,
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    """Processing status of an uploaded document: "processing", "ready" or "failed" (with the error)."""
+    doc = session.exec(
+        select(TutorDocument).where(
+            TutorDocument.id == document_id,
+            TutorDocument.user_id == current_user.id
+        )
+    ).first()
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found.")
+    return DocumentStatusResponse(id=doc.id, status=doc.status, error=doc.error)
 
 @router.get("/documents", response_model=List[dict])
 async def get_documents(
@@ -146,6 +297,7 @@ async def get_documents(
         "id": d.id, 
         "filename": d.filename, 
         "file_type": d.file_type,
+        "status": d.status,
         "created_at": d.created_at
     } for d in docs]
 
@@ -170,9 +322,35 @@ async def get_document_content(
         content=doc.content,
         file_path=doc.file_path,
         file_type=doc.file_type,
+        status=doc.status,
+        error=doc.error,
         created_at=doc.created_at
     )
 
+@router.get("/documents/{document_id}/search", response_model=DocumentSearchResponse)
+async def search_document(
+    document_id: str,
+    q: str = Query(..., min_length=1, max_length=500),
+    limit: int = Query(10, ge=1, le=50),
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    """Keyword (BM25) search within one of the user's documents, best passages first."""
+    doc = session.exec(
+        select(TutorDocument).where(
+            TutorDocument.id == document_id,
+            TutorDocument.user_id == current_user.id
+        )
+    ).first()
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found.")
+    require_ready(doc)
+    passages = tutor_index.keyword_search(session, doc, q, k=limit)
+    return DocumentSearchResponse(
+        query=q,
+        results=[SearchResult(passage=p.ordinal + 1, score=round(p.score, 4), content=p.content) for p in passages]
+    )
+
 @router.get("/files/{document_id}")
 async def serve_document_file(
     document_id: str,
@@ -237,21 +415,15 @@ async def serve_document_file(
     from fastapi.responses import RedirectResponse
     return RedirectResponse(url=signed_url)
 
-@router.post("/chat", response_model=TutorChatResponse)
-async def chat_with_tutor(
-    request: TutorChatRequest,
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
-):
-    """Chat with the AI Tutor about the document content."""
-    if not client:
-        raise HTTPException(
-            status_code=500, 
-            detail="AI Tutor is not configured. Please contact the administrator."
-        )
+DAILY_LIMITS = {"basic": 5, "pro": 50, "premium": -1, "max": -1}
+CHAT_MODEL = 'gemini-2.0-flash'
+TUTOR_INSTRUCTION = (
+    "You are a helpful AI Tutor. You are answering questions based on the following document context. "
+    "If the answer is not in the document, try to answer generally but mention you are going outside the context."
+)
 
-    # --- Subscription Limit Check ---
-    DAILY_LIMITS = {"basic": 5, "pro": 50, "premium": -1, "max": -1}
+def check_daily_limit(current_user: User):
+    """Raise 402 when the user's plan has no AI queries left today (resets the counter on a new day)."""
     tier = current_user.subscription_tier or "basic"
 
     # Check if subscription is expired (downgrade to basic)
@@ -276,6 +448,19 @@ async def chat_with_tutor(
             detail=f"Daily AI query limit reached ({daily_limit}/day on {tier.title()} plan). Upgrade your plan to get more queries."
         )
 
+def count_ai_query(session: Session, current_user: User):
+    current_user.ai_queries_today += 1
+    session.add(current_user)
+    session.commit()
+
+async def build_chat(request: TutorChatRequest, current_user: User, session: Session, http_request: Request):
+    """
+    The prompt for a chat question about one of the user's documents, the history in Gemini's format,
+    and the chat config. The context is the document's passages most relevant to the question
+    (see app/tutor_index.py), or the start of the document when it cannot be indexed. A large enough
+    document is also sent once as a provider-cached prefix with the instructions (see app/prompt_cache.py),
+    and turns referencing it send only the passages and the question.
+    """
     doc = session.exec(
         select(TutorDocument).where(
             TutorDocument.id == request.document_id,
@@ -284,12 +469,7 @@ async def chat_with_tutor(
     ).first()
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found.")
-
-    context_prompt = (
-        f"You are a helpful AI Tutor. You are answering questions based on the following document context. "
-        f"If the answer is not in the document, try to answer generally but mention you are going outside the context.\n\n"
-        f"Document Content:\n{doc.content[:30000]}\n\n"
-    )
+    require_ready(doc)
 
     # Convert frontend history to proper format
     formatted_history = []
@@ -301,17 +481,53 @@ async def chat_with_tutor(
         ]
         formatted_history.append({"role": role, "parts": text_parts})
 
+    question = f"Question: {request.message}"
+    cached_prefix = await prompt_cache.prefix_for(doc, CHAT_MODEL, TUTOR_INSTRUCTION)
+    excerpts = await tutor_index.context_for(session, doc, request.message, request=http_request)
+    if cached_prefix is not None:
+        # The instructions and whole document are in the cache; the excerpts point at what matters here
+        if excerpts is None:
+            return question, formatted_history, {"cached_content": cached_prefix}
+        prompt = f"Passages of \"{doc.filename}\" most relevant to the question:\n{excerpts}\n\n{question}"
+        return prompt, formatted_history, {"cached_content": cached_prefix}
+
+    if excerpts is not None:
+        context = f"Document Excerpts (the parts of \"{doc.filename}\" most relevant to the question):\n{excerpts}"
+    else:
+        context = f"Document Content:\n{doc.content[:30000]}"
+
+    return f"{TUTOR_INSTRUCTION}\n\n{context}\n\n{question}", formatted_history, None
+
+@router.post("/chat", response_model=TutorChatResponse)
+async def chat_with_tutor(
+    request: TutorChatRequest,
+    http_request: Request,
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    """Chat with the AI Tutor about the document content."""
+    if not llm.is_configured():
+        raise HTTPException(
+            status_code=500, 
+            detail="AI Tutor is not configured. Please contact the administrator."
+        )
+
+    # --- Subscription Limit Check ---
+    check_daily_limit(current_user)
+    prompt, history, config = await build_chat(request, current_user, session, http_request)
+
     try:
-        chat = client.chats.create(model='gemini-2.0-flash', history=formatted_history)
-        response = chat.send_message(context_prompt + f"Question: {request.message}")
+        response = await llm.chat(prompt, model=CHAT_MODEL, history=history, config=config, request=http_request)
 
         # Increment usage counter
-        current_user.ai_queries_today += 1
-        session.add(current_user)
-        session.commit()
+        count_ai_query(session, current_user)
 
         return TutorChatResponse(response=response.text)
+    except HTTPException:
+        raise
     except Exception as e:
+        if config:
+            prompt_cache.forget(request.document_id, CHAT_MODEL)  # Registered again on the next turn
         print(f"Chat error: {e}")
         print(f"Error type: {type(e).__name__}")
         print(f"Error details: {str(e)}")
@@ -321,19 +537,87 @@ async def chat_with_tutor(
         )
 
 
-@router.post("/generate/quiz", response_model=QuizResponse)
-async def generate_quiz(
-    request: GenerateRequest,
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def chat_events(stream, first):
+    """
+    Server-Sent Events for a started reply: "start" with the first text, a "token"
+    per further chunk, then "done" with the whole reply. A failure mid-stream ends
+    with "error" carrying the partial reply, which the client keeps.
+    """
+    parts = [first.text or ""] if first is not None else []
+    finished = False
+    try:
+        yield sse("start", {"text": "".join(parts)})
+        while (chunk := await llm.next_chunk(stream)) is not None:
+            if chunk.text:
+                parts.append(chunk.text)
+                yield sse("token", {"text": chunk.text})
+        finished = True
+        yield sse("done", {"response": "".join(parts)})
+    except Exception as e:
+        detail = e.detail if isinstance(e, HTTPException) else f"AI chat failed: {str(e)}"
+        print(f"Chat stream error: {e}")
+        yield sse("error", {"detail": detail, "partial": "".join(parts)})
+    finally:
+        if not finished:
+            # Client went away (the response is cancelled) or the provider failed: stop generating
+            print(f"Chat stream ended early after {sum(len(p) for p in parts)} characters")
+            with anyio.CancelScope(shield=True):
+                try:
+                    await stream.aclose()
+                except Exception:
+                    pass
+
+@router.post("/chat/stream")
+async def chat_with_tutor_stream(
+    request: TutorChatRequest,
+    http_request: Request,
     current_user: User = Depends(get_current_user),
     session: Session = Depends(get_session)
 ):
-    """Generate a multiple-choice quiz from the document content."""
-    if not client:
+    """
+    Streaming variant of /chat: the reply is sent as Server-Sent Events (see chat_events)
+    as Gemini produces it. Waits for the first chunk before answering, so failures up to
+    then are ordinary HTTP errors and the daily quota is only charged for a started stream.
+    """
+    if not llm.is_configured():
         raise HTTPException(
-            status_code=500, 
-            detail="AI Quiz generator is not configured. Please contact the administrator."
+            status_code=500,
+            detail="AI Tutor is not configured. Please contact the administrator."
         )
 
+    check_daily_limit(current_user)
+    prompt, history, config = await build_chat(request, current_user, session, http_request)
+
+    try:
+        stream = await llm.chat_stream(prompt, model=CHAT_MODEL, history=history, config=config, request=http_request)
+        first = await llm.next_chunk(stream, request=http_request)
+    except HTTPException:
+        raise
+    except Exception as e:
+        if config:
+            prompt_cache.forget(request.document_id, CHAT_MODEL)
+        print(f"Chat error: {e}")
+        raise HTTPException(status_code=500, detail=f"AI chat failed: {str(e)}")
+
+    count_ai_query(session, current_user)
+    return StreamingResponse(
+        chat_events(stream, first),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/generate/quiz", response_model=QuizResponse)
+async def generate_quiz(
+    request: GenerateRequest,
+    http_request: Request,
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    """Generate a multiple-choice quiz from the document content (cached per content, see app/generation_cache.py)."""
     doc = session.exec(
         select(TutorDocument).where(
             TutorDocument.id == request.document_id,
@@ -342,19 +626,34 @@ async def generate_quiz(
     ).first()
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found.")
-    
+    require_ready(doc)
+
+    content = doc.content[:20000]
+    cache_key = generation_cache.key("quiz", content, QUIZ_PROMPT_VERSION, GENERATION_MODEL)
+    if not request.fresh:
+        cached = generation_cache.get(session, cache_key)
+        if cached is not None:
+            return QuizResponse(questions=[QuizQuestion(**q) for q in cached], cached=True)
+
+    if not llm.is_configured():
+        raise HTTPException(
+            status_code=500, 
+            detail="AI Quiz generator is not configured. Please contact the administrator."
+        )
+
     prompt = (
         f"Based on the following document content, generate exactly 10 multiple-choice quiz questions. "
         f"Each question MUST have exactly 4 options (A, B, C, D) and one correct answer. "
         f"Return the output strictly as a JSON list of objects with keys: 'question', 'options' (a list of 4 strings), and 'correct_answer' (the text of the correct option).\n\n"
-        f"Document Content:\n{doc.content[:20000]}"
+        f"Document Content:\n{content}"
     )
 
     try:
-        response = client.models.generate_content(
-            model='gemini-2.0-flash',
-            contents=prompt,
-            config={"response_mime_type": "application/json"}
+        response = await llm.generate(
+            prompt,
+            model=GENERATION_MODEL,
+            config={"response_mime_type": "application/json"},
+            request=http_request
         )
         quiz_data = json.loads(response.text)
         
@@ -364,7 +663,14 @@ async def generate_quiz(
             else:
                 raise ValueError("Expected a list of questions")
         
-        return QuizResponse(questions=[QuizQuestion(**q) for q in quiz_data])
+        questions = [QuizQuestion(**q) for q in quiz_data]
+        generation_cache.put(
+            session, cache_key, kind="quiz", content=content, prompt_version=QUIZ_PROMPT_VERSION,
+            model=GENERATION_MODEL, items=[q.model_dump() for q in questions]
+        )
+        return QuizResponse(questions=questions)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Quiz Generation Error: {e}")
         raise HTTPException(status_code=500, detail=f"AI Quiz generation failed: {str(e)}")
@@ -373,16 +679,11 @@ async def generate_quiz(
 @router.post("/generate/flashcards", response_model=FlashcardsResponse)
 async def generate_flashcards(
     request: GenerateRequest,
+    http_request: Request,
     current_user: User = Depends(get_current_user),
     session: Session = Depends(get_session)
 ):
-    """Generate flashcards (term/definition pairs) from the document content."""
-    if not client:
-        raise HTTPException(
-            status_code=500, 
-            detail="AI Flashcard generator is not configured. Please contact the administrator."
-        )
-
+    """Generate flashcards (term/definition pairs) from the document content (cached per content)."""
     doc = session.exec(
         select(TutorDocument).where(
             TutorDocument.id == request.document_id,
@@ -391,19 +692,34 @@ async def generate_flashcards(
     ).first()
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found.")
+    require_ready(doc)
+
+    content = doc.content[:20000]
+    cache_key = generation_cache.key("flashcards", content, FLASHCARDS_PROMPT_VERSION, GENERATION_MODEL)
+    if not request.fresh:
+        cached = generation_cache.get(session, cache_key)
+        if cached is not None:
+            return FlashcardsResponse(flashcards=[FlashcardItem(**f) for f in cached], cached=True)
+
+    if not llm.is_configured():
+        raise HTTPException(
+            status_code=500, 
+            detail="AI Flashcard generator is not configured. Please contact the administrator."
+        )
 
     prompt = (
         f"Based on the following document content, generate exactly 15 flashcards for studying. "
         f"Each flashcard should have a 'term' (a key concept, word, or question) and a 'definition' (the explanation or answer). "
         f"Return the output strictly as a JSON list of objects with keys: 'term' and 'definition'.\n\n"
-        f"Document Content:\n{doc.content[:20000]}"
+        f"Document Content:\n{content}"
     )
 
     try:
-        response = client.models.generate_content(
-            model='gemini-2.0-flash',
-            contents=prompt,
-            config={"response_mime_type": "application/json"}
+        response = await llm.generate(
+            prompt,
+            model=GENERATION_MODEL,
+            config={"response_mime_type": "application/json"},
+            request=http_request
         )
         flashcards_data = json.loads(response.text)
         
@@ -413,7 +729,14 @@ async def generate_flashcards(
             else:
                 raise ValueError("Expected a list of flashcards")
         
-        return FlashcardsResponse(flashcards=[FlashcardItem(**f) for f in flashcards_data])
+        flashcards = [FlashcardItem(**f) for f in flashcards_data]
+        generation_cache.put(
+            session, cache_key, kind="flashcards", content=content, prompt_version=FLASHCARDS_PROMPT_VERSION,
+            model=GENERATION_MODEL, items=[f.model_dump() for f in flashcards]
+        )
+        return FlashcardsResponse(flashcards=flashcards)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Flashcard Generation Error: {e}")
         raise HTTPException(status_code=500, detail=f"AI Flashcard generation failed: {str(e)}")
@@ -1,14 +1,36 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query, Depends, status
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Tuple
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query, HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from pydantic import ValidationError
 from sqlmodel import Session, select
 from jose import jwt, JWTError
 
-from ..websocket_manager import manager
+from . import community
+from ..websocket_manager import manager, Connection, negotiate_codec, decode_frame, channel_topic
+from ..typing_indicators import typing_indicators
 from ..database import get_session
-from ..schemas import User
+from ..schemas import User, Channel, CommunityMember, DMConversation, MessageCreate, SocketCommand
 from ..dependencies import settings
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
+COMMAND_TYPES = {"send_message", "reply", "edit_message", "delete_message", "vote", "typing"}
+
+# Successful acks by (user_id, client_id), so a command resent after a reconnect is not applied twice
+RECENT_ACKS_LIMIT = 2048
+recent_acks: "OrderedDict[Tuple[str, str], dict]" = OrderedDict()
+
+async def publish_typing(channel_id: str, user_id: str, event: dict):
+    await manager.publish(channel_topic(channel_id), event, exclude_user=user_id, replay=False)
+
+typing_indicators.publish = publish_typing
+
 async def get_current_user_ws(
     session: Session,
     token: str
@@ -24,32 +46,236 @@ async def get_current_user_ws(
     user = session.exec(select(User).where(User.username == username)).first()
     return user
 
+def can_subscribe(session: Session, user_id: str, topic: str) -> bool:
+    """
+    Check that a user may receive a topic's events:
+    channel:<id> (private study-group channels need membership),
+    community:<id> (community members) and dm:<id> (the two participants).
+    """
+    kind, _, target_id = topic.partition(":")
+    if not target_id:
+        return False
+
+    if kind == "channel":
+        channel = session.get(Channel, target_id)
+        return channel is not None and community.can_read_channel(session, user_id, channel)
+
+    if kind == "community":
+        return session.exec(
+            select(CommunityMember)
+            .where(CommunityMember.community_id == target_id)
+            .where(CommunityMember.user_id == user_id)
+        ).first() is not None
+
+    if kind == "dm":
+        conversation = session.get(DMConversation, target_id)
+        return conversation is not None and user_id in (conversation.user1_id, conversation.user2_id)
+
+    return False
+
+async def handle_subscription(connection: Connection, session: Session, data: dict):
+    """
+    Apply a {"type": "subscribe" | "unsubscribe", "topics": [...]} command and acknowledge it.
+
+    A reconnecting client may add {"epoch": ..., "since": {topic: last_seq}} to a subscribe:
+    the events it missed are replayed right after the ack, and topics that cannot be
+    replayed are listed under "resync" for the client to refetch. The ack also carries
+    this worker's epoch and the current seq of every accepted topic.
+    """
+    topics = [t for t in data.get("topics", []) if isinstance(t, str)]
+
+    if data["type"] == "unsubscribe":
+        for topic in topics:
+            manager.unsubscribe(connection, topic)
+        await manager.send_to_connection(connection, {"type": "unsubscribed", "topics": topics})
+        return
+
+    since = data.get("since") if isinstance(data.get("since"), dict) else {}
+    same_epoch = data.get("epoch") == manager.worker_id
+
+    accepted, rejected, resync, missed = [], [], [], []
+    for topic in topics:
+        if not can_subscribe(session, connection.user_id, topic):
+            rejected.append(topic)
+            continue
+        manager.subscribe(connection, topic)
+        accepted.append(topic)
+        if topic not in since:
+            continue
+        last_seq, events = since[topic], None
+        if same_epoch and isinstance(last_seq, int):
+            events = manager.missed_events(topic, last_seq, connection.user_id)
+        if events is None:
+            resync.append(topic)
+        else:
+            missed.extend(events)
+
+    # Nothing yields between subscribing and queueing the replay, so no live event can slip in between
+    await manager.send_to_connection(connection, {
+        "type": "subscribed", "topics": accepted, "rejected": rejected,
+        "epoch": manager.worker_id, "seq": {topic: manager.current_seq(topic) for topic in accepted},
+        "resync": resync,
+    })
+    for event in missed:
+        await manager.send_to_connection(connection, event)
+
+@contextmanager
+def command_session(websocket: WebSocket):
+    """
+    A fresh session for one command, honoring dependency overrides like Depends(get_session) does.
+    Sockets never hold a session between commands, so open sockets do not tie up pooled connections.
+    """
+    provider = websocket.app.dependency_overrides.get(get_session, get_session)
+    sessions = provider()
+    try:
+        yield next(sessions)
+    finally:
+        sessions.close()
+
+def require_fields(command: SocketCommand, *fields: str):
+    missing = [field for field in fields if getattr(command, field) is None]
+    if missing:
+        raise HTTPException(status_code=422, detail=f"Missing field(s): {', '.join(missing)}")
+
+async def run_command(connection: Connection, session: Session, command: SocketCommand) -> Any:
+    """Run a chat command through the same handler (and validation) as its REST endpoint."""
+    if command.type == "typing":
+        require_fields(command, "channel_id")
+        if channel_topic(command.channel_id) not in connection.topics:
+            raise HTTPException(status_code=403, detail="Subscribe to the channel first")
+        # Coalesced: at most one event per user per channel per interval
+        emitted = await typing_indicators.touch(command.channel_id, connection.user_id)
+        return {"emitted": emitted}
+
+    user = session.get(User, connection.user_id)
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found")
+
+    if command.type == "send_message":
+        require_fields(command, "channel_id", "content")
+        typing_indicators.clear(command.channel_id, user.id)
+        return await community.create_message(
+            command.channel_id, MessageCreate(content=command.content), session=session, current_user=user
+        )
+    if command.type == "reply":
+        require_fields(command, "channel_id", "message_id", "content")
+        typing_indicators.clear(command.channel_id, user.id)
+        return await community.create_reply(
+            command.channel_id, command.message_id, MessageCreate(content=command.content),
+            session=session, current_user=user
+        )
+    if command.type == "edit_message":
+        require_fields(command, "channel_id", "message_id", "content")
+        return await community.edit_message(
+            command.channel_id, command.message_id, MessageCreate(content=command.content),
+            session=session, current_user=user
+        )
+    if command.type == "delete_message":
+        require_fields(command, "channel_id", "message_id")
+        return await community.delete_message(
+            command.channel_id, command.message_id, session=session, current_user=user
+        )
+    if command.type == "vote":
+        require_fields(command, "channel_id", "message_id", "value")
+        return await community.vote_message(
+            command.channel_id, command.message_id, command.value, session=session, current_user=user
+        )
+    raise HTTPException(status_code=400, detail=f"Unknown command: {command.type}")
+
+async def handle_command(websocket: WebSocket, connection: Connection, data: dict):
+    """
+    Apply a chat command sent over the socket. Commands carrying a client_id are
+    acknowledged with {"type": "ack", "client_id", "ok", "result" | "status" + "error"}.
+    """
+    client_id = data.get("client_id")
+    try:
+        command = SocketCommand.model_validate(data)
+    except ValidationError as e:
+        if client_id is not None:
+            await manager.send_to_connection(connection, {
+                "type": "ack", "client_id": client_id, "ok": False, "status": 422,
+                "error": e.errors(include_url=False, include_context=False),
+            })
+        return
+
+    ack_key = (connection.user_id, command.client_id)
+    if command.client_id is not None and ack_key in recent_acks:
+        await manager.send_to_connection(connection, recent_acks[ack_key])
+        return
+
+    try:
+        with command_session(websocket) as session:
+            result = await run_command(connection, session, command)
+        ack = {"type": "ack", "client_id": command.client_id, "ok": True, "result": jsonable_encoder(result)}
+        if command.client_id is not None:
+            recent_acks[ack_key] = ack
+            if len(recent_acks) > RECENT_ACKS_LIMIT:
+                recent_acks.popitem(last=False)
+    except HTTPException as e:
+        ack = {"type": "ack", "client_id": command.client_id, "ok": False, "status": e.status_code, "error": e.detail}
+    except ValidationError as e:
+        ack = {
+            "type": "ack", "client_id": command.client_id, "ok": False, "status": 422,
+            "error": e.errors(include_url=False, include_context=False),
+        }
+    except Exception:
+        logger.exception(f"WebSocket command {command.type} failed")
+        ack = {"type": "ack", "client_id": command.client_id, "ok": False, "status": 500, "error": "Internal server error"}
+
+    if command.client_id is not None:
+        await manager.send_to_connection(connection, ack)
+
 @router.websocket("/ws/community/global")
 async def websocket_endpoint(
     websocket: WebSocket, 
-    token: str = Query(...),
-    session: Session = Depends(get_session)
+    token: str = Query(...)
 ):
     """
-    WebSocket endpoint for real-time global community chat.
+    WebSocket endpoint for real-time community chat.
     Authenticates user via token query parameter and manages connection.
-    Tracks user as online while connected.
+    Clients may request the "msgpack" subprotocol for binary MessagePack frames,
+    and can send, reply to, edit, delete and vote on messages over the socket
+    (see handle_command) instead of making an HTTP request each time.
+    Tracks user as online while any of their connections is open. Clients send subscribe/unsubscribe
+    commands for the channels, communities and DM conversations they have open, and answer the
+    server's {"type": "ping"} heartbeats with {"type": "pong"} (any frame counts as a sign of life).
     """
-    # Authenticate user
-    user = await get_current_user_ws(session, token)
+    # Authenticate user with a short-lived session: the socket may stay open for hours
+    with command_session(websocket) as session:
+        user = await get_current_user_ws(session, token)
     if not user:
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
+    user_id = user.id
 
+    # Wire format from the requested subprotocol ("msgpack" or "json"); JSON by default.
     # Connection manager handles online status broadcast inside connect()
-    await manager.connect(websocket, user.id)
+    codec = negotiate_codec(websocket.scope.get("subprotocols", []))
+    connection = await manager.connect(websocket, user_id, codec)
     
     try:
         while True:
-            # Keep connection alive; listen for any client pings
-            data = await websocket.receive_text()
-            # Could handle typing indicators here in the future
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", status.WS_1000_NORMAL_CLOSURE))
+            connection.touch()
+            data = decode_frame(frame.get("text") if frame.get("text") is not None else frame.get("bytes"))
+            if data is None:
+                continue  # Plain keep-alive pings
+
+            if data.get("type") == "ping":
+                await manager.send_to_connection(connection, {"type": "pong"})
+            elif data.get("type") in ("subscribe", "unsubscribe"):
+                with command_session(websocket) as session:
+                    await handle_subscription(connection, session, data)
+            elif data.get("type") in COMMAND_TYPES:
+                await handle_command(websocket, connection, data)
             
     except WebSocketDisconnect:
+        pass
+    finally:
+        # Any way out of the loop (including errors, or the reaper closing the socket) releases the connection.
         # Connection manager handles offline status broadcast inside disconnect()
-        await manager.disconnect(user.id)
+        await manager.disconnect(connection)
+        if not manager.user_connections(user_id):
+            typing_indicators.clear_user(user_id)
@@ -175,7 +175,7 @@ class TaskResponse(BaseModel): # Use TaskResponse for clarity instead of TaskInD
 
 # --- Community / Chat Models ---
 
-from sqlalchemy import Column, String
+from sqlalchemy import Column, String, LargeBinary, UniqueConstraint
 
 # NEW: Community (like a Discord Server)
 class Community(SQLModel, table=True):
@@ -201,8 +201,12 @@ class CommunityMember(SQLModel, table=True):
     user: Optional[User] = Relationship()
 
 class MessageVote(SQLModel, table=True):
+    # One vote per user per message; votes are written with INSERT ... ON CONFLICT on this key
+    __table_args__ = (UniqueConstraint("message_id", "user_id", name="uq_messagevote_message_user"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     value: int # 1 for upvote, -1 for downvote
+    previous_value: int = Field(default=0) # Value before the last upsert, returned to compute reputation deltas
     
     user_id: str = Field(foreign_key="user.id", index=True)
     message_id: int = Field(foreign_key="message.id", index=True)
@@ -259,6 +263,16 @@ class DMMessage(SQLModel, table=True):
     
     conversation: Optional[DMConversation] = Relationship(back_populates="messages")
 
+class ChannelReadState(SQLModel, table=True):
+    """Per-user read pointer for a channel (newest message the user has seen)."""
+    __table_args__ = (UniqueConstraint("user_id", "channel_id"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: str = Field(foreign_key="user.id", index=True)
+    channel_id: str = Field(foreign_key="channel.id", index=True)
+    last_read_message_id: int = Field(default=0)
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
 # --- Pydantic Schemas for Community ---
 
 class CommunityCreate(BaseModel):
@@ -336,6 +350,23 @@ class MessageResponse(BaseModel):
 
     model_config = {"from_attributes": True}
 
+class ChannelReadUpdate(BaseModel):
+    message_id: int  # Newest message the user has seen in the channel
+
+class ChannelUnreadResponse(BaseModel):
+    channel_id: str
+    last_read_message_id: int = 0
+    unread_count: int = 0
+
+class SocketCommand(BaseModel):
+    """Inbound command on the community WebSocket; client_id is echoed back in its ack."""
+    type: str
+    client_id: Optional[str] = None
+    channel_id: Optional[str] = None
+    message_id: Optional[int] = None
+    content: Optional[str] = None
+    value: Optional[int] = None
+
 class ThreadResponse(BaseModel):
     """Response containing a parent message and its replies."""
     parent: MessageResponse
@@ -709,7 +740,35 @@ class TutorDocument(SQLModel, table=True):
     content: str = Field(sa_column=Column(String)) # Use generic String, or Text for large content if supported by dialect
     file_path: Optional[str] = Field(default=None) # Path to original file for PDFs
     file_type: str = Field(default="text") # "pdf" or "text"
+    status: str = Field(default="ready") # "processing" while a PDF's text is extracted, then "ready" or "failed"
+    error: Optional[str] = Field(default=None) # Why processing failed, shown to the user
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class TutorChunk(SQLModel, table=True):
+    """A passage of a TutorDocument with its embedding (None until embedded), for retrieval (see app/tutor_index.py)."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    document_id: str = Field(foreign_key="tutordocument.id", index=True)
+    user_id: str = Field(foreign_key="user.id", index=True)
+    ordinal: int  # Position within the document
+    content: str = Field(sa_column=Column(String))
+    embedding: Optional[bytes] = Field(default=None, sa_column=Column(LargeBinary))  # float16 vector
+
+class TutorLexicalIndex(SQLModel, table=True):
+    """The BM25 keyword index over a TutorDocument's passages (see app/bm25.py)."""
+    document_id: str = Field(foreign_key="tutordocument.id", primary_key=True)
+    data: bytes = Field(sa_column=Column(LargeBinary))  # BM25Index.to_bytes()
+
+class GenerationCacheEntry(SQLModel, table=True):
+    """A generated quiz or flashcard set, shared by every request for the same content (see app/generation_cache.py)."""
+    key: str = Field(primary_key=True)  # sha256 of kind, prompt version, model and content hash
+    kind: str  # "quiz" or "flashcards"
+    model: str
+    prompt_version: int
+    content_hash: str = Field(index=True)
+    payload: str = Field(sa_column=Column(String))  # JSON list of generated items
+    hits: int = Field(default=0)
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    last_used_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), index=True)
 
 class TutorChatRequest(BaseModel):
     document_id: str
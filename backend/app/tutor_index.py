@@ -0,0 +1,263 @@
+"""
+Retrieval over AI Tutor documents.
+
+Sending the first 30k characters of a document on every chat turn misses later
+chapters and pays for a huge prompt. Instead, each document is split into
+overlapping passages when it is uploaded (chunk_text). The passages are stored
+as TutorChunk rows, together with a BM25 keyword index of the document
+(TutorLexicalIndex, see app/bm25.py). When the AI provider is available, every
+passage is also stored with its embedding (float16 bytes). For each user, the
+embeddings are loaded into one normalized float32 NumPy matrix. These matrices
+are kept in an LRU of RAG_INDEX_USERS users and rebuilt when that user's
+documents change. A question is answered from its RAG_TOP_K most similar
+passages, found with a single matrix-vector product. Without an embedding
+service (local development, provider outage), BM25 ranks the passages instead.
+
+Documents uploaded before indexing existed are indexed on their first chat.
+"""
+import logging
+import os
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+from fastapi import HTTPException, Request
+from sqlmodel import Session, select
+
+from . import llm
+from .bm25 import BM25Index
+from .schemas import TutorChunk, TutorDocument, TutorLexicalIndex
+
+logger = logging.getLogger(__name__)
+
+CHUNK_CHARS = int(os.getenv("RAG_CHUNK_CHARS", "1500"))
+CHUNK_OVERLAP = int(os.getenv("RAG_CHUNK_OVERLAP", "200"))
+TOP_K = int(os.getenv("RAG_TOP_K", "6"))
+INDEX_USERS = int(os.getenv("RAG_INDEX_USERS", "64"))
+LEXICAL_DOCUMENTS = int(os.getenv("RAG_LEXICAL_DOCUMENTS", "256"))
+
+
+def chunk_text(text: str, size: int = CHUNK_CHARS, overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """
+    Split text into passages of at most `size` characters, each starting about
+    `overlap` characters before the previous one ended. Passages end at a
+    paragraph, line, sentence or word break when there is one in their second half.
+    """
+    text = text.strip()
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            window = text[start:end]
+            for separator in ("\n\n", "\n", ". ", " "):
+                cut = window.rfind(separator, size // 2)
+                if cut != -1:
+                    end = start + cut + len(separator)
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        # Step back for the overlap, then forward to the start of a word
+        next_start = max(end - overlap, start + 1)
+        space = text.find(" ", next_start, end)
+        start = space + 1 if space != -1 else next_start
+    return chunks
+
+
+class Passage(NamedTuple):
+    document_id: str
+    ordinal: int
+    content: str
+    score: float
+
+
+class UserIndex:
+    """One user's passages: parallel lists plus the row-normalized embedding matrix."""
+
+    def __init__(self, chunks: List[TutorChunk]):
+        self.document_ids = np.array([c.document_id for c in chunks], dtype=object)
+        self._documents = set(c.document_id for c in chunks)
+        self.ordinals = [c.ordinal for c in chunks]
+        self.contents = [c.content for c in chunks]
+        if chunks:
+            matrix = np.stack([np.frombuffer(c.embedding, dtype=np.float16) for c in chunks]).astype(np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            self.matrix = matrix / norms
+        else:
+            self.matrix = np.zeros((0, llm.EMBEDDING_DIMENSIONS), dtype=np.float32)
+
+    def has_document(self, document_id: str) -> bool:
+        return document_id in self._documents
+
+    def search(self, query: np.ndarray, k: int, document_id: Optional[str] = None) -> List[Passage]:
+        """Top-k passages by cosine similarity to the query vector, best first."""
+        rows = np.arange(len(self.contents)) if document_id is None else np.flatnonzero(self.document_ids == document_id)
+        if rows.size == 0:
+            return []
+        query = query / (np.linalg.norm(query) or 1.0)
+        scores = self.matrix[rows] @ query
+        k = min(k, rows.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            Passage(self.document_ids[rows[i]], self.ordinals[rows[i]], self.contents[rows[i]], float(scores[i]))
+            for i in top
+        ]
+
+
+class TutorIndex:
+    """Stores passages with their embeddings and keyword indexes, and answers searches over them."""
+
+    def __init__(self, capacity: int = INDEX_USERS, lexical_capacity: int = LEXICAL_DOCUMENTS):
+        self.capacity = capacity
+        self.lexical_capacity = lexical_capacity
+        self._users: "OrderedDict[str, UserIndex]" = OrderedDict()
+        self._lexical: "OrderedDict[str, BM25Index]" = OrderedDict()
+
+    def invalidate(self, user_id: str):
+        self._users.pop(user_id, None)
+
+    def _get(self, session: Session, user_id: str) -> UserIndex:
+        index = self._users.get(user_id)
+        if index is not None:
+            self._users.move_to_end(user_id)
+            return index
+        chunks = session.exec(
+            select(TutorChunk)
+            .where(TutorChunk.user_id == user_id)
+            .where(TutorChunk.embedding.is_not(None))
+            .order_by(TutorChunk.id)
+        ).all()
+        # Vectors from a different embedding size (the model was changed) cannot be compared
+        width = llm.EMBEDDING_DIMENSIONS * 2
+        index = self._users[user_id] = UserIndex([c for c in chunks if len(c.embedding) == width])
+        if len(self._users) > self.capacity:
+            self._users.popitem(last=False)
+        return index
+
+    def _remember_lexical(self, document_id: str, index: BM25Index):
+        self._lexical[document_id] = index
+        self._lexical.move_to_end(document_id)
+        if len(self._lexical) > self.lexical_capacity:
+            self._lexical.popitem(last=False)
+
+    def _save_lexical(self, session: Session, document_id: str, passages: List[str]) -> BM25Index:
+        index = BM25Index.build(passages)
+        session.merge(TutorLexicalIndex(document_id=document_id, data=index.to_bytes()))
+        session.commit()
+        self._remember_lexical(document_id, index)
+        return index
+
+    def store_passages(self, session: Session, doc: TutorDocument) -> List[TutorChunk]:
+        """Split a document into passages and build its keyword index (no AI calls); returns the passages."""
+        passages = chunk_text(doc.content)
+        for old in session.exec(select(TutorChunk).where(TutorChunk.document_id == doc.id)).all():
+            session.delete(old)
+        chunks = [
+            TutorChunk(document_id=doc.id, user_id=doc.user_id, ordinal=ordinal, content=passage)
+            for ordinal, passage in enumerate(passages)
+        ]
+        session.add_all(chunks)
+        self._save_lexical(session, doc.id, passages)
+        self.invalidate(doc.user_id)
+        return chunks
+
+    def passages(self, session: Session, doc: TutorDocument) -> List[TutorChunk]:
+        """A document's passages in order; documents uploaded before indexing existed are split now."""
+        chunks = session.exec(
+            select(TutorChunk).where(TutorChunk.document_id == doc.id).order_by(TutorChunk.ordinal)
+        ).all()
+        return list(chunks) or self.store_passages(session, doc)
+
+    async def embed_document(self, session: Session, doc: TutorDocument, request: Optional[Request] = None) -> int:
+        """Embed the document's passages that have no embedding yet; returns how many were embedded."""
+        pending = session.exec(
+            select(TutorChunk.id).where(TutorChunk.document_id == doc.id, TutorChunk.embedding.is_(None))
+        ).first()
+        if pending is None and self.is_indexed(session, doc.id):
+            return 0
+        chunks = [c for c in self.passages(session, doc) if c.embedding is None]
+        vectors = await llm.embed([c.content for c in chunks], task_type="RETRIEVAL_DOCUMENT", request=request)
+        for chunk, vector in zip(chunks, vectors):
+            chunk.embedding = np.asarray(vector, dtype=np.float16).tobytes()
+            session.add(chunk)
+        session.commit()
+        self.invalidate(doc.user_id)
+        return len(chunks)
+
+    def is_indexed(self, session: Session, document_id: str) -> bool:
+        return session.exec(select(TutorChunk.id).where(TutorChunk.document_id == document_id)).first() is not None
+
+    async def search(self, session: Session, user_id: str, query: str, k: int = TOP_K,
+                     document_id: Optional[str] = None, request: Optional[Request] = None) -> List[Passage]:
+        """A user's passages most similar to the query, best first (optionally within one document)."""
+        index = self._get(session, user_id)
+        if document_id is not None and not index.has_document(document_id):
+            # Embedded since this matrix was built (possibly by another worker)
+            self.invalidate(user_id)
+            index = self._get(session, user_id)
+        if not index.contents:
+            return []
+        [vector] = await llm.embed([query], task_type="RETRIEVAL_QUERY", request=request)
+        return index.search(np.asarray(vector, dtype=np.float32), k, document_id)
+
+    def lexical(self, session: Session, doc: TutorDocument) -> BM25Index:
+        """The document's keyword index: from memory, from the database, or built now."""
+        index = self._lexical.get(doc.id)
+        if index is not None:
+            self._lexical.move_to_end(doc.id)
+            return index
+        row = session.get(TutorLexicalIndex, doc.id)
+        if row is None:
+            return self._save_lexical(session, doc.id, [c.content for c in self.passages(session, doc)])
+        index = BM25Index.from_bytes(row.data)
+        self._remember_lexical(doc.id, index)
+        return index
+
+    def keyword_search(self, session: Session, doc: TutorDocument, query: str, k: int = TOP_K) -> List[Passage]:
+        """The document's passages ranked by BM25 for the query, best first; needs no AI provider."""
+        hits = self.lexical(session, doc).search(query, k)
+        if not hits:
+            return []
+        contents = dict(session.exec(
+            select(TutorChunk.ordinal, TutorChunk.content)
+            .where(TutorChunk.document_id == doc.id, TutorChunk.ordinal.in_([h.ordinal for h in hits]))
+        ).all())
+        return [Passage(doc.id, h.ordinal, contents[h.ordinal], h.score) for h in hits if h.ordinal in contents]
+
+    async def context_for(self, session: Session, doc: TutorDocument, question: str,
+                          request: Optional[Request] = None) -> Optional[str]:
+        """
+        The passages of a document most relevant to a question, in document order.
+        Embedding similarity is used when the AI provider is available, BM25 otherwise;
+        None when neither finds anything (the caller falls back to the document's start).
+        """
+        passages = []
+        if llm.is_configured():
+            try:
+                await self.embed_document(session, doc, request=request)
+                passages = await self.search(session, doc.user_id, question, document_id=doc.id, request=request)
+            except HTTPException as e:
+                if e.status_code == 499:
+                    raise  # The client went away
+                logger.warning(f"Embedding search unavailable for tutor document {doc.id} ({e.detail}); using BM25")
+            except Exception:
+                logger.exception(f"Embedding search failed for tutor document {doc.id}; using BM25")
+        if not passages:
+            try:
+                passages = self.keyword_search(session, doc, question)
+            except Exception:
+                logger.exception(f"Keyword search failed for tutor document {doc.id}")
+                return None
+        if not passages:
+            return None
+        passages.sort(key=lambda p: p.ordinal)
+        return "\n\n".join(f"[Passage {p.ordinal + 1}]\n{p.content}" for p in passages)
+
+
+# Global instance
+tutor_index = TutorIndex()
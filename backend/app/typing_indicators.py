@@ -0,0 +1,97 @@
+"""
+Ephemeral, throttled typing indicators.
+
+Clients send a "typing" command on every keystroke (or every few). The server
+coalesces them: at most one "typing" event per user per channel every
+WS_TYPING_INTERVAL_MS, published only to that channel's subscribers. If no
+keystroke arrives for WS_TYPING_TTL_MS the indicator expires and a
+"typing_stopped" event is published. Nothing is written to the database.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TYPING_INTERVAL_MS = int(os.getenv("WS_TYPING_INTERVAL_MS", "3000"))
+TYPING_TTL_MS = int(os.getenv("WS_TYPING_TTL_MS", "6000"))
+
+Publisher = Callable[[str, str, dict], Awaitable[None]]
+
+
+class TypingIndicators:
+    """Tracks who is typing where; publish(channel_id, user_id, event) sends the coalesced events."""
+
+    def __init__(self, interval_ms: int = TYPING_INTERVAL_MS, ttl_ms: int = TYPING_TTL_MS):
+        self.interval = interval_ms / 1000
+        self.ttl = ttl_ms / 1000
+        self.publish: Optional[Publisher] = None
+        # (channel_id, user_id) -> (monotonic time of the last emitted event, expiry timer)
+        self._active: Dict[Tuple[str, str], Tuple[float, asyncio.TimerHandle]] = {}
+        self.emitted = 0
+        self.suppressed = 0
+
+    async def touch(self, channel_id: str, user_id: str) -> bool:
+        """Record a keystroke; returns True when it produced a "typing" event."""
+        key = (channel_id, user_id)
+        now = time.monotonic()
+        loop = asyncio.get_running_loop()
+
+        previous = self._active.get(key)
+        if previous is not None:
+            previous[1].cancel()
+        timer = loop.call_later(self.ttl, self._expire, key)
+
+        if previous is not None and now - previous[0] < self.interval:
+            self._active[key] = (previous[0], timer)
+            self.suppressed += 1
+            return False
+
+        self._active[key] = (now, timer)
+        self.emitted += 1
+        await self._publish(channel_id, user_id, {
+            "type": "typing",
+            "channel_id": channel_id,
+            "user_id": user_id,
+            "expires_in_ms": int(self.ttl * 1000),
+        })
+        return True
+
+    def clear(self, channel_id: str, user_id: str):
+        """Forget an indicator without an event (the user just sent their message)."""
+        entry = self._active.pop((channel_id, user_id), None)
+        if entry is not None:
+            entry[1].cancel()
+
+    def clear_user(self, user_id: str):
+        for key in [k for k in self._active if k[1] == user_id]:
+            self._expire(key)
+
+    def is_typing(self, channel_id: str, user_id: str) -> bool:
+        return (channel_id, user_id) in self._active
+
+    def _expire(self, key: Tuple[str, str]):
+        entry = self._active.pop(key, None)
+        if entry is None:
+            return
+        entry[1].cancel()
+        channel_id, user_id = key
+        asyncio.get_running_loop().create_task(self._publish(channel_id, user_id, {
+            "type": "typing_stopped",
+            "channel_id": channel_id,
+            "user_id": user_id,
+        }))
+
+    async def _publish(self, channel_id: str, user_id: str, event: dict):
+        if self.publish is None:
+            return
+        try:
+            await self.publish(channel_id, user_id, event)
+        except Exception:
+            logger.exception("Failed to publish typing indicator")
+
+
+# Global instance
+typing_indicators = TypingIndicators()
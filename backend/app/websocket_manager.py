@@ -1,75 +1,656 @@
 """
 WebSocket connection manager for real-time messaging.
-Handles connection tracking, message broadcasting, and online user tracking.
+Handles connection tracking, topic subscriptions, message broadcasting, and online user tracking.
+
+Clients subscribe to the topics they have open (a channel, a community, a DM
+conversation) and channel traffic is published only to those subscribers, so
+fan-out cost is proportional to the audience rather than to everyone online.
+
+A user may hold several connections at once (browser tabs, the mobile app).
+Each has its own ID and its own subscriptions, targeted sends reach all of
+them, and presence is reference-counted: user_online fires for the first
+connection and user_offline only when the last one closes.
+
+Every connection has a bounded outbound queue drained by its own writer task.
+Broadcasting only enqueues, so a slow client never delays the others or the
+HTTP request that triggered the event. When a client's queue is full the
+WS_SLOW_CONSUMER_POLICY applies: "disconnect" closes the socket (the client
+reconnects and refetches), "drop" discards the event for that client.
+
+With several worker processes, each manager delivers an event to its own
+sockets and forwards it through a pub/sub Broker (app/pubsub.py) to the other
+workers, which deliver it to theirs. Presence is merged the same way: a user
+is online while any worker holds a connection for them. Every
+WS_PRESENCE_HEARTBEAT_S each worker sends the full list of its users, which
+replaces what the others know about it; a worker not heard from for
+WS_PRESENCE_TTL_S (it crashed, or lost the broker) has its users dropped.
+Whenever a worker (re)connects to the broker it announces its users and asks
+the others for theirs.
+
+Presence changes are announced to clients in batches: at most one
+{"type": "presence_diff", "online": [...], "offline": [...]} event every
+WS_PRESENCE_BATCH_MS. A user must stay offline for WS_PRESENCE_GRACE_MS before
+being announced offline, so quick reconnects (a page reload, a deploy) never
+reach clients at all.
+
+Each event is JSON-encoded once (with orjson) and the same text frame is queued
+for every recipient, instead of send_json re-encoding the dict per socket.
+
+Clients pick the wire format with the WebSocket subprotocol: "json" (text
+frames, also the default when no subprotocol is requested) or "msgpack"
+(binary MessagePack frames). WS_SUBPROTOCOLS lists the subprotocols offered;
+start() refuses to run when one of them has no codec installed. A broadcast is encoded at most once per format. permessage-deflate is
+negotiated by the server (uvicorn --ws-per-message-deflate) during the
+handshake whenever the client offers it.
+
+Topic events carry "topic" and "seq", a number increasing by one per topic, and
+each worker keeps the last WS_REPLAY_BUFFER_SIZE events of its
+WS_REPLAY_TOPICS most recently active topics. A client that reconnects sends
+the last seq it saw per topic (with the epoch from its previous subscribe ack)
+and gets only the events it missed. When they have left the buffer, or the
+client lands on another worker or a restarted one (a different epoch), the
+topic is reported for resync and the client refetches it over HTTP.
+
+Half-open connections (a phone that lost its network) are found by a reaper
+that runs every WS_HEARTBEAT_INTERVAL_S: connections that have sent nothing
+for an interval get an application-level {"type": "ping"} (answered with
+"pong"), and those silent for WS_IDLE_TIMEOUT_S are closed and removed. A
+connection whose send fails is removed straight away. Protocol-level pings
+are configured on uvicorn as well (see start.sh). stats() reports the gauges.
 """
-from typing import Dict, List, Optional
-from fastapi import WebSocket
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple, Union
+from uuid import uuid4
+from fastapi import WebSocket, status
+
+from .pubsub import Broker
+
+import orjson
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - checked by check_subprotocols() when msgpack is offered
+    msgpack = None
+
+def encode_frame(message: dict) -> str:
+    return orjson.dumps(message, option=orjson.OPT_NON_STR_KEYS).decode()
+
+JSON = "json"
+MSGPACK = "msgpack"
+
+SUBPROTOCOLS = [name.strip() for name in os.getenv("WS_SUBPROTOCOLS", "msgpack,json").split(",") if name.strip()]
+
+Frame = Union[str, bytes]
+
+
+def check_subprotocols(names: Optional[Iterable[str]] = None):
+    """Raise if a configured subprotocol is unknown or its codec is not installed."""
+    for name in SUBPROTOCOLS if names is None else names:
+        if name not in (JSON, MSGPACK):
+            raise RuntimeError(f"WS_SUBPROTOCOLS: unknown subprotocol {name!r}")
+        if name == MSGPACK and msgpack is None:
+            raise RuntimeError(
+                "WS_SUBPROTOCOLS offers msgpack but the msgpack package is not installed "
+                "(pip install -r requirements.txt, or drop it from WS_SUBPROTOCOLS)"
+            )
+
+def negotiate_codec(offered: Iterable[str]) -> Optional[str]:
+    """First subprotocol offered by the client that this server speaks, or None (plain JSON)."""
+    for name in offered:
+        if name in SUBPROTOCOLS:
+            return name
+    return None
+
+def encode_for(codec: str, message: dict) -> Frame:
+    if codec == MSGPACK:
+        return msgpack.packb(message, use_bin_type=True)
+    return encode_frame(message)
+
+def decode_frame(raw: Optional[Frame]) -> Optional[dict]:
+    """Decode an inbound text (JSON) or binary (MessagePack) frame; None if it is not a command object."""
+    try:
+        if isinstance(raw, str):
+            data = json.loads(raw)
+        elif isinstance(raw, bytes) and msgpack is not None:
+            data = msgpack.unpackb(raw, raw=False)
+        else:
+            return None
+    except (ValueError, TypeError):  # msgpack errors subclass ValueError too
+        return None
+    return data if isinstance(data, dict) else None
+
+logger = logging.getLogger(__name__)
+
+SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+SLOW_CONSUMER_POLICY = os.getenv("WS_SLOW_CONSUMER_POLICY", "disconnect").lower()
+PRESENCE_BATCH_MS = int(os.getenv("WS_PRESENCE_BATCH_MS", "1000"))
+PRESENCE_GRACE_MS = int(os.getenv("WS_PRESENCE_GRACE_MS", "5000"))
+REPLAY_BUFFER_SIZE = int(os.getenv("WS_REPLAY_BUFFER_SIZE", "100"))
+REPLAY_TOPICS = int(os.getenv("WS_REPLAY_TOPICS", "1000"))
+HEARTBEAT_INTERVAL_S = float(os.getenv("WS_HEARTBEAT_INTERVAL_S", "25"))
+IDLE_TIMEOUT_S = float(os.getenv("WS_IDLE_TIMEOUT_S", "60"))
+PRESENCE_HEARTBEAT_S = float(os.getenv("WS_PRESENCE_HEARTBEAT_S", "10"))
+PRESENCE_TTL_S = float(os.getenv("WS_PRESENCE_TTL_S", "30"))
+
+
+def channel_topic(channel_id: str) -> str:
+    return f"channel:{channel_id}"
+
+def community_topic(community_id: str) -> str:
+    return f"community:{community_id}"
+
+def dm_topic(conversation_id: str) -> str:
+    return f"dm:{conversation_id}"
+
+
+class Connection:
+    """A WebSocket with its bounded outbound queue, writer task and topic subscriptions."""
+
+    def __init__(self, websocket: WebSocket, user_id: str, queue_size: int, codec: str = JSON):
+        self.id = uuid4().hex
+        self.websocket = websocket
+        self.user_id = user_id
+        self.codec = codec
+        self.topics: Set[str] = set()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.writer: Optional[asyncio.Task] = None
+        self.dropped = 0
+        self.last_seen = time.monotonic()
+
+    def touch(self):
+        """Record that the client sent something (any frame proves the connection is alive)."""
+        self.last_seen = time.monotonic()
+
+    def offer(self, frame: Frame) -> bool:
+        """Enqueue a pre-encoded frame without waiting; False when the queue is full."""
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def write_loop(self):
+        while True:
+            frame = await self.queue.get()
+            if isinstance(frame, bytes):
+                await self.websocket.send_bytes(frame)
+            else:
+                await self.websocket.send_text(frame)
+
+    async def close(self, code: int = status.WS_1000_NORMAL_CLOSURE):
+        if self.writer is not None and self.writer is not asyncio.current_task():
+            self.writer.cancel()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass  # Already closed by the client
 
 
 class ConnectionManager:
     """Manages WebSocket connections for real-time messaging."""
-    
-    def __init__(self):
-        # Map of user_id -> WebSocket connection
-        self.active_connections: Dict[str, WebSocket] = {}
-    
-    async def connect(self, websocket: WebSocket, user_id: str):
-        """Accept a new WebSocket connection for a user."""
-        await websocket.accept()
-        self.active_connections[user_id] = websocket
-        # Broadcast online status
-        await self.broadcast_all({
-            "type": "user_online",
-            "user_id": user_id
-        }, exclude_user=user_id)
-    
-    async def disconnect(self, user_id: str):
-        """Remove a WebSocket connection for a user."""
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
-            # Broadcast offline status
-            await self.broadcast_all({
-                "type": "user_offline",
-                "user_id": user_id
-            })
-    
+
+    def __init__(
+        self,
+        queue_size: int = SEND_QUEUE_SIZE,
+        slow_consumer_policy: str = SLOW_CONSUMER_POLICY,
+        presence_batch_ms: int = PRESENCE_BATCH_MS,
+        presence_grace_ms: int = PRESENCE_GRACE_MS,
+        replay_buffer_size: int = REPLAY_BUFFER_SIZE,
+        replay_topics: int = REPLAY_TOPICS,
+        heartbeat_interval_s: float = HEARTBEAT_INTERVAL_S,
+        idle_timeout_s: float = IDLE_TIMEOUT_S,
+        presence_heartbeat_s: float = PRESENCE_HEARTBEAT_S,
+        presence_ttl_s: float = PRESENCE_TTL_S,
+    ):
+        # Map of user_id -> {connection_id: Connection} for this worker's sockets
+        self.active_connections: Dict[str, Dict[str, Connection]] = {}
+        # Map of topic -> subscribed connections
+        self.topic_subscribers: Dict[str, Set[Connection]] = {}
+        self.queue_size = queue_size
+        self.slow_consumer_policy = slow_consumer_policy
+        self.dropped_messages = 0
+        self.slow_consumer_disconnects = 0
+        self.send_failures = 0
+        # Heartbeat and idle reaping
+        self.heartbeat_interval = heartbeat_interval_s
+        self.idle_timeout = idle_timeout_s
+        self.reaped_connections = 0
+        self._reaper: Optional[asyncio.Task] = None
+        # Cross-worker state
+        self.worker_id = uuid4().hex
+        self.broker: Optional[Broker] = None
+        # Map of user_id -> IDs of the workers holding a connection for that user
+        self.presence: Dict[str, Set[str]] = {}
+        # Other workers by ID -> when they were last heard from (time.monotonic())
+        self.worker_seen: Dict[str, float] = {}
+        self.presence_heartbeat = presence_heartbeat_s
+        self.presence_ttl = presence_ttl_s
+        self.expired_workers = 0
+        self._heartbeat: Optional[asyncio.Task] = None
+        # Presence as last announced to clients, users changed since, and when each went offline
+        self.announced: Set[str] = set()
+        self._presence_dirty: Set[str] = set()
+        self._offline_since: Dict[str, float] = {}
+        self._presence_flush: Optional[asyncio.Task] = None
+        self.presence_batch = presence_batch_ms / 1000
+        self.presence_grace = presence_grace_ms / 1000
+        self.event_handlers: Dict[str, Callable[[dict], None]] = {}
+        # Last seq per topic, and recent (seq, message, exclude_user) per topic, least recently used first
+        self.topic_seq: Dict[str, int] = {}
+        self.replay_log: "OrderedDict[str, Deque[Tuple[int, dict, Optional[str]]]]" = OrderedDict()
+        self.replay_buffer_size = replay_buffer_size
+        self.replay_topics = replay_topics
+        self.replayed_messages = 0
+        self.resyncs = 0
+
+    # --- Broker ---
+
+    async def start(self, broker: Broker):
+        """Attach to a broker and keep presence in sync with the other workers."""
+        check_subprotocols()
+        self.broker = broker
+        await broker.start(self._on_broker_event, on_connect=self._announce)
+        if self.presence_heartbeat > 0:
+            self._heartbeat = asyncio.create_task(self._presence_heartbeats())
+
+    async def stop(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        if self.broker is None:
+            return
+        await self._forward({"kind": "bye"})
+        await self.broker.stop()
+        self.broker = None
+
+    def add_event_handler(self, kind: str, handler: Callable[[dict], None]):
+        """Handle application events (see forward_soon) arriving from other workers."""
+        self.event_handlers[kind] = handler
+
+    def forward_soon(self, event: dict):
+        """Forward an application event to the other workers from synchronous code."""
+        if self.broker is None:
+            return
+        try:
+            asyncio.get_running_loop().create_task(self._forward(event))
+        except RuntimeError:
+            pass  # No event loop (e.g. a sync request thread); other workers catch up on their next read
+
+    async def _forward(self, event: dict):
+        if self.broker is None:
+            return
+        event["origin"] = self.worker_id
+        try:
+            await self.broker.publish(event)
+        except Exception:
+            logger.exception("Failed to forward real-time event to other workers")
+
+    async def _announce(self):
+        """On every (re)connection: tell the others who is here, and ask who is with them."""
+        await self._forward({"kind": "presence_snapshot", "user_ids": list(self.active_connections)})
+        await self._forward({"kind": "hello"})
+
+    async def _presence_heartbeats(self):
+        while True:
+            await asyncio.sleep(self.presence_heartbeat)
+            await self._forward({"kind": "presence_snapshot", "user_ids": list(self.active_connections)})
+            self.expire_workers()
+
+    def expire_workers(self):
+        """Drop the users of workers not heard from within the presence TTL."""
+        now = time.monotonic()
+        for worker_id, seen in list(self.worker_seen.items()):
+            if now - seen > self.presence_ttl:
+                logger.warning(f"No presence heartbeat from worker {worker_id} for {now - seen:.0f}s; expiring its users")
+                self.expired_workers += 1
+                self._forget_worker(worker_id)
+
+    def _forget_worker(self, worker_id: str):
+        self.worker_seen.pop(worker_id, None)
+        for user_id in [uid for uid, workers in self.presence.items() if worker_id in workers]:
+            self._set_presence(user_id, worker_id, False)
+
+    async def _on_broker_event(self, event: dict):
+        origin = event.get("origin")
+        if origin is None or origin == self.worker_id:
+            return
+        kind = event.get("kind")
+        if kind != "bye":
+            self.worker_seen[origin] = time.monotonic()
+        if kind == "topic":
+            self._local_publish(event["topic"], event["message"], event.get("exclude_user"), event.get("replay", True))
+        elif kind == "users":
+            self._local_users(event["message"], event["user_ids"])
+        elif kind == "all":
+            self._local_all(event["message"], event.get("exclude_user"))
+        elif kind == "presence":
+            self._set_presence(event["user_id"], origin, event["online"])
+        elif kind == "hello":
+            await self._forward({"kind": "presence_snapshot", "user_ids": list(self.active_connections)})
+        elif kind == "presence_snapshot":
+            # The sender's full list: also clears users whose offline event was missed
+            user_ids = set(event["user_ids"])
+            for user_id in [uid for uid, workers in self.presence.items() if origin in workers and uid not in user_ids]:
+                self._set_presence(user_id, origin, False)
+            for user_id in user_ids:
+                self._set_presence(user_id, origin, True)
+        elif kind == "bye":
+            self._forget_worker(origin)
+        elif kind in self.event_handlers:
+            self.event_handlers[kind](event)
+
+    # --- Connections and presence ---
+
+    async def connect(self, websocket: WebSocket, user_id: str, codec: Optional[str] = None) -> Connection:
+        """
+        Accept a new WebSocket connection for a user and start its writer.
+        codec is the negotiated subprotocol (see negotiate_codec); None means plain JSON.
+        """
+        await websocket.accept(subprotocol=codec)
+        connection = Connection(websocket, user_id, self.queue_size, codec or JSON)
+        connection.writer = asyncio.create_task(self._run_writer(connection))
+        user_connections = self.active_connections.setdefault(user_id, {})
+        user_connections[connection.id] = connection
+        self._start_reaper()
+        if len(user_connections) == 1:
+            # First device on this worker
+            self._set_presence(user_id, self.worker_id, True)
+            await self._forward({"kind": "presence", "user_id": user_id, "online": True})
+        return connection
+
+    async def disconnect(self, connection: Connection):
+        """Remove a connection; the user goes offline when it was their last one."""
+        if self._drop_connection(connection):
+            await self._user_left(connection.user_id)
+
+    def _drop_connection(self, connection: Connection) -> bool:
+        """Forget a connection and stop its writer. True when the user has no connections left here."""
+        if connection.writer is not None and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+        user_connections = self.active_connections.get(connection.user_id)
+        if not user_connections or user_connections.pop(connection.id, None) is None:
+            return False
+        self.unsubscribe_all(connection)
+        if user_connections:
+            return False
+        del self.active_connections[connection.user_id]
+        return True
+
+    async def _user_left(self, user_id: str):
+        self._set_presence(user_id, self.worker_id, False)
+        await self._forward({"kind": "presence", "user_id": user_id, "online": False})
+
+    def _set_presence(self, user_id: str, worker_id: str, online: bool):
+        """Record a worker gaining or losing a user; queue an announcement when the user's overall status flips."""
+        was_online = user_id in self.presence
+        if online:
+            self.presence.setdefault(user_id, set()).add(worker_id)
+        elif was_online:
+            self.presence[user_id].discard(worker_id)
+            if not self.presence[user_id]:
+                del self.presence[user_id]
+        is_online = user_id in self.presence
+
+        if is_online == was_online:
+            return
+        if is_online:
+            self._offline_since.pop(user_id, None)
+        else:
+            self._offline_since[user_id] = time.monotonic()
+        self._presence_dirty.add(user_id)
+        self._schedule_presence_flush()
+
+    def _schedule_presence_flush(self):
+        if self._presence_flush is None or self._presence_flush.done():
+            self._presence_flush = asyncio.get_running_loop().create_task(self._flush_presence_later())
+
+    async def _flush_presence_later(self):
+        while self._presence_dirty:
+            await asyncio.sleep(self.presence_batch)
+            self.flush_presence()
+
+    def flush_presence(self):
+        """Announce the net presence changes since the last flush in one presence_diff event."""
+        now = time.monotonic()
+        online, offline, pending = [], [], set()
+        for user_id in self._presence_dirty:
+            if user_id in self.presence:
+                if user_id not in self.announced:
+                    self.announced.add(user_id)
+                    online.append(user_id)
+            elif user_id in self.announced:
+                if now - self._offline_since.get(user_id, now) < self.presence_grace:
+                    pending.add(user_id)  # May still come back: keep clients' view unchanged for now
+                    continue
+                self.announced.discard(user_id)
+                self._offline_since.pop(user_id, None)
+                offline.append(user_id)
+            else:
+                self._offline_since.pop(user_id, None)  # Came and went within one window
+        self._presence_dirty = pending
+        if online or offline:
+            self._local_all({"type": "presence_diff", "online": sorted(online), "offline": sorted(offline)})
+
+    async def _run_writer(self, connection: Connection):
+        try:
+            await connection.write_loop()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Socket went away mid-send: forget it now rather than retrying it on every broadcast,
+            # and close it so the receive loop ends too
+            self.send_failures += 1
+            await self.disconnect(connection)
+            await connection.close(code=status.WS_1011_INTERNAL_ERROR)
+
+    async def _evict(self, connection: Connection, went_offline: bool, code: int = status.WS_1013_TRY_AGAIN_LATER):
+        await connection.close(code=code)
+        if went_offline:
+            await self._user_left(connection.user_id)
+
+    def _start_reaper(self):
+        if self.heartbeat_interval > 0 and (self._reaper is None or self._reaper.done()):
+            self._reaper = asyncio.get_running_loop().create_task(self._reap_idle())
+
+    async def _reap_idle(self):
+        while self.active_connections:
+            await asyncio.sleep(self.heartbeat_interval)
+            self.sweep()
+
+    def sweep(self):
+        """Ping connections quiet for a heartbeat interval; close those silent past the idle timeout."""
+        now = time.monotonic()
+        quiet = []
+        for connection in self.all_connections():
+            idle = now - connection.last_seen
+            if idle >= self.idle_timeout:
+                self.reaped_connections += 1
+                logger.info(f"Reaping WebSocket {connection.user_id} ({connection.id}) after {idle:.0f}s of silence")
+                went_offline = self._drop_connection(connection)
+                asyncio.create_task(self._evict(connection, went_offline, status.WS_1001_GOING_AWAY))
+            elif idle >= self.heartbeat_interval:
+                quiet.append(connection)
+        self._fan_out(quiet, {"type": "ping"})
+
+    def is_online(self, user_id: str) -> bool:
+        return user_id in self.presence
+
+    def user_connections(self, user_id: str) -> List[Connection]:
+        return list(self.active_connections.get(user_id, {}).values())
+
+    def all_connections(self) -> List[Connection]:
+        return [c for user_connections in self.active_connections.values() for c in user_connections.values()]
+
+    def _has_remote_connections(self, user_id: str) -> bool:
+        return bool(self.presence.get(user_id, set()) - {self.worker_id})
+
+    # --- Topic subscriptions ---
+
+    def subscribe(self, connection: Connection, topic: str):
+        """Subscribe a connection to a topic (caller has checked access)."""
+        self.topic_subscribers.setdefault(topic, set()).add(connection)
+        connection.topics.add(topic)
+
+    def unsubscribe(self, connection: Connection, topic: str):
+        subscribers = self.topic_subscribers.get(topic)
+        if subscribers is not None:
+            subscribers.discard(connection)
+            if not subscribers:
+                del self.topic_subscribers[topic]
+        connection.topics.discard(topic)
+
+    def unsubscribe_all(self, connection: Connection):
+        for topic in list(connection.topics):
+            self.unsubscribe(connection, topic)
+
+    def subscribers(self, topic: str) -> Set[Connection]:
+        """Local connections subscribed to a topic."""
+        return self.topic_subscribers.get(topic, set())
+
+    def subscribed_users(self, topic: str) -> Set[str]:
+        return {connection.user_id for connection in self.subscribers(topic)}
+
+    # --- Delivery ---
+
+    def _deliver(self, connection: Connection, frame: Frame):
+        """Enqueue a frame for one connection, applying the slow-consumer policy on overflow."""
+        if connection.offer(frame):
+            return
+        connection.dropped += 1
+        self.dropped_messages += 1
+        if self.slow_consumer_policy == "disconnect":
+            user_connections = self.active_connections.get(connection.user_id, {})
+            if user_connections.get(connection.id) is not connection:
+                return  # Already being evicted
+            self.slow_consumer_disconnects += 1
+            logger.warning(f"Disconnecting slow WebSocket consumer {connection.user_id} ({connection.id})")
+            went_offline = self._drop_connection(connection)
+            asyncio.create_task(self._evict(connection, went_offline))
+
+    def _fan_out(self, recipients: List[Connection], message: dict):
+        """Encode the message once per wire format in use and queue it for every recipient."""
+        frames: Dict[str, Frame] = {}
+        for connection in recipients:
+            frame = frames.get(connection.codec)
+            if frame is None:
+                frame = frames[connection.codec] = encode_for(connection.codec, message)
+            self._deliver(connection, frame)
+
+    def _local_publish(self, topic: str, message: dict, exclude_user: Optional[str] = None, replay: bool = True):
+        if replay:
+            message = self._record(topic, message, exclude_user)
+        self._fan_out([c for c in self.subscribers(topic) if c.user_id != exclude_user], message)
+
+    def _local_users(self, message: dict, user_ids: List[str]):
+        self._fan_out([c for user_id in user_ids for c in self.user_connections(user_id)], message)
+
+    def _local_all(self, message: dict, exclude_user: Optional[str] = None):
+        self._fan_out([
+            c for user_id in list(self.active_connections) if user_id != exclude_user
+            for c in self.user_connections(user_id)
+        ], message)
+
+    async def send_to_connection(self, connection: Connection, message: dict):
+        """Send a message to one connection (e.g. a command acknowledgement)."""
+        self._deliver(connection, encode_for(connection.codec, message))
+
+    async def publish(self, topic: str, message: dict, exclude_user: Optional[str] = None, replay: bool = True):
+        """
+        Send a message to every connection subscribed to a topic, on every worker.
+        replay=False is for ephemeral events (typing) that are not sequenced or replayed.
+        """
+        self._local_publish(topic, message, exclude_user, replay)
+        await self._forward({
+            "kind": "topic", "topic": topic, "message": message, "exclude_user": exclude_user, "replay": replay,
+        })
+
     async def broadcast_to_users(self, message: dict, user_ids: List[str]):
-        """Send a message to specific users."""
-        for user_id in user_ids:
-            if user_id in self.active_connections:
-                conn = self.active_connections[user_id]
-                try:
-                    await conn.send_json(message)
-                except Exception:
-                    # Don't await disconnect here to avoid modifying dict while iterating
-                    pass
-    
+        """Send a message to specific users, on every device they have connected."""
+        self._local_users(message, user_ids)
+        remote = [user_id for user_id in user_ids if self._has_remote_connections(user_id)]
+        if remote:
+            await self._forward({"kind": "users", "message": message, "user_ids": remote})
+
     async def broadcast_all(self, message: dict, exclude_user: Optional[str] = None):
         """Send a message to ALL connected clients."""
-        disconnected = []
-        for user_id, connection in self.active_connections.items():
-            if user_id == exclude_user:
-                continue
-            try:
-                await connection.send_json(message)
-            except Exception:
-                disconnected.append(user_id)
-        
-        for user_id in disconnected:
-            if user_id in self.active_connections:
-                del self.active_connections[user_id]
-    
+        self._local_all(message, exclude_user)
+        await self._forward({"kind": "all", "message": message, "exclude_user": exclude_user})
+
     async def send_personal_message(self, message: dict, user_id: str):
-        """Send a message to a specific user."""
-        if user_id in self.active_connections:
-            try:
-                await self.active_connections[user_id].send_json(message)
-            except Exception:
-                del self.active_connections[user_id]
+        """Send a message to a specific user, on every device they have connected."""
+        await self.broadcast_to_users(message, [user_id])
 
     @property
     def online_users_list(self) -> List[str]:
-        return list(self.active_connections.keys())
+        """Users with a connection on any worker."""
+        return list(self.presence.keys())
+
+    def stats(self) -> dict:
+        """Gauges and counters for this worker's sockets."""
+        depths = [connection.queue.qsize() for connection in self.all_connections()]
+        return {
+            "open_connections": len(depths),
+            "connected_users": len(self.active_connections),
+            "online_users": len(self.presence),
+            "peer_workers": len(self.worker_seen),
+            "expired_workers": self.expired_workers,
+            "subscribed_topics": len(self.topic_subscribers),
+            "queue_capacity": self.queue_size,
+            "queued_frames": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "dropped_messages": self.dropped_messages,
+            "slow_consumer_disconnects": self.slow_consumer_disconnects,
+            "send_failures": self.send_failures,
+            "reaped_connections": self.reaped_connections,
+            "replay_topics": len(self.replay_log),
+            "replayed_messages": self.replayed_messages,
+            "resyncs": self.resyncs,
+        }
+
+    # --- Sequencing and replay ---
+
+    def _record(self, topic: str, message: dict, exclude_user: Optional[str]) -> dict:
+        """Number a topic event and keep it for replay; returns the message with its topic and seq."""
+        seq = self.topic_seq.get(topic, 0) + 1
+        self.topic_seq[topic] = seq
+        message = {**message, "topic": topic, "seq": seq}
+        log = self.replay_log.get(topic)
+        if log is None:
+            log = self.replay_log[topic] = deque(maxlen=self.replay_buffer_size)
+            if len(self.replay_log) > self.replay_topics:
+                # The seq counter stays, so a client resuming an evicted topic is told to resync
+                self.replay_log.popitem(last=False)
+        else:
+            self.replay_log.move_to_end(topic)
+        log.append((seq, message, exclude_user))
+        return message
+
+    def current_seq(self, topic: str) -> int:
+        """Seq of the last event published on a topic by this worker (0 before the first)."""
+        return self.topic_seq.get(topic, 0)
+
+    def missed_events(self, topic: str, since: int, user_id: str) -> Optional[List[dict]]:
+        """
+        A topic's events after seq `since` that user_id would have received, oldest first.
+        None when some of them are no longer buffered and the client must refetch.
+        """
+        current = self.current_seq(topic)
+        if since == current:
+            return []
+        log = self.replay_log.get(topic)
+        if since > current or not log or log[0][0] > since + 1:
+            self.resyncs += 1
+            return None
+        missed = [message for seq, message, exclude_user in log if seq > since and user_id != exclude_user]
+        self.replayed_messages += len(missed)
+        return missed
 
 # Global manager instance
 manager = ConnectionManager()
@@ -0,0 +1,87 @@
+"""
+Micro-benchmark: cost of one broadcast versus recipient count.
+
+Compares the old fan-out (Starlette's send_json re-encoding the event with the
+stdlib json for every socket) with the manager's serialize-once path, and times
+a full ConnectionManager broadcast into the per-connection send queues.
+
+    python bench_broadcast.py
+"""
+import asyncio
+import json
+import timeit
+from datetime import datetime, timezone
+
+from app.websocket_manager import ConnectionManager, encode_frame
+
+RECIPIENTS = [1, 10, 100, 1000, 5000]
+
+EVENT = {
+    "type": "message",
+    "id": 123456,
+    "content": "Does anyone have the worked solutions for question 4b? I keep getting a negative discriminant 🤔",
+    "user_id": "5f0c1d2e-8a4b-4c3d-9e2f-1a2b3c4d5e6f",
+    "channel_id": "9a8b7c6d-5e4f-4a3b-2c1d-0e9f8a7b6c5d",
+    "timestamp": datetime.now(timezone.utc).isoformat(),
+    "user_email": "student@example.com",
+    "user_profile_pic": "https://cdn.example.com/avatars/student.png",
+}
+
+
+def per_recipient_stdlib(n):
+    for _ in range(n):
+        json.dumps(EVENT, separators=(",", ":"), ensure_ascii=False)
+
+def once_stdlib(n):
+    frame = json.dumps(EVENT, separators=(",", ":"), ensure_ascii=False)
+    for _ in range(n):
+        pass  # the same frame is handed to every socket
+
+def once_encode_frame(n):
+    frame = encode_frame(EVENT)
+    for _ in range(n):
+        pass
+
+
+class NullSocket:
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, frame):
+        pass
+
+
+async def manager_broadcast(n, repeat):
+    # Room for the presence frames plus the timed broadcasts
+    manager = ConnectionManager(queue_size=n + repeat + 1, slow_consumer_policy="drop")
+    for i in range(n):
+        await manager.connect(NullSocket(), f"user{i}")
+    # Let connection setup settle before timing
+    await asyncio.sleep(0)
+    start = timeit.default_timer()
+    for _ in range(repeat):
+        await manager.broadcast_all(EVENT)
+    elapsed = timeit.default_timer() - start
+    for user_id in list(manager.active_connections):
+        for connection in manager.user_connections(user_id):
+            await manager.disconnect(connection)
+    return elapsed / repeat
+
+
+def per_call_us(fn, n, repeat):
+    return min(timeit.repeat(lambda: fn(n), number=repeat, repeat=5)) / repeat * 1e6
+
+
+def main():
+    print(f"{'recipients':>10} {'per-recipient json':>20} {'once json':>12} {'once encode_frame':>18} {'manager broadcast':>18}  (µs per broadcast)")
+    for n in RECIPIENTS:
+        repeat = max(1, 20000 // n)
+        baseline = per_call_us(per_recipient_stdlib, n, repeat)
+        stdlib = per_call_us(once_stdlib, n, repeat)
+        fast = per_call_us(once_encode_frame, n, repeat)
+        full = asyncio.run(manager_broadcast(n, min(repeat, 200))) * 1e6
+        print(f"{n:>10} {baseline:>20.1f} {stdlib:>12.1f} {fast:>18.1f} {full:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Payload size and CPU comparison of the WebSocket wire formats for typical chat events.
+
+For each event: JSON text vs MessagePack binary, each with and without
+permessage-deflate. "deflate" compresses every frame on its own (no context
+takeover); "deflate stream" keeps the compression context across a session of
+mixed events, which is what browsers negotiate by default.
+
+    python bench_ws_payloads.py
+"""
+import timeit
+import zlib
+from datetime import datetime, timezone
+
+from app.websocket_manager import encode_frame, msgpack, decode_frame
+
+USER = "5f0c1d2e-8a4b-4c3d-9e2f-1a2b3c4d5e6f"
+CHANNEL = "9a8b7c6d-5e4f-4a3b-2c1d-0e9f8a7b6c5d"
+COMMUNITY = "1b2c3d4e-5f6a-4b7c-8d9e-0f1a2b3c4d5e"
+NOW = datetime.now(timezone.utc).isoformat()
+
+EVENTS = {
+    "message": {
+        "type": "message", "id": 123456,
+        "content": "Does anyone have the worked solutions for question 4b? I keep getting a negative discriminant.",
+        "user_id": USER, "channel_id": CHANNEL, "timestamp": NOW,
+        "user_email": "student@example.com", "user_profile_pic": "https://cdn.example.com/avatars/student.png",
+    },
+    "reply": {
+        "type": "reply", "id": 123457, "parent_id": 123456, "content": "Check the sign on c, it should be -3.",
+        "user_id": USER, "channel_id": CHANNEL, "timestamp": NOW, "user_email": "tutor@example.com",
+    },
+    "vote_update": {"type": "vote_update", "message_id": 123456, "channel_id": CHANNEL, "score": 12},
+    "unread_delta": {
+        "type": "unread_delta", "channel_id": CHANNEL, "community_id": COMMUNITY, "message_id": 123456, "delta": 1,
+    },
+    "user_online": {"type": "user_online", "user_id": USER},
+}
+
+
+SENTENCES = [
+    "Can someone explain why the limit of sin(x)/x is 1?",
+    "Past paper 2019 Q3 is basically the same as the one we did in class",
+    "Thanks! That fixed it, I had the units wrong.",
+    "Is the mock exam on Friday open book?",
+    "Here's my working for the titration question, where did I go wrong?",
+    "Remember the answer has to be to 3 significant figures.",
+]
+
+def mixed_session(count: int):
+    """Realistic-ish stream: messages and replies with varied text, ids and senders, plus small events."""
+    kinds = ("message", "vote_update", "unread_delta", "reply", "user_online")
+    session = []
+    for i in range(count):
+        event = dict(EVENTS[kinds[i % len(kinds)]])
+        for key in ("id", "message_id"):
+            if key in event:
+                event[key] += i
+        if "content" in event:
+            event["content"] = SENTENCES[i % len(SENTENCES)]
+        if "user_id" in event:
+            event["user_id"] = f"{i % 37:08x}-8a4b-4c3d-9e2f-1a2b3c4d5e6f"
+        session.append(event)
+    return session
+
+
+def deflate(frame: bytes) -> bytes:
+    compressor = zlib.compressobj(wbits=-15)
+    # permessage-deflate strips the trailing empty block marker
+    return (compressor.compress(frame) + compressor.flush(zlib.Z_SYNC_FLUSH))[:-4]
+
+def inflate(payload: bytes) -> bytes:
+    return zlib.decompressobj(wbits=-15).decompress(payload + b"\x00\x00\xff\xff")
+
+def deflate_stream(frames):
+    compressor = zlib.compressobj(wbits=-15)
+    return sum(len(compressor.compress(f) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4 for f in frames)
+
+def as_bytes(frame):
+    return frame.encode() if isinstance(frame, str) else frame
+
+def micros(fn, number=20000):
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    codecs = {
+        "json": lambda e: as_bytes(encode_frame(e)),
+        "msgpack": lambda e: msgpack.packb(e, use_bin_type=True),
+    }
+
+    print("Bytes per frame")
+    header = f"{'event':<14}" + "".join(f"{name:>10}{name + '+deflate':>18}" for name in codecs)
+    print(header)
+    for name, event in EVENTS.items():
+        row = f"{name:<14}"
+        for encode in codecs.values():
+            frame = encode(event)
+            row += f"{len(frame):>10}{len(deflate(frame)):>18}"
+        print(row)
+
+    session = mixed_session(200)
+    print(f"\nMixed session of {len(session)} events, average bytes per frame")
+    for name, encode in codecs.items():
+        frames = [encode(e) for e in session]
+        raw = sum(len(f) for f in frames) / len(frames)
+        per_message = sum(len(deflate(f)) for f in frames) / len(frames)
+        stream = deflate_stream(frames) / len(frames)
+        print(f"  {name:<8} raw {raw:6.1f}   deflate {per_message:6.1f}   deflate stream {stream:6.1f}")
+
+    event = EVENTS["message"]
+    print("\nCPU per 'message' event (µs)")
+    for name, encode in codecs.items():
+        frame = encode(event)
+        inbound = frame.decode() if name == "json" else frame
+        compressed = deflate(frame)
+        print(
+            f"  {name:<8} encode {micros(lambda: encode(event)):5.2f}"
+            f"   decode {micros(lambda: decode_frame(inbound)):5.2f}"
+            f"   deflate {micros(lambda: deflate(frame), 5000):5.2f}"
+            f"   inflate {micros(lambda: inflate(compressed), 5000):5.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
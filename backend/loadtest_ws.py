@@ -0,0 +1,338 @@
+"""
+Load test for the community WebSocket: N authenticated clients in one channel.
+
+Seeds N users (loadtest_00000, ...) and a "Load test" community with one
+channel into the database DATABASE_URL points at (SQLite or Postgres). It then
+opens a socket per user on /ws/community/global, subscribed to that channel.
+A few of the users post at a fixed rate, through the REST endpoint or the
+socket's send_message command. Every client timestamps the messages it
+receives. The report gives delivery latency percentiles, message and delivery
+throughput, and the server's CPU use.
+
+Against a server you started (same DATABASE_URL and SECRET_KEY):
+
+    uvicorn app.main:app --port 8000 --ws websockets &
+    python loadtest_ws.py --clients 1000 --rate 20 --duration 30 --server-pid $!
+
+or let the script start one on a free port and measure it:
+
+    python loadtest_ws.py --spawn --clients 2000 --path socket
+
+All clients share one Python process and event loop. Watch this script's own
+CPU: once it nears a full core, the latencies it reports are its own queueing
+rather than the server's.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+from uuid import uuid4
+
+import httpx
+from sqlmodel import Session, select
+from websockets.asyncio.client import connect
+
+from app.database import engine, create_db_and_tables
+from app.dependencies import create_access_token
+from app.schemas import User, Community, CommunityMember, Channel
+from app.websocket_manager import channel_topic
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+MARKER = "loadtest"
+ADMIN_USERNAME = "loadtest_admin"  # Reads /api/system/metrics
+
+
+# --- Seeding ---
+
+def seed(clients: int):
+    """Create the load-test users, community and channel if missing. Returns (usernames, channel_id)."""
+    create_db_and_tables()
+    usernames = [f"loadtest_{i:05d}" for i in range(clients)]
+    with Session(engine) as session:
+        existing = {
+            u.username: u.id
+            for u in session.exec(select(User).where(User.username.startswith("loadtest_"))).all()
+        }
+        missing = [
+            User(id=str(uuid4()), username=name, email=f"{name}@loadtest.local", hashed_password="!")
+            for name in usernames if name not in existing
+        ]
+        if ADMIN_USERNAME not in existing:
+            missing.append(User(id=str(uuid4()), username=ADMIN_USERNAME, email=f"{ADMIN_USERNAME}@loadtest.local",
+                                hashed_password="!", role="admin"))
+        session.add_all(missing)
+        session.commit()
+        existing.update({u.username: u.id for u in missing})
+
+        community = session.exec(select(Community).where(Community.name == "Load test")).first()
+        if community is None:
+            community = Community(name="Load test", owner_id=existing[usernames[0]])
+            session.add(community)
+            session.commit()
+            session.add(Channel(name="load", slug="load", community_id=community.id))
+            session.commit()
+        channel = session.exec(select(Channel).where(Channel.community_id == community.id)).first()
+
+        members = set(session.exec(
+            select(CommunityMember.user_id).where(CommunityMember.community_id == community.id)
+        ).all())
+        session.add_all([
+            CommunityMember(community_id=community.id, user_id=existing[name])
+            for name in usernames if existing[name] not in members
+        ])
+        session.commit()
+        return usernames, channel.id
+
+
+# --- Server process ---
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def spawn_server(port: int) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--ws", "websockets", "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+    )
+
+async def wait_for_server(base_url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as http:
+        while True:
+            try:
+                if (await http.get(f"{base_url}/")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            if time.monotonic() > deadline:
+                raise SystemExit(f"Server at {base_url} did not come up within {timeout:.0f}s")
+            await asyncio.sleep(0.2)
+
+def cpu_seconds(pid: int) -> Optional[float]:
+    """User + system CPU time of a process and its direct children (uvicorn --workers), from /proc."""
+    def read(p) -> Optional[tuple]:
+        try:
+            with open(f"/proc/{p}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            return None
+        # After the command name: state, ppid, ... utime is field 14 and stime field 15 of the full line
+        return int(fields[1]), int(fields[11]) + int(fields[12])
+
+    own = read(pid)
+    if own is None:
+        return None  # Not Linux, or the process is gone
+    ticks = own[1]
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            child = read(entry)
+            if child is not None and child[0] == pid:
+                ticks += child[1]
+    return ticks / os.sysconf("SC_CLK_TCK")
+
+
+# --- Clients ---
+
+class Results:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.deliveries = 0
+        self.posted = 0
+        self.post_errors = 0
+        self.connect_errors = 0
+        self.disconnects = 0
+        self.measuring = False
+
+
+def content_for(seq: int) -> str:
+    return f"{MARKER} {seq} {time.perf_counter():.6f}"
+
+async def client(ws_url: str, username: str, topic: str, results: Results, ready: asyncio.Event,
+                 sockets: Dict[str, object], stop: asyncio.Event, limiter: asyncio.Semaphore):
+    token = create_access_token({"sub": username})
+    try:
+        async with limiter:
+            ws = await connect(f"{ws_url}?token={token}", max_size=None, open_timeout=60)
+            await ws.send(json.dumps({"type": "subscribe", "topics": [topic]}))
+    except Exception:
+        results.connect_errors += 1
+        ready.set()
+        return
+    sockets[username] = ws
+    ready.set()
+    try:
+        async with ws:
+            async for frame in ws:
+                data = json.loads(frame)
+                kind = data.get("type")
+                if kind == "message" and data.get("content", "").startswith(MARKER):
+                    if results.measuring:
+                        sent_at = float(data["content"].split()[2])
+                        results.latencies.append(time.perf_counter() - sent_at)
+                        results.deliveries += 1
+                elif kind == "ping":
+                    await ws.send(json.dumps({"type": "pong"}))
+                elif kind == "ack" and not data.get("ok"):
+                    results.post_errors += 1
+    except Exception:
+        pass
+    if not stop.is_set():
+        results.disconnects += 1
+
+async def post_rest(http: httpx.AsyncClient, base_url: str, channel_id: str, token: str,
+                    seq: int, results: Results):
+    try:
+        response = await http.post(
+            f"{base_url}/api/v1/community/channels/{channel_id}/messages",
+            json={"content": content_for(seq)},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        if response.status_code != 200:
+            results.post_errors += 1
+    except httpx.HTTPError:
+        results.post_errors += 1
+
+async def post_socket(ws, channel_id: str, seq: int, results: Results):
+    try:
+        await ws.send(json.dumps({
+            "type": "send_message", "client_id": f"lt-{seq}", "channel_id": channel_id, "content": content_for(seq),
+        }))
+    except Exception:
+        results.post_errors += 1
+
+
+# --- Run ---
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100 * len(sorted_values)))]
+
+async def run(args):
+    if args.spawn:
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+    else:
+        base_url = args.url.rstrip("/")
+
+    usernames, channel_id = seed(args.clients)
+    topic = channel_topic(channel_id)
+    print(f"Seeded {len(usernames)} users in channel {channel_id}")
+
+    server = spawn_server(port) if args.spawn else None
+    server_pid = server.pid if server else args.server_pid
+    try:
+        await wait_for_server(base_url)
+        ws_url = base_url.replace("http", "ws", 1) + "/ws/community/global"
+
+        results, stop = Results(), asyncio.Event()
+        sockets: Dict[str, object] = {}
+        limiter = asyncio.Semaphore(args.connect_concurrency)
+        ready_events = [asyncio.Event() for _ in usernames]
+        started = time.perf_counter()
+        tasks = [
+            asyncio.create_task(client(ws_url, name, topic, results, ready, sockets, stop, limiter))
+            for name, ready in zip(usernames, ready_events)
+        ]
+        await asyncio.gather(*(event.wait() for event in ready_events))
+        print(f"Connected {len(sockets)}/{len(usernames)} clients in {time.perf_counter() - started:.1f}s"
+              f" ({results.connect_errors} failed)")
+        await asyncio.sleep(1)  # Let the subscribe acks land before measuring
+
+        senders = [name for name in usernames[:args.senders] if name in sockets]
+        tokens = {name: create_access_token({"sub": name}) for name in senders}
+        cpu_before = cpu_seconds(server_pid) if server_pid else None
+        results.measuring = True
+        started = time.perf_counter()
+
+        async with httpx.AsyncClient(timeout=30, limits=httpx.Limits(max_connections=args.senders)) as http:
+            posts = []
+            interval = 1 / args.rate
+            seq = 0
+            while time.perf_counter() - started < args.duration:
+                sender = senders[seq % len(senders)]
+                if args.path == "rest":
+                    posts.append(asyncio.create_task(
+                        post_rest(http, base_url, channel_id, tokens[sender], seq, results)
+                    ))
+                else:
+                    posts.append(asyncio.create_task(post_socket(sockets[sender], channel_id, seq, results)))
+                seq += 1
+                # Schedule against the start time so slow posts do not lower the rate
+                await asyncio.sleep(max(0.0, started + seq * interval - time.perf_counter()))
+            await asyncio.gather(*posts)
+            results.posted = seq
+
+        elapsed = time.perf_counter() - started
+        await asyncio.sleep(args.drain)  # In-flight deliveries
+        results.measuring = False
+        cpu_after = cpu_seconds(server_pid) if server_pid else None
+
+        async with httpx.AsyncClient() as http:
+            ws_stats = (await http.get(
+                f"{base_url}/api/system/metrics",
+                headers={"Authorization": f"Bearer {create_access_token({'sub': ADMIN_USERNAME})}"},
+            )).json().get("websocket", {})
+
+        stop.set()
+        for ws in list(sockets.values()):
+            await ws.close()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    expected = results.posted * len(sockets)
+    print(f"\n{args.path.upper()} posting, {len(senders)} senders, {len(sockets)} receivers, {elapsed:.1f}s")
+    print(f"  messages posted   {results.posted} ({results.posted / elapsed:.1f}/s), {results.post_errors} errors")
+    print(f"  deliveries        {results.deliveries} ({results.deliveries / elapsed:.0f}/s),"
+          f" {results.deliveries / expected:.1%} of {expected}" if expected else "  deliveries        0")
+    if results.latencies:
+        latencies = sorted(results.latencies)
+        print("  latency ms        " + "  ".join(
+            f"p{p} {percentile(latencies, p) * 1000:.1f}" for p in (50, 90, 99)
+        ) + f"  max {latencies[-1] * 1000:.1f}  mean {statistics.fmean(latencies) * 1000:.1f}")
+    if cpu_before is not None and cpu_after is not None:
+        used = cpu_after - cpu_before
+        print(f"  server CPU        {used / (elapsed + args.drain):.0%} of one core ({used:.1f}s)")
+    else:
+        print("  server CPU        n/a (pass --server-pid or --spawn, Linux only)")
+    print(f"  disconnects       {results.disconnects} mid-run")
+    if ws_stats:
+        print(f"  server queues     max depth {ws_stats.get('max_queue_depth')}, dropped {ws_stats.get('dropped_messages')},"
+              f" slow-consumer disconnects {ws_stats.get('slow_consumer_disconnects')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WebSocket chat load test")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Server base URL (ignored with --spawn)")
+    parser.add_argument("--spawn", action="store_true", help="Start a uvicorn server on a free port")
+    parser.add_argument("--server-pid", type=int, help="PID of the server, for CPU measurement")
+    parser.add_argument("--clients", type=int, default=500, help="Concurrent WebSocket connections")
+    parser.add_argument("--senders", type=int, default=10, help="How many of the clients post messages")
+    parser.add_argument("--rate", type=float, default=10.0, help="Messages per second, across all senders")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of posting")
+    parser.add_argument("--path", choices=("rest", "socket"), default="rest", help="Post via REST or socket command")
+    parser.add_argument("--drain", type=float, default=2.0, help="Seconds to wait for in-flight deliveries")
+    parser.add_argument("--connect-concurrency", type=int, default=100, help="Handshakes in flight at once")
+    args = parser.parse_args()
+
+    # Every client is a file descriptor
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
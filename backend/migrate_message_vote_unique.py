@@ -0,0 +1,65 @@
+"""
+Migration script for atomic message voting:
+- adds the previous_value column to the messagevote table
+- removes duplicate (message_id, user_id) votes, keeping the newest
+- adds the unique index that INSERT ... ON CONFLICT relies on
+Run this locally (SQLite) or on Render (PostgreSQL) depending on your DATABASE_URL.
+"""
+import os
+import sys
+
+from sqlalchemy import create_engine, text, inspect
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///database.db")
+
+if DATABASE_URL.startswith("postgres://"):
+    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+
+print(f"Detected {'PostgreSQL' if DATABASE_URL.startswith('postgresql') else 'SQLite'} database")
+
+if DATABASE_URL.startswith("sqlite"):
+    db_path = DATABASE_URL.replace("sqlite:///", "")
+    if not os.path.exists(db_path):
+        print(f"⚠️  Database file {db_path} not found. It will be created on first run.")
+        sys.exit(0)
+
+try:
+    engine = create_engine(DATABASE_URL)
+
+    with engine.connect() as conn:
+        inspector = inspect(engine)
+
+        if 'messagevote' not in inspector.get_table_names():
+            print("⚠️  messagevote table does not exist. It will be created on first run.")
+            sys.exit(0)
+
+        columns = [col['name'] for col in inspector.get_columns('messagevote')]
+        if 'previous_value' not in columns:
+            conn.execute(text("ALTER TABLE messagevote ADD COLUMN previous_value INTEGER NOT NULL DEFAULT 0"))
+            print("✅ Added previous_value column")
+        else:
+            print("✅ previous_value column already exists")
+
+        duplicates = conn.execute(text(
+            "DELETE FROM messagevote WHERE id NOT IN ("
+            "  SELECT MAX(id) FROM messagevote GROUP BY message_id, user_id"
+            ")"
+        )).rowcount
+        print(f"✅ Removed {duplicates} duplicate vote(s)")
+
+        conn.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_messagevote_message_user "
+            "ON messagevote (message_id, user_id)"
+        ))
+        print("✅ Unique index on (message_id, user_id) is in place")
+
+        conn.commit()
+        print("🎉 Migration completed!")
+
+except Exception as e:
+    print(f"❌ Error: {e}")
+    sys.exit(1)
+
+print("\n📝 Next steps:")
+print("1. Restart your backend server")
+print("2. For Render deployment, run this script with DATABASE_URL set to your Render PostgreSQL URL")
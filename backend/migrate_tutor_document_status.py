@@ -0,0 +1,57 @@
+"""
+Migration script for background PDF processing:
+- adds the status column to the tutordocument table (existing documents are "ready")
+- adds the error column, set when processing a PDF fails
+Run this locally (SQLite) or on Render (PostgreSQL) depending on your DATABASE_URL.
+"""
+import os
+import sys
+
+from sqlalchemy import create_engine, text, inspect
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///database.db")
+
+if DATABASE_URL.startswith("postgres://"):
+    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+
+print(f"Detected {'PostgreSQL' if DATABASE_URL.startswith('postgresql') else 'SQLite'} database")
+
+if DATABASE_URL.startswith("sqlite"):
+    db_path = DATABASE_URL.replace("sqlite:///", "")
+    if not os.path.exists(db_path):
+        print(f"⚠️  Database file {db_path} not found. It will be created on first run.")
+        sys.exit(0)
+
+try:
+    engine = create_engine(DATABASE_URL)
+
+    with engine.connect() as conn:
+        inspector = inspect(engine)
+
+        if 'tutordocument' not in inspector.get_table_names():
+            print("⚠️  tutordocument table does not exist. It will be created on first run.")
+            sys.exit(0)
+
+        columns = [col['name'] for col in inspector.get_columns('tutordocument')]
+        if 'status' not in columns:
+            conn.execute(text("ALTER TABLE tutordocument ADD COLUMN status VARCHAR NOT NULL DEFAULT 'ready'"))
+            print("✅ Added status column")
+        else:
+            print("✅ status column already exists")
+
+        if 'error' not in columns:
+            conn.execute(text("ALTER TABLE tutordocument ADD COLUMN error VARCHAR"))
+            print("✅ Added error column")
+        else:
+            print("✅ error column already exists")
+
+        conn.commit()
+        print("🎉 Migration completed!")
+
+except Exception as e:
+    print(f"❌ Error: {e}")
+    sys.exit(1)
+
+print("\n📝 Next steps:")
+print("1. Restart your backend server")
+print("2. For Render deployment, run this script with DATABASE_URL set to your Render PostgreSQL URL")
@@ -0,0 +1,110 @@
+"""
+Stand-in pub/sub broker for running several backend workers locally.
+
+Speaks the subset of the Redis protocol (RESP) that app/pubsub.py's RedisBroker
+uses (SUBSCRIBE, UNSUBSCRIBE, PUBLISH, PING, AUTH), so no Redis install is needed:
+
+    python pubsub_broker.py --port 6390
+    PUBSUB_URL=redis://localhost:6390 uvicorn app.main:app --workers 4
+
+Production should point PUBSUB_URL at a real Redis instead.
+"""
+import argparse
+import asyncio
+from typing import Dict, Set
+
+subscribers: Dict[bytes, Set[asyncio.StreamWriter]] = {}
+
+
+def encode_command(*parts) -> bytes:
+    out = [b"*%d\r\n" % len(parts)]
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode()
+        out.append(b"$%d\r\n%s\r\n" % (len(part), part))
+    return b"".join(out)
+
+async def read_reply(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Client closed the connection")
+    kind, body = line[:1], line[1:-2]
+    if kind == b"+":
+        return body.decode()
+    if kind == b"-":
+        raise ConnectionError(f"Client error: {body.decode()}")
+    if kind == b":":
+        return int(body)
+    if kind == b"$":
+        length = int(body)
+        if length < 0:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if kind == b"*":
+        return [await read_reply(reader) for _ in range(int(body))]
+    raise ConnectionError(f"Unexpected frame from client: {line!r}")
+
+def integer(value: int) -> bytes:
+    return b":%d\r\n" % value
+
+def subscription_reply(kind: bytes, channel: bytes, count: int) -> bytes:
+    """["subscribe" | "unsubscribe", channel, number of channels now subscribed]"""
+    return b"*3\r\n$%d\r\n%s\r\n$%d\r\n%s\r\n" % (len(kind), kind, len(channel), channel) + integer(count)
+
+async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    channels: Set[bytes] = set()
+    try:
+        while True:
+            command = await read_reply(reader)
+            if not isinstance(command, list) or not command:
+                continue
+            name, args = command[0].upper(), command[1:]
+
+            if name == b"SUBSCRIBE":
+                for channel in args:
+                    channels.add(channel)
+                    subscribers.setdefault(channel, set()).add(writer)
+                    writer.write(subscription_reply(b"subscribe", channel, len(channels)))
+            elif name == b"UNSUBSCRIBE":
+                for channel in args or list(channels):
+                    channels.discard(channel)
+                    subscribers.get(channel, set()).discard(writer)
+                    writer.write(subscription_reply(b"unsubscribe", channel, len(channels)))
+            elif name == b"PUBLISH":
+                channel, payload = args
+                receivers = list(subscribers.get(channel, ()))
+                frame = encode_command("message", channel, payload)
+                for receiver in receivers:
+                    receiver.write(frame)
+                writer.write(integer(len(receivers)))
+            elif name == b"PING":
+                writer.write(b"+PONG\r\n")
+            elif name == b"AUTH":
+                writer.write(b"+OK\r\n")
+            else:
+                writer.write(b"-ERR unknown command '%s'\r\n" % name)
+            await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError, OSError):
+        pass
+    finally:
+        for channel in channels:
+            subscribers.get(channel, set()).discard(writer)
+        writer.close()
+
+async def main(host: str, port: int):
+    server = await asyncio.start_server(handle_client, host, port)
+    print(f"📡 Pub/sub broker listening on {host}:{port}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    options = parser.parse_args()
+    try:
+        asyncio.run(main(options.host, options.port))
+    except KeyboardInterrupt:
+        pass
@@ -2,4 +2,7 @@
 
 # This script ensures your FastAPI app listens on the port provided by Render
 # The uvicorn command format is: module.variable_name
-uvicorn app.main:app --host 0.0.0.0 --port $PORT
\ No newline at end of file
+# permessage-deflate is negotiated with WebSocket clients that offer it (WS_PER_MESSAGE_DEFLATE=false to disable)
+# Protocol-level pings close sockets whose peer stops answering (half-open TCP connections)
+uvicorn app.main:app --host 0.0.0.0 --port $PORT --ws websockets --ws-per-message-deflate ${WS_PER_MESSAGE_DEFLATE:-true} \
+    --ws-ping-interval ${WS_PING_INTERVAL:-20} --ws-ping-timeout ${WS_PING_TIMEOUT:-20}
@@ -0,0 +1,56 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import anyio
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+from app.main import app, get_session
+
+@pytest.fixture()
+def engine():
+    # In-memory SQLite shared across threads so the TestClient sees the same data
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    SQLModel.metadata.drop_all(engine)
+    engine.dispose()
+
+@pytest.fixture()
+def client(engine):
+    """TestClient whose requests use `engine`; dependency overrides are restored afterwards."""
+    def get_session_override():
+        with Session(engine) as session:
+            yield session
+
+    previous = dict(app.dependency_overrides)
+    app.dependency_overrides[get_session] = get_session_override
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+    app.dependency_overrides.update(previous)
+
+@pytest.fixture()
+def portal(client):
+    """Run the client's HTTP requests and sockets on one event loop, as under uvicorn."""
+    with anyio.from_thread.start_blocking_portal() as portal:
+        client.portal = portal
+        yield portal
+        client.portal = None
+
+@pytest.fixture()
+def statements(engine):
+    """SQL statements executed on `engine`; clear it before the request being measured."""
+    executed = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    return executed
@@ -0,0 +1,135 @@
+import sys
+import os
+import json
+from datetime import timedelta
+from types import SimpleNamespace
+from uuid import uuid4
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi import Depends
+from sqlmodel import Session, select
+from app import llm
+from app.main import app, get_session
+from app.schemas import User, TutorDocument, GenerationCacheEntry
+from app.dependencies import get_current_user
+from app.generation_cache import generation_cache
+
+pytestmark = pytest.mark.usefixtures("portal")
+
+TEXTBOOK = "Shared textbook: the mitochondria is the powerhouse of the cell."
+
+
+class CountingProvider:
+    """Stands in for genai.Client: every generation is numbered, so variants can be told apart."""
+
+    def __init__(self):
+        self.calls = 0
+        self.aio = SimpleNamespace(models=SimpleNamespace(generate_content=self.generate_content))
+
+    async def generate_content(self, model, contents, config=None):
+        self.calls += 1
+        if "flashcards" in contents:
+            items = [{"term": f"Term {self.calls}", "definition": "A definition"}]
+        else:
+            items = [{"question": f"Question {self.calls}?", "options": ["a", "b", "c", "d"], "correct_answer": "a"}]
+        return SimpleNamespace(text=json.dumps(items))
+
+
+@pytest.fixture(autouse=True)
+def reset_stats(monkeypatch):
+    monkeypatch.setattr(generation_cache, "hits", 0)
+    monkeypatch.setattr(generation_cache, "misses", 0)
+
+@pytest.fixture()
+def provider(monkeypatch):
+    provider = CountingProvider()
+    monkeypatch.setattr(llm, "client", provider)
+    return provider
+
+def act_as_new_user(engine):
+    with Session(engine) as session:
+        name = f"user{uuid4().hex[:8]}"
+        user = User(id=str(uuid4()), username=name, email=f"{name}@test.com", hashed_password="x")
+        session.add(user)
+        session.commit()
+        user_id = user.id
+
+    def current_user_override(session: Session = Depends(get_session)):
+        return session.get(User, user_id)
+    app.dependency_overrides[get_current_user] = current_user_override
+    return user_id
+
+def add_document(engine, user_id, content=TEXTBOOK):
+    with Session(engine) as session:
+        doc = TutorDocument(user_id=user_id, filename="textbook.txt", content=content)
+        session.add(doc)
+        session.commit()
+        return doc.id
+
+def act_as_user_with_document(engine, content=TEXTBOOK):
+    return add_document(engine, act_as_new_user(engine), content)
+
+def quiz(client, doc_id, **extra):
+    response = client.post("/api/v1/tutor/generate/quiz", json={"document_id": doc_id, **extra})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_identical_requests_are_served_from_the_cache(engine, client, provider):
+    doc_id = act_as_user_with_document(engine)
+    first = quiz(client, doc_id)
+    assert first["cached"] is False
+    second = quiz(client, doc_id)
+    assert second == {**first, "cached": True}
+    assert provider.calls == 1
+
+    # Another student uploading the same textbook gets the same quiz without a provider call
+    other_doc = act_as_user_with_document(engine)
+    assert quiz(client, other_doc)["questions"] == first["questions"]
+    assert provider.calls == 1
+
+    # Flashcards and other content are cached separately
+    response = client.post("/api/v1/tutor/generate/flashcards", json={"document_id": other_doc})
+    assert response.json()["cached"] is False
+    assert quiz(client, act_as_user_with_document(engine, "Different notes"))["cached"] is False
+    assert provider.calls == 3
+    assert generation_cache.stats()["hits"] == 2
+
+def test_fresh_variant_replaces_the_cached_one(engine, client, provider):
+    doc_id = act_as_user_with_document(engine)
+    first = quiz(client, doc_id)
+    fresh = quiz(client, doc_id, fresh=True)
+    assert fresh["cached"] is False
+    assert fresh["questions"] != first["questions"]
+    assert quiz(client, doc_id)["questions"] == fresh["questions"]
+    assert provider.calls == 2
+
+def test_cached_results_are_served_without_a_provider(engine, client, provider, monkeypatch):
+    doc_id = act_as_user_with_document(engine)
+    first = quiz(client, doc_id)
+    monkeypatch.setattr(llm, "client", None)
+    assert quiz(client, doc_id)["questions"] == first["questions"]
+
+def test_entries_expire_after_the_ttl(engine, client, provider, monkeypatch):
+    doc_id = act_as_user_with_document(engine)
+    quiz(client, doc_id)
+    monkeypatch.setattr(generation_cache, "ttl", timedelta(microseconds=1))
+    assert quiz(client, doc_id)["cached"] is False
+    assert provider.calls == 2
+
+def test_least_recently_used_entries_are_evicted(engine, client, provider, monkeypatch):
+    monkeypatch.setattr(generation_cache, "max_entries", 2)
+    user_id = act_as_new_user(engine)
+    first, second, third = [add_document(engine, user_id, f"Chapter {n}") for n in range(3)]
+    quiz(client, first)
+    quiz(client, second)
+    # Using the first entry again leaves the second as the least recently used
+    assert quiz(client, first)["cached"] is True
+    quiz(client, third)
+
+    with Session(engine) as session:
+        assert len(session.exec(select(GenerationCacheEntry)).all()) == 2
+    assert quiz(client, first)["cached"] is True
+    assert quiz(client, third)["cached"] is True
+    assert quiz(client, second)["cached"] is False
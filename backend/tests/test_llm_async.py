@@ -0,0 +1,185 @@
+import sys
+import os
+import asyncio
+import json
+import threading
+import time
+from types import SimpleNamespace
+from uuid import uuid4
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi import Depends, HTTPException
+from sqlmodel import Session, select
+from app import llm
+from app.routes import tutor
+from app.main import app, get_session
+from app.schemas import User, TutorDocument
+from app.dependencies import get_current_user
+
+pytestmark = pytest.mark.usefixtures("portal")
+
+QUIZ = [{"question": "2 + 2?", "options": ["3", "4", "5", "22"], "correct_answer": "4"}]
+
+
+class SlowProvider:
+    """Stands in for genai.Client: client.aio.models.generate_content takes `delay` seconds."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.cancelled = 0
+        self.aio = SimpleNamespace(models=SimpleNamespace(generate_content=self.generate_content))
+
+    async def generate_content(self, model, contents, config=None):
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return SimpleNamespace(text=json.dumps(QUIZ))
+
+
+def seed_document(engine):
+    with Session(engine) as session:
+        user = User(id=str(uuid4()), username="alice", email="alice@test.com", hashed_password="x")
+        session.add(user)
+        session.commit()
+        doc = TutorDocument(user_id=user.id, filename="notes.txt", content="Arithmetic basics")
+        session.add(doc)
+        session.commit()
+        user_id, doc_id = user.id, doc.id
+
+    def current_user_override(session: Session = Depends(get_session)):
+        return session.get(User, user_id)
+    app.dependency_overrides[get_current_user] = current_user_override
+    return doc_id
+
+def test_slow_generation_does_not_block_other_requests(engine, client, monkeypatch):
+    doc_id = seed_document(engine)
+    monkeypatch.setattr(llm, "client", SlowProvider(delay=1.0))
+
+    result = {}
+    slow = threading.Thread(target=lambda: result.update(
+        response=client.post("/api/v1/tutor/generate/quiz", json={"document_id": doc_id})
+    ))
+    slow.start()
+    time.sleep(0.2)  # The generation is now in flight on the server's event loop
+
+    for _ in range(5):
+        started = time.perf_counter()
+        assert client.get("/").status_code == 200
+        assert time.perf_counter() - started < 0.5
+    assert slow.is_alive()
+
+    slow.join()
+    assert result["response"].status_code == 200
+    assert result["response"].json()["questions"][0]["correct_answer"] == "4"
+
+def test_generation_past_the_deadline_is_cancelled(engine, client, monkeypatch):
+    doc_id = seed_document(engine)
+    provider = SlowProvider(delay=5.0)
+    monkeypatch.setattr(llm, "client", provider)
+    monkeypatch.setattr(llm, "LLM_TIMEOUT_S", 0.2)
+
+    response = client.post("/api/v1/tutor/generate/quiz", json={"document_id": doc_id})
+    assert response.status_code == 504
+    assert provider.cancelled == 1
+
+def test_call_is_cancelled_when_client_disconnects(monkeypatch):
+    monkeypatch.setattr(llm, "DISCONNECT_POLL_S", 0.01)
+    provider = SlowProvider(delay=5.0)
+
+    class GoneAfterAWhile:
+        def __init__(self):
+            self.polls = 0
+
+        async def is_disconnected(self):
+            self.polls += 1
+            return self.polls > 3
+
+    async def scenario():
+        with pytest.raises(HTTPException) as error:
+            await llm.call(provider.generate_content("m", "prompt"), GoneAfterAWhile())
+        assert error.value.status_code == 499
+        await asyncio.sleep(0)
+        assert provider.cancelled == 1
+
+    asyncio.run(scenario())
+
+
+class StreamingProvider:
+    """client.aio.chats.create(...).send_message_stream(...) yielding `pieces`; "!" raises instead."""
+
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.closed = False
+        self.aio = SimpleNamespace(chats=SimpleNamespace(create=self.create))
+
+    def create(self, model, history=None, config=None):
+        return SimpleNamespace(send_message_stream=self.send_message_stream)
+
+    async def send_message_stream(self, message):
+        async def chunks():
+            try:
+                for piece in self.pieces:
+                    await asyncio.sleep(0.01)
+                    if piece == "!":
+                        raise RuntimeError("provider hiccup")
+                    yield SimpleNamespace(text=piece)
+            finally:
+                self.closed = True
+        return chunks()
+
+def parse_events(body):
+    events = []
+    for frame in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in frame.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+def queries_used(engine):
+    with Session(engine) as session:
+        return session.exec(select(User)).first().ai_queries_today or 0
+
+def test_chat_reply_is_streamed_as_events(engine, client, monkeypatch):
+    doc_id = seed_document(engine)
+    monkeypatch.setattr(llm, "client", StreamingProvider(["Four", " is", " the answer."]))
+
+    response = client.post("/api/v1/tutor/chat/stream", json={"document_id": doc_id, "message": "2 + 2?"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert parse_events(response.text) == [
+        ("start", {"text": "Four"}),
+        ("token", {"text": " is"}),
+        ("token", {"text": " the answer."}),
+        ("done", {"response": "Four is the answer."}),
+    ]
+    assert queries_used(engine) == 1
+
+def test_stream_failures_and_quota(engine, client, monkeypatch):
+    doc_id = seed_document(engine)
+    body = {"document_id": doc_id, "message": "2 + 2?"}
+
+    # Failing before the first token: a plain HTTP error, and no query is charged
+    monkeypatch.setattr(llm, "client", StreamingProvider(["!"]))
+    assert client.post("/api/v1/tutor/chat/stream", json=body).status_code == 500
+    assert queries_used(engine) == 0
+
+    # Failing mid-stream: the partial reply is delivered with the error
+    monkeypatch.setattr(llm, "client", StreamingProvider(["Four", " is", "!"]))
+    events = parse_events(client.post("/api/v1/tutor/chat/stream", json=body).text)
+    assert events[-1] == ("error", {"detail": "AI chat failed: provider hiccup", "partial": "Four is"})
+    assert queries_used(engine) == 1
+
+def test_abandoned_stream_stops_generation():
+    provider = StreamingProvider(["Four", " is", " the answer."])
+
+    async def scenario():
+        stream = await provider.send_message_stream("2 + 2?")
+        events = tutor.chat_events(stream, await llm.next_chunk(stream))
+        assert (await anext(events)).startswith("event: start")
+        # What the response does when the client disconnects
+        await events.aclose()
+        assert provider.closed
+
+    asyncio.run(scenario())
@@ -0,0 +1,107 @@
+import sys
+import os
+from uuid import uuid4
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi import Depends
+from sqlmodel import Session
+from app.main import app, get_session
+from app.schemas import User, Channel, Message
+from app.dependencies import get_current_user
+from app.message_cache import message_cache, ChannelMessageCache
+
+@pytest.fixture(autouse=True)
+def reset_cache():
+    message_cache.__init__(capacity=5)
+
+def seed(engine, message_count):
+    with Session(engine) as session:
+        users = [
+            User(id=str(uuid4()), username=name, email=f"{name}@test.com", hashed_password="x")
+            for name in ("alice", "bob")
+        ]
+        channel = Channel(name="general", slug="general")
+        session.add_all(users + [channel])
+        session.commit()
+        for i in range(message_count):
+            session.add(Message(content=f"m{i}", channel_id=channel.id, user_id=users[0].id))
+        session.commit()
+        return [u.id for u in users], channel.id
+
+def act_as(user_id):
+    def current_user_override(session: Session = Depends(get_session)):
+        return session.get(User, user_id)
+    app.dependency_overrides[get_current_user] = current_user_override
+
+def fetch(client, statements, channel_id, limit=5):
+    statements.clear()
+    response = client.get(f"/api/v1/community/channels/{channel_id}/messages?limit={limit}")
+    assert response.status_code == 200
+    message_queries = [s for s in statements if "FROM message" in s]
+    return response.json(), message_queries
+
+def fetch_uncached(client, channel_id, limit=5):
+    message_cache.invalidate(channel_id)
+    return fetch(client, [], channel_id, limit)[0]
+
+def test_latest_page_served_from_cache_after_first_read(engine, client, statements):
+    (alice, _), channel_id = seed(engine, 8)
+    act_as(alice)
+
+    first, queries = fetch(client, statements, channel_id)
+    assert queries
+    second, queries = fetch(client, statements, channel_id)
+    assert not queries
+    assert second == first
+    assert [m["content"] for m in second] == ["m3", "m4", "m5", "m6", "m7"]
+    assert message_cache.stats()["hits"] == 1
+
+def test_mutations_keep_cache_consistent_with_database(engine, client, statements):
+    (alice, bob), channel_id = seed(engine, 6)
+    act_as(alice)
+    fetch(client, statements, channel_id)
+
+    created = client.post(f"/api/v1/community/channels/{channel_id}/messages", json={"content": "new"}).json()
+    client.put(f"/api/v1/community/channels/{channel_id}/messages/{created['id']}", json={"content": "edited"})
+    act_as(bob)
+    client.post(f"/api/v1/community/channels/{channel_id}/messages/{created['id']}/vote?vote_value=1")
+
+    cached, queries = fetch(client, statements, channel_id)
+    assert not queries
+    assert cached[-1]["content"] == "edited"
+    assert cached[-1]["score"] == 1 and cached[-1]["user_vote"] == 1
+    assert cached == fetch_uncached(client, channel_id)
+
+    # Deleting from a partial buffer forces a reload so the next-oldest message slides in
+    act_as(alice)
+    client.delete(f"/api/v1/community/channels/{channel_id}/messages/{created['id']}")
+    after_delete, queries = fetch(client, statements, channel_id)
+    assert queries
+    assert [m["content"] for m in after_delete] == ["m1", "m2", "m3", "m4", "m5"]
+
+def test_cross_worker_hooks():
+    cache = ChannelMessageCache(capacity=3)
+    invalidated, appended = [], []
+    cache.add_invalidation_hook(invalidated.append)
+    cache.add_append_hook(lambda channel_id, entry: appended.append((channel_id, entry["id"])))
+    entry = {"id": 1, "content": "a", "votes": {}, "score": 0}
+    cache.fill("c1", [entry], complete=True)
+
+    # New messages are forwarded as appends and keep the buffer warm
+    cache.append("c1", dict(entry, id=2))
+    assert appended == [("c1", 2)] and invalidated == []
+    # Appends from another worker are applied once and not echoed back
+    cache.append("c1", dict(entry, id=3), propagate=False)
+    cache.append("c1", dict(entry, id=3), propagate=False)
+    assert [e["id"] for e in cache.get_latest("c1", 3)] == [1, 2, 3]
+    assert appended == [("c1", 2)]
+
+    cache.edit("c1", 2, "b")
+    assert invalidated == ["c1"]
+
+    # A change reported by another worker drops the buffer without echoing back
+    cache.invalidate("c1", propagate=False)
+    assert invalidated == ["c1"]
+    assert cache.get_latest("c1", 2) is None
+    assert cache.stats()["invalidations"] == 1
@@ -0,0 +1,148 @@
+import sys
+import os
+import asyncio
+import json
+import threading
+from uuid import uuid4
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session, select
+from app.message_ingest import MessageIngestQueue
+from app.schemas import User, Channel, Message, Badge, UserBadge
+
+@pytest.fixture()
+def commits(engine):
+    committed = []
+
+    @event.listens_for(engine, "commit")
+    def record(conn):
+        committed.append(conn)
+
+    return committed
+
+def seed(engine):
+    with Session(engine) as session:
+        users = [
+            User(id=str(uuid4()), username=f"user{i}", email=f"user{i}@test.com", hashed_password="x")
+            for i in range(2)
+        ]
+        channel = Channel(name="general", slug="general")
+        badge = Badge(name="First Words", description="10 messages", criteria_type="messages", criteria_value=10)
+        session.add_all(users + [channel, badge])
+        session.commit()
+        return [u.id for u in users], channel.id
+
+def test_batched_flush_persists_messages_counters_and_badges(engine, commits):
+    (alice, bob), channel_id = seed(engine)
+    queue = MessageIngestQueue(db_engine=engine, flush_interval_ms=1000, enabled=True)
+
+    async def scenario():
+        acknowledged = [await queue.submit(f"msg {i}", channel_id, alice) for i in range(10)]
+        acknowledged.append(await queue.submit("hi", channel_id, bob))
+        acknowledged.append(await queue.submit("reply", channel_id, bob, parent_id=acknowledged[0].id))
+        assert all(queue.is_pending(m.id) for m in acknowledged)
+        commits.clear()
+        await queue.stop()
+        return acknowledged
+
+    acknowledged = asyncio.run(scenario())
+
+    # IDs are assigned up front, are unique, and survive persistence unchanged
+    ids = [m.id for m in acknowledged]
+    assert len(set(ids)) == len(ids)
+    assert not any(queue.is_pending(i) for i in ids)
+    # Whole batch (rows, counters, badges) lands in a single transaction
+    assert len(commits) == 1
+
+    with Session(engine) as session:
+        stored = session.exec(select(Message).order_by(Message.id)).all()
+        assert [m.id for m in stored] == sorted(ids)
+        assert session.get(Message, ids[0]).reply_count == 1
+        assert session.get(Message, ids[-1]).parent_id == ids[0]
+        assert session.get(User, alice).total_messages == 10
+        assert session.get(User, bob).total_messages == 2
+        earned = session.exec(select(UserBadge.user_id)).all()
+        assert earned == [alice]
+
+def test_allocator_continues_after_existing_rows(engine):
+    (alice, _), channel_id = seed(engine)
+    with Session(engine) as session:
+        session.add(Message(id=41, content="old", channel_id=channel_id, user_id=alice))
+        session.commit()
+
+    queue = MessageIngestQueue(db_engine=engine, enabled=True)
+
+    async def scenario():
+        message = await queue.submit("new", channel_id, alice)
+        await queue.stop()
+        return message
+
+    assert asyncio.run(scenario()).id == 42
+
+def test_ids_are_reserved_off_the_event_loop(engine, statements):
+    (alice, _), channel_id = seed(engine)
+    queue = MessageIngestQueue(db_engine=engine, enabled=True)
+    queue.allocator.block_size = 8
+    queue.allocator.low_water = 2
+    loop_threads = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def on_loop_thread(conn, cursor, statement, parameters, context, executemany):
+        if threading.current_thread() is threading.main_thread():
+            loop_threads.append(statement)
+
+    async def scenario():
+        ids = [(await queue.submit(f"msg {i}", channel_id, alice)).id for i in range(20)]
+        await queue.stop()
+        return ids
+
+    ids = asyncio.run(scenario())
+    assert ids == list(range(1, 21))
+    assert any("max(message.id)" in s for s in statements)
+    assert loop_threads == []
+
+def test_batching_refuses_databases_without_a_shared_sequence(engine, monkeypatch):
+    # However the workers are started (uvicorn --workers sets no environment), SQLite is refused
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    monkeypatch.delenv("PUBSUB_URL", raising=False)
+    queue = MessageIngestQueue(db_engine=engine, enabled=True)
+    with pytest.raises(RuntimeError, match="needs PostgreSQL"):
+        asyncio.run(queue.start())
+
+def test_unpersistable_messages_are_dead_lettered_and_withdrawn(engine, tmp_path):
+    (alice, _), channel_id = seed(engine)
+    dead_letters = tmp_path / "failed.jsonl"
+    queue = MessageIngestQueue(
+        db_engine=engine, enabled=True, max_retries=2, retry_backoff_ms=0, dead_letter_path=str(dead_letters)
+    )
+    withdrawn = []
+
+    async def withdraw(items):
+        withdrawn.extend(item["id"] for item in items)
+    queue.add_drop_hook(withdraw)
+
+    write_batch = queue._write_batch
+    attempts = []
+    def reject_poison(batch):
+        attempts.append(len(batch))
+        if any(item["content"] == "poison" for item in batch):
+            raise RuntimeError("constraint violated")
+        write_batch(batch)
+    queue._write_batch = reject_poison
+
+    async def scenario():
+        acknowledged = [await queue.submit(content, channel_id, alice) for content in ("ok 1", "poison", "ok 2")]
+        await queue.stop()
+        return acknowledged
+
+    good, poison, also_good = asyncio.run(scenario())
+
+    # Two whole-batch attempts, then one row at a time
+    assert attempts == [3, 3, 1, 1, 1]
+    with Session(engine) as session:
+        assert [m.id for m in session.exec(select(Message).order_by(Message.id)).all()] == [good.id, also_good.id]
+    assert withdrawn == [poison.id] and queue.dropped == 1
+    [line] = dead_letters.read_text().splitlines()
+    assert json.loads(line)["content"] == "poison"
@@ -0,0 +1,147 @@
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi import Depends
+from sqlmodel import Session
+from app import llm
+from app.main import app, get_session
+from app.schemas import User, TutorDocument
+from app.dependencies import get_current_user
+from app.pdf_extract import PdfExtractor
+from app.routes import tutor
+
+pytestmark = pytest.mark.usefixtures("portal")
+
+
+def make_pdf(pages):
+    """A minimal PDF with one line of Helvetica text per page."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} >>"
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode()
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+
+@pytest.fixture(scope="module")
+def extractor():
+    extractor = PdfExtractor(workers=2, max_pages=40)
+    yield extractor
+    extractor.shutdown()
+
+@pytest.fixture(autouse=True)
+def background_processing(monkeypatch, engine, extractor):
+    # Background processing opens its own session
+    monkeypatch.setattr(tutor, "engine", engine)
+    monkeypatch.setattr(tutor, "pdf_extractor", extractor)
+    monkeypatch.setattr(llm, "client", None)
+    monkeypatch.delenv("SUPABASE_URL", raising=False)
+
+def act_as_new_user(engine):
+    with Session(engine) as session:
+        name = f"user{uuid4().hex[:8]}"
+        user = User(id=str(uuid4()), username=name, email=f"{name}@test.com", hashed_password="x")
+        session.add(user)
+        session.commit()
+        user_id = user.id
+
+    def current_user_override(session: Session = Depends(get_session)):
+        return session.get(User, user_id)
+    app.dependency_overrides[get_current_user] = current_user_override
+    return user_id
+
+
+def test_pdf_pages_are_extracted_in_parallel_and_in_order(engine, client):
+    act_as_new_user(engine)
+    pages = [f"Page {n} covers topic{n}" for n in range(1, 31)]
+    response = client.post("/api/v1/tutor/upload", files={"file": ("book.pdf", make_pdf(pages), "application/pdf")})
+    assert response.status_code == 202
+    body = response.json()
+    assert body["status"] == "processing" and body["pages"] == 30
+
+    # The test client runs the background task before returning, so processing has finished
+    status = client.get(f"/api/v1/tutor/documents/{body['id']}/status").json()
+    assert status == {"id": body["id"], "status": "ready", "error": None}
+    with Session(engine) as session:
+        content = session.get(TutorDocument, body["id"]).content
+    assert content.split("\n")[:-1] == pages
+
+    response = client.get(f"/api/v1/tutor/documents/{body['id']}/search", params={"q": "topic17"})
+    assert response.json()["results"][0]["content"].count("topic17") == 1
+
+def test_processing_documents_cannot_be_used_yet(engine, client):
+    user_id = act_as_new_user(engine)
+    with Session(engine) as session:
+        doc = TutorDocument(user_id=user_id, filename="book.pdf", content="", file_type="pdf", status="processing")
+        session.add(doc)
+        session.commit()
+        doc_id = doc.id
+
+    response = client.get(f"/api/v1/tutor/documents/{doc_id}/search", params={"q": "anything"})
+    assert response.status_code == 409
+    assert client.get("/api/v1/tutor/documents").json()[0]["status"] == "processing"
+
+def test_limits_and_unreadable_files_are_refused(engine, client):
+    act_as_new_user(engine)
+    response = client.post("/api/v1/tutor/upload", files={"file": ("long.pdf", make_pdf(["x"] * 41), "application/pdf")})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "PDF has 41 pages; the limit is 40."
+
+    response = client.post("/api/v1/tutor/upload", files={"file": ("broken.pdf", b"not a pdf", "application/pdf")})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Could not extract text from PDF."
+
+    tutor_upload_max = tutor.TUTOR_UPLOAD_MAX_BYTES
+    try:
+        tutor.TUTOR_UPLOAD_MAX_BYTES = 1000
+        response = client.post("/api/v1/tutor/upload", files={"file": ("big.txt", b"a" * 5000, "text/plain")})
+    finally:
+        tutor.TUTOR_UPLOAD_MAX_BYTES = tutor_upload_max
+    assert response.status_code == 413
+
+def test_pdf_without_text_is_marked_failed(engine, client):
+    act_as_new_user(engine)
+    response = client.post("/api/v1/tutor/upload", files={"file": ("scan.pdf", make_pdf([""] * 3), "application/pdf")})
+    assert response.status_code == 202
+    status = client.get(f"/api/v1/tutor/documents/{response.json()['id']}/status").json()
+    assert status["status"] == "failed"
+    assert status["error"] == "File is empty or could not be parsed."
+
+def test_uploads_interrupted_by_a_restart_are_marked_failed(engine, client):
+    user_id = act_as_new_user(engine)
+    now = datetime.now(timezone.utc)
+    with Session(engine) as session:
+        stale = TutorDocument(user_id=user_id, filename="old.pdf", content="", file_type="pdf", status="processing",
+                              created_at=now - timedelta(seconds=tutor.TUTOR_PROCESSING_TIMEOUT_S + 60))
+        # Possibly still being processed by another worker
+        recent = TutorDocument(user_id=user_id, filename="new.pdf", content="", file_type="pdf", status="processing",
+                               created_at=now - timedelta(seconds=30))
+        session.add_all([stale, recent])
+        session.commit()
+        stale_id, recent_id = stale.id, recent.id
+
+        assert tutor.fail_stale_uploads(session) == 1
+
+    status = client.get(f"/api/v1/tutor/documents/{stale_id}/status").json()
+    assert status["status"] == "failed" and "upload the file again" in status["error"]
+    assert client.get(f"/api/v1/tutor/documents/{recent_id}/status").json()["status"] == "processing"
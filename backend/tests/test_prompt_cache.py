@@ -0,0 +1,170 @@
+import sys
+import os
+import time
+from types import SimpleNamespace
+from uuid import uuid4
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import anyio
+import pytest
+from fastapi import Depends
+from sqlmodel import Session
+from app import llm
+from app.main import app, get_session
+from app.schemas import User, TutorDocument
+from app.dependencies import get_current_user
+from app import prompt_cache as prompt_cache_module
+from app.prompt_cache import PromptCache
+from app.routes import tutor
+
+pytestmark = pytest.mark.usefixtures("portal")
+
+TEXTBOOK = "The French Revolution began in 1789. " * 1000 + "Robespierre led the Committee of Public Safety. "
+
+
+class CachingProvider:
+    """Stands in for genai.Client with cached-content support: records caches and what each chat turn sent."""
+
+    def __init__(self, refuse=False, chars_per_token=4):
+        self.refuse = refuse
+        self.chars_per_token = chars_per_token
+        self.caches = {}
+        self.deleted = []
+        self.counted = 0
+        self.turns = []  # (message, config)
+        self.aio = SimpleNamespace(
+            caches=SimpleNamespace(create=self.create_cache, delete=self.delete_cache),
+            chats=SimpleNamespace(create=self.create_chat),
+            models=SimpleNamespace(count_tokens=self.count_tokens),
+        )
+
+    async def count_tokens(self, model, contents):
+        self.counted += 1
+        chars = sum(len(part["text"]) for content in contents for part in content["parts"])
+        return SimpleNamespace(total_tokens=chars // self.chars_per_token)
+
+    async def create_cache(self, model, config):
+        if self.refuse:
+            raise ValueError("Cached content is too small")
+        name = f"cachedContents/{len(self.caches) + 1}"
+        self.caches[name] = config
+        return SimpleNamespace(name=name)
+
+    async def delete_cache(self, name):
+        self.deleted.append(name)
+
+    def create_chat(self, model, history, config=None):
+        async def send_message(message):
+            self.turns.append((message, config))
+            return SimpleNamespace(text="An answer")
+
+        async def send_message_stream(message):
+            self.turns.append((message, config))
+            async def chunks():
+                yield SimpleNamespace(text="An answer")
+            return chunks()
+        return SimpleNamespace(send_message=send_message, send_message_stream=send_message_stream)
+
+
+@pytest.fixture(autouse=True)
+def fresh_prompt_cache(monkeypatch):
+    monkeypatch.setattr(tutor, "prompt_cache", PromptCache(ttl_s=900, min_tokens=4096, max_tokens=50000))
+
+def act_as_user_with_document(engine, content):
+    with Session(engine) as session:
+        name = f"user{uuid4().hex[:8]}"
+        user = User(id=str(uuid4()), username=name, email=f"{name}@test.com", hashed_password="x")
+        session.add(user)
+        session.commit()
+        doc = TutorDocument(user_id=user.id, filename="history.txt", content=content)
+        session.add(doc)
+        session.commit()
+        user_id, doc_id = user.id, doc.id
+
+    def current_user_override(session: Session = Depends(get_session)):
+        return session.get(User, user_id)
+    app.dependency_overrides[get_current_user] = current_user_override
+    return doc_id
+
+def ask(client, doc_id, message, path="/api/v1/tutor/chat"):
+    response = client.post(path, json={"document_id": doc_id, "message": message})
+    assert response.status_code == 200
+    return response
+
+
+def test_document_prefix_is_registered_once_per_document(engine, client, monkeypatch):
+    provider = CachingProvider()
+    monkeypatch.setattr(llm, "client", provider)
+    doc_id = act_as_user_with_document(engine, TEXTBOOK)
+
+    ask(client, doc_id, "When did it begin?")
+    ask(client, doc_id, "Who was Robespierre?")
+    ask(client, doc_id, "Summarise it", path="/api/v1/tutor/chat/stream")
+
+    [(name, config)] = provider.caches.items()
+    assert config["system_instruction"] == tutor.TUTOR_INSTRUCTION
+    assert TEXTBOOK in config["contents"][0]["parts"][0]["text"]
+    assert config["ttl"] == "900s"
+    assert provider.counted == 1
+    # Every turn references the cache and sends only the passages retrieved for it plus the question
+    messages = [message for message, _ in provider.turns]
+    assert [m.rsplit("\n\n", 1)[-1] for m in messages] == [
+        "Question: When did it begin?", "Question: Who was Robespierre?", "Question: Summarise it"
+    ]
+    assert not any(tutor.TUTOR_INSTRUCTION in m for m in messages)
+    assert messages[1].startswith("Passages of \"history.txt\"") and "Committee of Public Safety" in messages[1]
+    assert all(len(m) < len(TEXTBOOK) // 4 for m in messages)
+    assert all(turn_config == {"cached_content": name} for _, turn_config in provider.turns)
+    assert tutor.prompt_cache.stats()["hits"] == 2
+
+    anyio.run(tutor.prompt_cache.close)
+    assert provider.deleted == [name]
+
+def test_expired_entries_are_registered_again(engine, client, monkeypatch):
+    provider = CachingProvider()
+    monkeypatch.setattr(llm, "client", provider)
+    doc_id = act_as_user_with_document(engine, TEXTBOOK)
+
+    ask(client, doc_id, "When did it begin?")
+    later = time.monotonic() + 900
+    monkeypatch.setattr(prompt_cache_module, "time", SimpleNamespace(monotonic=lambda: later))
+    ask(client, doc_id, "And when did it end?")
+
+    assert len(provider.caches) == 2
+    assert provider.turns[-1][1] == {"cached_content": "cachedContents/2"}
+    assert tutor.prompt_cache.stats()["expired"] == 1
+
+def test_small_documents_and_refused_caches_are_sent_inline(engine, client, monkeypatch):
+    provider = CachingProvider()
+    monkeypatch.setattr(llm, "client", provider)
+    doc_id = act_as_user_with_document(engine, "Short notes about 1789.")
+    ask(client, doc_id, "What happened?")
+    # Too few characters to reach the token minimum: not even counted
+    assert provider.caches == {} and provider.counted == 0
+    message, config = provider.turns[-1]
+    assert config is None and "Short notes about 1789." in message
+
+    provider.refuse = True
+    doc_id = act_as_user_with_document(engine, TEXTBOOK)
+    ask(client, doc_id, "When did it begin?")
+    ask(client, doc_id, "Who was involved?")
+    # Not retried on every turn after the provider refused
+    assert tutor.prompt_cache.stats()["failures"] == 1
+    message, config = provider.turns[-1]
+    assert config is None and message.startswith(tutor.TUTOR_INSTRUCTION) and "1789" in message
+
+def test_threshold_is_counted_in_tokens(engine, client, monkeypatch):
+    # Long in characters but under the provider's 4096-token minimum
+    provider = CachingProvider(chars_per_token=20)
+    monkeypatch.setattr(llm, "client", provider)
+    doc_id = act_as_user_with_document(engine, TEXTBOOK)
+
+    ask(client, doc_id, "When did it begin?")
+    ask(client, doc_id, "Who was Robespierre?")
+
+    assert provider.caches == {}
+    # Counted once; the document is not re-counted or sent for caching on later turns
+    assert provider.counted == 1
+    assert tutor.prompt_cache.stats()["skipped"] == 1
+    message, config = provider.turns[-1]
+    assert config is None and message.startswith(tutor.TUTOR_INSTRUCTION) and "Robespierre" in message
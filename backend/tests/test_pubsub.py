@@ -0,0 +1,179 @@
+import sys
+import os
+import asyncio
+import json
+import socket
+import subprocess
+from contextlib import contextmanager
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from app.websocket_manager import ConnectionManager
+from app.pubsub import InMemoryBroker, InMemoryHub, RedisBroker
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, frame):
+        self.sent.append(json.loads(frame))
+
+    async def close(self, code=1000):
+        pass
+
+
+async def eventually(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "condition not met in time"
+        await asyncio.sleep(0.01)
+
+def announced(socket, key):
+    return {user_id for m in socket.sent if m["type"] == "presence_diff" for user_id in m[key]}
+
+async def check_two_workers(make_broker):
+    """Alice is on worker A, Bob on worker B; events and presence must cross over."""
+    worker_a, worker_b = [ConnectionManager(presence_batch_ms=10, presence_grace_ms=0) for _ in range(2)]
+    await worker_a.start(make_broker())
+    await worker_b.start(make_broker())
+
+    bob_socket = FakeSocket()
+    await worker_b.connect(bob_socket, "bob")
+    alice_socket = FakeSocket()
+    alice = await worker_a.connect(alice_socket, "alice")
+    worker_a.subscribe(alice, "channel:1")
+
+    await eventually(lambda: "alice" in announced(bob_socket, "online"))
+    assert worker_b.is_online("alice") and sorted(worker_b.online_users_list) == ["alice", "bob"]
+
+    # Published on B, delivered to the subscriber held by A
+    await worker_b.publish("channel:1", {"type": "message", "content": "hi"})
+    await worker_b.send_personal_message({"type": "dm", "content": "psst"}, "alice")
+    await eventually(lambda: {"type": "dm", "content": "psst"} in alice_socket.sent)
+    # Numbered by the delivering worker, for replay to its own clients
+    assert {"type": "message", "content": "hi", "topic": "channel:1", "seq": 1} in alice_socket.sent
+
+    # A worker that starts later learns who is already online
+    worker_c = ConnectionManager()
+    await worker_c.start(make_broker())
+    await eventually(lambda: sorted(worker_c.online_users_list) == ["alice", "bob"])
+
+    # Application events (message cache invalidation) reach the other workers
+    invalidated = []
+    worker_b.add_event_handler("cache_invalidate", lambda event: invalidated.append(event["channel_id"]))
+    worker_a.forward_soon({"kind": "cache_invalidate", "channel_id": "1"})
+    await eventually(lambda: invalidated == ["1"])
+
+    await worker_a.disconnect(alice)
+    await eventually(lambda: "alice" in announced(bob_socket, "offline"))
+    await eventually(lambda: worker_c.online_users_list == ["bob"])
+
+    for worker in (worker_a, worker_b, worker_c):
+        await worker.stop()
+
+def test_in_memory_broker_links_workers():
+    hub = InMemoryHub()
+    asyncio.run(check_two_workers(lambda: InMemoryBroker(hub)))
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+@contextmanager
+def stand_in_broker(port):
+    process = subprocess.Popen(
+        [sys.executable, "pubsub_broker.py", "--port", str(port)],
+        cwd=BACKEND_DIR, stdout=subprocess.PIPE, text=True,
+    )
+    try:
+        assert "listening" in process.stdout.readline()
+        yield f"redis://127.0.0.1:{port}"
+    finally:
+        process.terminate()
+        process.wait(timeout=5)
+
+@pytest.fixture()
+def broker_url():
+    with stand_in_broker(free_port()) as url:
+        yield url
+
+def test_networked_broker_links_workers(broker_url):
+    asyncio.run(check_two_workers(lambda: RedisBroker(broker_url)))
+
+def test_unreachable_broker_does_not_stop_startup(monkeypatch):
+    monkeypatch.setattr(RedisBroker, "CONNECT_TIMEOUT", 0.2)
+    monkeypatch.setattr(RedisBroker, "RECONNECT_DELAY", 0.05)
+    port = free_port()
+
+    async def scenario():
+        worker = ConnectionManager()
+        await worker.start(RedisBroker(f"redis://127.0.0.1:{port}"))
+        assert not worker.broker.connected
+        # Events still reach this worker's own sockets meanwhile
+        socket_ = FakeSocket()
+        connection = await worker.connect(socket_, "alice")
+        worker.subscribe(connection, "channel:1")
+        await worker.publish("channel:1", {"type": "message", "content": "local"})
+        await eventually(lambda: any(m.get("content") == "local" for m in socket_.sent))
+
+        with stand_in_broker(port):
+            await eventually(lambda: worker.broker.connected, timeout=5)
+        await worker.stop()
+
+    asyncio.run(scenario())
+
+def test_presence_of_a_silent_worker_expires():
+    hub = InMemoryHub()
+
+    async def scenario():
+        worker_a = ConnectionManager(presence_batch_ms=10, presence_grace_ms=0, presence_heartbeat_s=0.05)
+        worker_b = ConnectionManager(presence_batch_ms=10, presence_grace_ms=0,
+                                     presence_heartbeat_s=0.05, presence_ttl_s=0.3)
+        await worker_a.start(InMemoryBroker(hub))
+        await worker_b.start(InMemoryBroker(hub))
+        await worker_a.connect(FakeSocket(), "alice")
+        await eventually(lambda: worker_b.is_online("alice"))
+
+        # A keeps beating: alice stays online past the TTL
+        await asyncio.sleep(0.5)
+        assert worker_b.is_online("alice")
+
+        # A dies without saying bye
+        worker_a._heartbeat.cancel()
+        hub.handlers.remove(worker_a.broker.handler)
+        worker_a.broker = None
+        await eventually(lambda: not worker_b.is_online("alice"))
+        assert worker_b.stats()["expired_workers"] == 1
+        await worker_b.stop()
+
+    asyncio.run(scenario())
+
+def test_worker_reannounces_presence_after_reconnecting(monkeypatch):
+    monkeypatch.setattr(RedisBroker, "RECONNECT_DELAY", 0.05)
+    monkeypatch.setattr(RedisBroker, "MAX_RECONNECT_DELAY", 0.2)
+    port = free_port()
+
+    async def scenario():
+        worker_a, worker_b = [ConnectionManager(presence_batch_ms=10, presence_grace_ms=0) for _ in range(2)]
+        with stand_in_broker(port) as url:
+            await worker_a.start(RedisBroker(url))
+            await worker_b.start(RedisBroker(url))
+        await eventually(lambda: not worker_a.broker.connected)
+
+        # The presence event for alice is lost while the broker is down
+        await worker_a.connect(FakeSocket(), "alice")
+        assert not worker_b.is_online("alice")
+
+        with stand_in_broker(port):
+            await eventually(lambda: worker_b.is_online("alice"), timeout=5)
+            for worker in (worker_a, worker_b):
+                await worker.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,97 @@
+import sys
+import os
+from uuid import uuid4
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlmodel import Session, SQLModel
+from app.main import app
+from app.schemas import User, Community, StudyGroup, StudyGroupMember
+from app.dependencies import get_current_user
+
+def make_user(session, name):
+    user = User(
+        id=str(uuid4()),
+        username=name,
+        email=f"{name}@test.com",
+        hashed_password="x",
+    )
+    session.add(user)
+    session.commit()
+    session.refresh(user)
+    return user
+
+def seed_groups(engine, count):
+    """Create a community with `count` groups; the caller is approved in even groups."""
+    with Session(engine) as session:
+        caller = make_user(session, "caller")
+        other = make_user(session, "other")
+        community = Community(name="Test Community", owner_id=caller.id)
+        session.add(community)
+        session.commit()
+        session.refresh(community)
+        for i in range(count):
+            group = StudyGroup(
+                name=f"Group {i:02d}",
+                community_id=community.id,
+                creator_id=other.id,
+            )
+            session.add(group)
+            session.commit()
+            session.refresh(group)
+            session.add(StudyGroupMember(group_id=group.id, user_id=other.id, role="leader"))
+            if i % 2 == 0:
+                session.add(StudyGroupMember(group_id=group.id, user_id=caller.id))
+            else:
+                session.add(StudyGroupMember(group_id=group.id, user_id=caller.id, status="pending"))
+        session.commit()
+        caller_id = caller.id
+        community_id = community.id
+    app.dependency_overrides[get_current_user] = lambda: User(
+        id=caller_id, username="caller", email="caller@test.com", hashed_password="x"
+    )
+    return community_id
+
+def count_queries(client, statements, url):
+    statements.clear()
+    response = client.get(url)
+    assert response.status_code == 200
+    return response.json(), len(statements)
+
+def test_community_groups_aggregates_counts_and_membership(engine, client, statements):
+    community_id = seed_groups(engine, 4)
+    groups, _ = count_queries(client, statements, f"/api/v1/community/communities/{community_id}/groups")
+
+    assert [g["name"] for g in groups] == ["Group 00", "Group 01", "Group 02", "Group 03"]
+    # Pending members are not counted and do not make the caller a member
+    assert [g["member_count"] for g in groups] == [2, 1, 2, 1]
+    assert [g["is_member"] for g in groups] == [True, False, True, False]
+
+def test_community_groups_pagination_and_search(engine, client, statements):
+    community_id = seed_groups(engine, 12)
+    url = f"/api/v1/community/communities/{community_id}/groups"
+
+    page, _ = count_queries(client, statements, f"{url}?skip=5&limit=3")
+    assert [g["name"] for g in page] == ["Group 05", "Group 06", "Group 07"]
+
+    matches, _ = count_queries(client, statements, f"{url}?search=group 1")
+    assert [g["name"] for g in matches] == ["Group 10", "Group 11"]
+
+def test_group_listings_use_constant_number_of_queries(engine, client, statements):
+    community_id = seed_groups(engine, 2)
+    _, small_community = count_queries(client, statements, f"/api/v1/community/communities/{community_id}/groups")
+    small_mine, small_my_groups = count_queries(client, statements, "/api/v1/community/users/me/groups")
+    assert len(small_mine) == 2
+
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+
+    # More groups than any page size: without explicit paging the full list is returned
+    community_id = seed_groups(engine, 60)
+    large_groups, large_community = count_queries(client, statements, f"/api/v1/community/communities/{community_id}/groups")
+    large_mine, large_my_groups = count_queries(client, statements, "/api/v1/community/users/me/groups")
+    assert len(large_groups) == 60
+    assert len(large_mine) == 60
+    assert all(g["is_member"] for g in large_mine)
+
+    assert large_community == small_community == 1
+    assert large_my_groups == small_my_groups == 1
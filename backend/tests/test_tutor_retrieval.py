@@ -0,0 +1,204 @@
+import sys
+import os
+import hashlib
+import re
+from types import SimpleNamespace
+from uuid import uuid4
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pytest
+from fastapi import Depends
+from sqlmodel import Session, select
+from app import llm
+from app.main import app, get_session
+from app.schemas import User, TutorChunk, TutorDocument, TutorLexicalIndex
+from app.dependencies import get_current_user
+from app.bm25 import BM25Index
+from app.tutor_index import chunk_text, tutor_index
+from app.prompt_cache import prompt_cache
+
+pytestmark = pytest.mark.usefixtures("portal")
+
+TOPICS = ["photosynthesis chlorophyll sunlight", "volcano magma eruption", "parliament election ballot",
+          "enzyme substrate catalyst", "glacier erosion moraine", "sonnet rhyme meter"]
+
+
+def chapter(n, topic):
+    sentence = f"This chapter covers {topic}. "
+    return f"Chapter {n}\n\n" + sentence * 200
+
+
+class EmbeddingProvider:
+    """Stands in for genai.Client: hashed bag-of-words embeddings, and a chat that records its prompt."""
+
+    def __init__(self):
+        self.prompts = []
+        self.embedded = 0
+        self.aio = SimpleNamespace(
+            models=SimpleNamespace(embed_content=self.embed_content),
+            chats=SimpleNamespace(create=self.create),
+        )
+
+    async def embed_content(self, model, contents, config):
+        self.embedded += len(contents)
+        dims = config["output_dimensionality"]
+        embeddings = []
+        for text in contents:
+            vector = np.zeros(dims)
+            for word in re.findall(r"[a-z]+", text.lower()):
+                vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % dims] += 1
+            embeddings.append(SimpleNamespace(values=vector.tolist()))
+        return SimpleNamespace(embeddings=embeddings)
+
+    def create(self, model, history, config=None):
+        return SimpleNamespace(send_message=self.send_message)
+
+    async def send_message(self, message):
+        self.prompts.append(message)
+        return SimpleNamespace(text="An answer")
+
+
+@pytest.fixture(autouse=True)
+def reset_index():
+    yield
+    tutor_index._users.clear()
+    tutor_index._lexical.clear()
+
+@pytest.fixture()
+def provider(monkeypatch):
+    provider = EmbeddingProvider()
+    monkeypatch.setattr(llm, "client", provider)
+    # Retrieval is what is tested here, not provider-side caching of whole documents
+    monkeypatch.setattr(prompt_cache, "ttl_s", 0)
+    return provider
+
+def act_as_new_user(engine):
+    with Session(engine) as session:
+        name = f"user{uuid4().hex[:8]}"
+        user = User(id=str(uuid4()), username=name, email=f"{name}@test.com", hashed_password="x")
+        session.add(user)
+        session.commit()
+        user_id = user.id
+
+    def current_user_override(session: Session = Depends(get_session)):
+        return session.get(User, user_id)
+    app.dependency_overrides[get_current_user] = current_user_override
+    return user_id
+
+
+def test_chunk_text_overlaps_and_breaks_on_paragraphs():
+    text = "\n\n".join(chapter(n, topic) for n, topic in enumerate(TOPICS, 1))
+    chunks = chunk_text(text, size=1500, overlap=200)
+    assert len(chunks) > len(TOPICS)
+    assert all(len(c) <= 1500 for c in chunks)
+    # Consecutive passages share text, and nothing is lost between them
+    for first, second in zip(chunks, chunks[1:]):
+        assert second[:50] in first
+    assert chunks[-1].endswith(text.strip()[-50:])
+    assert chunk_text("   ") == []
+    assert chunk_text("short note") == ["short note"]
+
+
+def test_chat_sends_only_relevant_passages(engine, client, provider):
+    user_id = act_as_new_user(engine)
+    text = "\n\n".join(chapter(n, topic) for n, topic in enumerate(TOPICS, 1))
+
+    response = client.post("/api/v1/tutor/upload", files={"file": ("book.txt", text.encode(), "text/plain")})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["chunks"] > 1
+    with Session(engine) as session:
+        stored = session.exec(select(TutorChunk).where(TutorChunk.document_id == body["id"])).all()
+        assert len(stored) == body["chunks"]
+        assert all(c.user_id == user_id and len(c.embedding) == llm.EMBEDDING_DIMENSIONS * 2 for c in stored)
+
+    response = client.post("/api/v1/tutor/chat", json={
+        "document_id": body["id"], "message": "How does a glacier cause erosion and leave a moraine?",
+    })
+    assert response.status_code == 200
+    [prompt] = provider.prompts
+    assert "glacier erosion moraine" in prompt
+    assert "photosynthesis" not in prompt
+    assert len(prompt) < len(text) / 2
+
+
+def test_documents_from_before_indexing_are_indexed_on_first_chat(engine, client, provider):
+    user_id = act_as_new_user(engine)
+    text = "\n\n".join(chapter(n, topic) for n, topic in enumerate(TOPICS, 1))
+    with Session(engine) as session:
+        doc = TutorDocument(user_id=user_id, filename="old.txt", content=text)
+        session.add(doc)
+        session.commit()
+        doc_id = doc.id
+
+    response = client.post("/api/v1/tutor/chat", json={"document_id": doc_id, "message": "Tell me about volcano magma"})
+    assert response.status_code == 200
+    assert "volcano magma eruption" in provider.prompts[-1]
+    assert "sonnet" not in provider.prompts[-1]
+    with Session(engine) as session:
+        assert tutor_index.is_indexed(session, doc_id)
+        assert session.get(TutorLexicalIndex, doc_id) is not None
+
+    # The second question reuses the stored passages; only the question is embedded
+    embedded = provider.embedded
+    client.post("/api/v1/tutor/chat", json={"document_id": doc_id, "message": "What is a sonnet's meter?"})
+    assert provider.embedded == embedded + 1
+    assert "sonnet rhyme meter" in provider.prompts[-1]
+
+
+def test_bm25_ranks_passages_and_round_trips():
+    passages = [chapter(n, topic) for n, topic in enumerate(TOPICS, 1)]
+    index = BM25Index.build(passages)
+    [best, *_] = index.search("Which chapter explains the parliament ballot?", k=3)
+    assert best.ordinal == 2
+    assert index.search("nothing matches xylophone", k=3) == []
+
+    restored = BM25Index.from_bytes(index.to_bytes())
+    assert restored.search("enzyme catalyst", k=2) == index.search("enzyme catalyst", k=2)
+    assert len(index.to_bytes()) < sum(len(p) for p in passages) / 10
+
+
+def test_chat_uses_bm25_when_embeddings_are_unavailable(engine, client, provider):
+    act_as_new_user(engine)
+    text = "\n\n".join(chapter(n, topic) for n, topic in enumerate(TOPICS, 1))
+
+    async def provider_down(model, contents, config):
+        raise ConnectionError("embedding service unavailable")
+    provider.aio.models.embed_content = provider_down
+
+    response = client.post("/api/v1/tutor/upload", files={"file": ("book.txt", text.encode(), "text/plain")})
+    assert response.status_code == 200
+    doc_id = response.json()["id"]
+    # Passages and the keyword index are stored without any AI call
+    assert response.json()["chunks"] > 1
+    with Session(engine) as session:
+        assert session.get(TutorLexicalIndex, doc_id) is not None
+
+    response = client.post("/api/v1/tutor/chat", json={"document_id": doc_id, "message": "What makes an enzyme a catalyst?"})
+    assert response.status_code == 200
+    assert "enzyme substrate catalyst" in provider.prompts[-1]
+    assert "photosynthesis" not in provider.prompts[-1]
+
+
+def test_search_endpoint(engine, client, provider):
+    act_as_new_user(engine)
+    text = "\n\n".join(chapter(n, topic) for n, topic in enumerate(TOPICS, 1))
+    doc_id = client.post(
+        "/api/v1/tutor/upload", files={"file": ("book.txt", text.encode(), "text/plain")}
+    ).json()["id"]
+
+    response = client.get(f"/api/v1/tutor/documents/{doc_id}/search", params={"q": "magma", "limit": 3})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert 0 < len(results) <= 3
+    assert all("magma" in r["content"] for r in results)
+    assert results == sorted(results, key=lambda r: -r["score"])
+
+    response = client.get(f"/api/v1/tutor/documents/{doc_id}/search", params={"q": "xylophone"})
+    assert response.json() == {"query": "xylophone", "results": []}
+
+    # Another user's document is not found
+    act_as_new_user(engine)
+    response = client.get(f"/api/v1/tutor/documents/{doc_id}/search", params={"q": "magma"})
+    assert response.status_code == 404
@@ -0,0 +1,58 @@
+import sys
+import os
+import asyncio
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.typing_indicators import TypingIndicators
+
+
+def make_indicators():
+    indicators = TypingIndicators(interval_ms=100, ttl_ms=200)
+    events = []
+
+    async def publish(channel_id, user_id, event):
+        events.append(event["type"])
+
+    indicators.publish = publish
+    return indicators, events
+
+def test_keystrokes_are_coalesced_and_expire():
+    async def scenario():
+        indicators, events = make_indicators()
+        # A burst of keystrokes produces one event
+        for _ in range(20):
+            await indicators.touch("general", "alice")
+        assert events == ["typing"]
+        assert indicators.suppressed == 19
+
+        # Still typing after the interval: one refresh
+        await asyncio.sleep(0.12)
+        await indicators.touch("general", "alice")
+        assert events == ["typing", "typing"]
+
+        # Other users and channels are tracked separately
+        await indicators.touch("general", "bob")
+        await indicators.touch("homework", "alice")
+        assert events.count("typing") == 4
+
+        # Keystrokes stop: every indicator expires on its own
+        await asyncio.sleep(0.3)
+        assert events.count("typing_stopped") == 3
+        assert not indicators.is_typing("general", "alice")
+
+    asyncio.run(scenario())
+
+def test_sending_clears_indicator_silently():
+    async def scenario():
+        indicators, events = make_indicators()
+        await indicators.touch("general", "alice")
+        indicators.clear("general", "alice")
+        await asyncio.sleep(0.3)
+        assert events == ["typing"]
+
+        # After sending, the next keystroke is announced straight away
+        await indicators.touch("general", "alice")
+        assert events == ["typing", "typing"]
+        indicators.clear("general", "alice")
+
+    asyncio.run(scenario())
@@ -0,0 +1,79 @@
+import sys
+import os
+from uuid import uuid4
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import Depends
+from sqlmodel import Session, select
+from app.main import app, get_session
+from app.schemas import User, Community, Channel, ChannelReadState, Message, StudyGroup, StudyGroupMember
+from app.dependencies import get_current_user
+
+def act_as(user_id):
+    def current_user_override(session: Session = Depends(get_session)):
+        return session.get(User, user_id)
+    app.dependency_overrides[get_current_user] = current_user_override
+
+def seed(engine):
+    with Session(engine) as session:
+        alice, bob = [
+            User(id=str(uuid4()), username=name, email=f"{name}@test.com", hashed_password="x")
+            for name in ("alice", "bob")
+        ]
+        session.add_all([alice, bob])
+        session.commit()
+        community = Community(name="Workshop", owner_id=alice.id)
+        session.add(community)
+        session.commit()
+        group = StudyGroup(name="Private", community_id=community.id, creator_id=bob.id)
+        session.add(group)
+        session.commit()
+        # Alice has asked to join but is not approved yet
+        session.add(StudyGroupMember(group_id=group.id, user_id=alice.id, status="pending"))
+        general = Channel(name="general", slug="general", community_id=community.id)
+        homework = Channel(name="homework", slug="homework", community_id=community.id)
+        private = Channel(name="private", slug="private", community_id=community.id, study_group_id=group.id)
+        session.add_all([general, homework, private])
+        session.commit()
+        for i in range(3):
+            session.add(Message(content=f"g{i}", channel_id=general.id, user_id=bob.id))
+        session.add(Message(content="mine", channel_id=general.id, user_id=alice.id))
+        session.add(Message(content="h", channel_id=homework.id, user_id=bob.id))
+        session.add(Message(content="secret", channel_id=private.id, user_id=bob.id))
+        session.commit()
+        return alice.id, community.id, general.id, homework.id, private.id
+
+def unread_by_channel(client, statements, community_id):
+    statements.clear()
+    response = client.get(f"/api/v1/community/communities/{community_id}/unread")
+    assert response.status_code == 200
+    # One statement for all channels (the other is the auth user lookup)
+    assert len([s for s in statements if "FROM channel" in s]) == 1
+    assert len(statements) == 2
+    return {row["channel_id"]: row["unread_count"] for row in response.json()}
+
+def test_unread_counts_follow_read_pointer(engine, client, statements):
+    alice, community_id, general, homework, private = seed(engine)
+    act_as(alice)
+
+    # Own messages are not unread; private channels of groups the user is not approved in are hidden
+    assert unread_by_channel(client, statements, community_id) == {general: 3, homework: 1}
+
+    response = client.put(f"/api/v1/community/channels/{general}/read", json={"message_id": 2})
+    assert response.json()["unread_count"] == 1
+
+    # Pointers never move backwards
+    response = client.put(f"/api/v1/community/channels/{general}/read", json={"message_id": 1})
+    assert response.json()["last_read_message_id"] == 2
+
+    assert unread_by_channel(client, statements, community_id) == {general: 1, homework: 1}
+
+def test_private_channels_cannot_be_marked_read_by_non_members(engine, client):
+    alice, community_id, general, homework, private = seed(engine)
+    act_as(alice)
+
+    # Alice's membership is still pending
+    response = client.put(f"/api/v1/community/channels/{private}/read", json={"message_id": 99})
+    assert response.status_code == 403
+    with Session(engine) as session:
+        assert session.exec(select(ChannelReadState).where(ChannelReadState.channel_id == private)).first() is None
@@ -0,0 +1,82 @@
+import sys
+import os
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from sqlmodel import Session, SQLModel, create_engine, select, func
+from app.schemas import User, Channel, Message, MessageVote
+from app.dependencies import create_access_token
+
+VOTERS = 200
+
+@pytest.fixture()
+def engine(tmp_path):
+    # File-backed SQLite so every request gets its own connection, like a real pool
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'votes.db'}",
+        connect_args={"check_same_thread": False, "timeout": 60},
+    )
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+def seed(engine):
+    with Session(engine) as session:
+        users = [
+            User(id=str(uuid4()), username=f"voter{i}", email=f"voter{i}@test.com", hashed_password="x")
+            for i in range(VOTERS + 1)
+        ]
+        channel = Channel(name="general", slug="general")
+        session.add_all(users + [channel])
+        session.commit()
+        author = users[0]
+        message = Message(content="helpful answer", channel_id=channel.id, user_id=author.id)
+        session.add(message)
+        session.commit()
+        return author.id, channel.id, message.id, [u.username for u in users[1:]]
+
+def vote_all(client, channel_id, message_id, votes):
+    def cast(args):
+        username, value = args
+        token = create_access_token({"sub": username})
+        response = client.post(
+            f"/api/v1/community/channels/{channel_id}/messages/{message_id}/vote",
+            params={"vote_value": value},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert response.status_code == 200, response.text
+    with ThreadPoolExecutor(max_workers=len(votes)) as pool:
+        list(pool.map(cast, votes))
+
+def test_parallel_votes_do_not_lose_updates(engine, client):
+    author_id, channel_id, message_id, voters = seed(engine)
+
+    vote_all(client, channel_id, message_id, [(name, 1) for name in voters])
+    with Session(engine) as session:
+        author = session.get(User, author_id)
+        assert author.reputation_points == VOTERS
+        assert author.helpful_votes == VOTERS
+        assert session.exec(select(func.count(MessageVote.id))).one() == VOTERS
+
+    # A quarter switch to downvotes (-2 each), a quarter retract (-1 each), the rest re-send +1 (no-op)
+    changes = (
+        [(name, -1) for name in voters[:VOTERS // 4]]
+        + [(name, 0) for name in voters[VOTERS // 4:VOTERS // 2]]
+        + [(name, 1) for name in voters[VOTERS // 2:]]
+    )
+    vote_all(client, channel_id, message_id, changes)
+    with Session(engine) as session:
+        author = session.get(User, author_id)
+        assert author.reputation_points == VOTERS - 2 * (VOTERS // 4) - VOTERS // 4
+        assert author.helpful_votes == VOTERS // 2
+        score = session.exec(select(func.sum(MessageVote.value))).one()
+        assert score == VOTERS // 2 - VOTERS // 4
+        assert session.exec(select(func.count(MessageVote.id))).one() == VOTERS - VOTERS // 4
+
+def test_reputation_never_goes_negative(engine, client):
+    author_id, channel_id, message_id, voters = seed(engine)
+    vote_all(client, channel_id, message_id, [(name, -1) for name in voters[:20]])
+    with Session(engine) as session:
+        assert session.get(User, author_id).reputation_points == 0
@@ -0,0 +1,216 @@
+import sys
+import os
+import asyncio
+import json
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from app import websocket_manager
+from app.pubsub import InMemoryBroker
+from app.websocket_manager import ConnectionManager
+
+
+class FakeSocket:
+    """Records frames; a stalled socket never finishes a send (a client on a dead network)."""
+
+    def __init__(self, stalled=False):
+        self.stalled = stalled
+        self.sent = []
+        self.close_code = None
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, frame):
+        if self.stalled:
+            await asyncio.Event().wait()
+        self.sent.append(json.loads(frame))
+
+    async def close(self, code=1000):
+        self.close_code = code
+
+
+async def broadcast_burst(policy):
+    manager = ConnectionManager(queue_size=4, slow_consumer_policy=policy)
+    fast, slow = FakeSocket(), FakeSocket(stalled=True)
+    await manager.connect(fast, "fast")
+    await manager.connect(slow, "slow")
+
+    async def burst():
+        for n in range(20):
+            await manager.broadcast_all({"type": "message", "n": n})
+            await asyncio.sleep(0)  # Events arrive over time; healthy writers keep up
+
+    # Fan-out only enqueues, so it completes even though "slow" never drains
+    await asyncio.wait_for(burst(), timeout=1)
+    await asyncio.sleep(0.05)
+    return manager, fast, slow
+
+def test_slow_consumer_is_disconnected_without_delaying_others():
+    async def scenario():
+        manager, fast, slow = await broadcast_burst("disconnect")
+        assert [m["n"] for m in fast.sent if m["type"] == "message"] == list(range(20))
+        assert slow.close_code == 1013
+        assert "slow" not in manager.active_connections
+        assert manager.slow_consumer_disconnects == 1
+        assert not manager.is_online("slow")
+        for connection in manager.user_connections("fast"):
+            await manager.disconnect(connection)
+
+    asyncio.run(scenario())
+
+def test_drop_policy_keeps_slow_consumer_connected():
+    async def scenario():
+        manager, fast, slow = await broadcast_burst("drop")
+        assert [m["n"] for m in fast.sent if m["type"] == "message"] == list(range(20))
+        assert slow.close_code is None
+        assert "slow" in manager.active_connections
+        # One frame is stuck in the stalled send and four wait in the queue
+        [slow_connection] = manager.user_connections("slow")
+        assert slow_connection.dropped == 15
+        for user_id in ("slow", "fast"):
+            for connection in manager.user_connections(user_id):
+                await manager.disconnect(connection)
+
+    asyncio.run(scenario())
+
+def presence_events(socket):
+    return [m for m in socket.sent if m["type"] == "presence_diff"]
+
+def test_presence_is_reference_counted_across_devices():
+    async def scenario():
+        # Flushed by hand below; no offline grace period
+        manager = ConnectionManager(presence_batch_ms=60000, presence_grace_ms=0)
+        watcher, laptop, phone = FakeSocket(), FakeSocket(), FakeSocket()
+        await manager.connect(watcher, "watcher")
+        first = await manager.connect(laptop, "alice")
+        second = await manager.connect(phone, "alice")
+        manager.flush_presence()
+
+        # Targeted sends reach every device
+        await manager.send_personal_message({"type": "dm"}, "alice")
+        manager.subscribe(first, "channel:1")
+        await manager.publish("channel:1", {"type": "message"})
+        await asyncio.sleep(0.01)
+        assert {"type": "dm"} in laptop.sent and {"type": "dm"} in phone.sent
+        event = {"type": "message", "topic": "channel:1", "seq": 1}
+        assert event in laptop.sent and event not in phone.sent
+
+        # Closing one tab keeps the user online
+        await manager.disconnect(first)
+        manager.flush_presence()
+        await asyncio.sleep(0.01)
+        assert manager.is_online("alice")
+        assert manager.subscribers("channel:1") == set()
+        assert presence_events(watcher) == [{"type": "presence_diff", "online": ["alice", "watcher"], "offline": []}]
+
+        await manager.disconnect(second)
+        manager.flush_presence()
+        await asyncio.sleep(0.01)
+        assert not manager.is_online("alice")
+        assert presence_events(watcher)[-1] == {"type": "presence_diff", "online": [], "offline": ["alice"]}
+
+    asyncio.run(scenario())
+
+def test_presence_changes_are_batched_and_flaps_suppressed():
+    async def scenario():
+        manager = ConnectionManager(presence_batch_ms=50, presence_grace_ms=200)
+        watcher = FakeSocket()
+        await manager.connect(watcher, "watcher")
+        await asyncio.sleep(0.1)
+        watcher.sent.clear()
+
+        # A reconnect storm: 50 users arrive, one flaps straight back
+        connections = {}
+        for i in range(50):
+            connections[i] = await manager.connect(FakeSocket(), f"user{i}")
+        await asyncio.sleep(0.1)
+        assert len(presence_events(watcher)) == 1
+        assert len(presence_events(watcher)[0]["online"]) == 50
+
+        await manager.disconnect(connections[0])
+        await asyncio.sleep(0.1)
+        await manager.connect(FakeSocket(), "user0")  # Back within the grace period
+        await manager.disconnect(connections[1])      # Gone for good
+        await asyncio.sleep(0.4)
+        assert presence_events(watcher)[1:] == [{"type": "presence_diff", "online": [], "offline": ["user1"]}]
+        assert manager.announced == {"watcher"} | {f"user{i}" for i in range(50) if i != 1}
+
+    asyncio.run(scenario())
+
+def test_topic_events_are_sequenced_and_replayable():
+    async def scenario():
+        manager = ConnectionManager(replay_buffer_size=3, replay_topics=2)
+        for n in range(1, 6):
+            await manager.publish("channel:1", {"type": "message", "n": n}, exclude_user="bob" if n == 4 else None)
+        # Ephemeral events are neither numbered nor kept
+        await manager.publish("channel:1", {"type": "typing"}, replay=False)
+        assert manager.current_seq("channel:1") == 5
+
+        missed = manager.missed_events("channel:1", 2, "bob")
+        assert [(m["seq"], m["n"]) for m in missed] == [(3, 3), (5, 5)]
+        assert missed[0]["topic"] == "channel:1"
+        assert manager.missed_events("channel:1", 5, "bob") == []
+        # Event 2 has left the buffer: the client has to refetch
+        assert manager.missed_events("channel:1", 1, "bob") is None
+
+        # The least recently active topic's buffer is evicted, but its numbering carries on
+        await manager.publish("channel:2", {"type": "message"})
+        await manager.publish("channel:3", {"type": "message"})
+        assert manager.missed_events("channel:1", 4, "bob") is None
+        await manager.publish("channel:1", {"type": "message"})
+        assert manager.current_seq("channel:1") == 6
+
+    asyncio.run(scenario())
+
+class BrokenSocket(FakeSocket):
+    async def send_text(self, frame):
+        raise ConnectionResetError("peer went away")
+
+def test_silent_connections_are_pinged_then_reaped():
+    async def scenario():
+        manager = ConnectionManager(heartbeat_interval_s=0.05, idle_timeout_s=0.2, presence_grace_ms=0)
+        live_socket, silent_socket = FakeSocket(), FakeSocket()
+        live = await manager.connect(live_socket, "live")
+        await manager.connect(silent_socket, "silent")
+
+        # The live client answers every ping; the silent one never does
+        for _ in range(10):
+            await asyncio.sleep(0.03)
+            if any(m["type"] == "ping" for m in live_socket.sent):
+                live_socket.sent.clear()
+                live.touch()
+
+        assert {"type": "ping"} in silent_socket.sent
+        assert silent_socket.close_code == 1001
+        assert not manager.is_online("silent") and manager.is_online("live")
+        stats = manager.stats()
+        assert (stats["open_connections"], stats["reaped_connections"]) == (1, 1)
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+def test_failed_send_removes_connection():
+    async def scenario():
+        manager = ConnectionManager()
+        broken = BrokenSocket()
+        await manager.connect(broken, "gone")
+        await manager.send_personal_message({"type": "dm"}, "gone")
+        await asyncio.sleep(0.01)
+        assert manager.user_connections("gone") == [] and broken.close_code == 1011
+        assert manager.stats()["send_failures"] == 1
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+def test_startup_fails_when_a_configured_codec_is_missing(monkeypatch):
+    monkeypatch.setattr(websocket_manager, "msgpack", None)
+    with pytest.raises(RuntimeError, match="msgpack"):
+        asyncio.run(ConnectionManager().start(InMemoryBroker()))
+    with pytest.raises(RuntimeError, match="unknown subprotocol"):
+        websocket_manager.check_subprotocols(["json", "cbor"])
+
+    # Not offered, not required
+    monkeypatch.setattr(websocket_manager, "SUBPROTOCOLS", ["json"])
+    websocket_manager.check_subprotocols()
+    assert websocket_manager.negotiate_codec(["msgpack", "json"]) == "json"
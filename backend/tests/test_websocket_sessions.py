@@ -0,0 +1,71 @@
+import sys
+import os
+from contextlib import ExitStack
+from uuid import uuid4
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi import Depends
+from sqlalchemy.pool import QueuePool
+from sqlmodel import Session, SQLModel, create_engine
+from app.main import app, get_session
+from app.schemas import User, Community, Channel
+from app.dependencies import get_current_user, create_access_token
+from app.websocket_manager import channel_topic
+
+pytestmark = pytest.mark.usefixtures("portal")
+
+@pytest.fixture()
+def engine(tmp_path):
+    # A deliberately tiny pool: one connection, no overflow, fail fast instead of queueing
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        connect_args={"check_same_thread": False},
+        poolclass=QueuePool, pool_size=1, max_overflow=0, pool_timeout=1,
+    )
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+def test_open_sockets_do_not_hold_pooled_connections(engine, client):
+    with Session(engine) as session:
+        users = [
+            User(id=str(uuid4()), username=f"student{i}", email=f"student{i}@test.com", hashed_password="x",
+                 role="admin" if i == 0 else "user")
+            for i in range(5)
+        ]
+        session.add_all(users)
+        session.commit()
+        community = Community(name="Workshop", owner_id=users[0].id)
+        session.add(community)
+        session.commit()
+        channel = Channel(name="general", slug="general", community_id=community.id)
+        session.add(channel)
+        session.commit()
+        user_ids, channel_id = [u.id for u in users], channel.id
+
+    # Five times as many sockets as pooled connections, each authenticated and subscribed
+    with ExitStack() as stack:
+        for i in range(5):
+            ws = stack.enter_context(
+                client.websocket_connect(f"/ws/community/global?token={create_access_token({'sub': f'student{i}'})}")
+            )
+            ws.send_json({"type": "subscribe", "topics": [channel_topic(channel_id)]})
+            assert ws.receive_json()["topics"] == [channel_topic(channel_id)]
+
+        assert engine.pool.checkedout() == 0
+        # Metrics are admin-only
+        assert client.get("/api/system/metrics").status_code == 401
+        as_student = {"Authorization": f"Bearer {create_access_token({'sub': 'student1'})}"}
+        assert client.get("/api/system/metrics", headers=as_student).status_code == 403
+        as_admin = {"Authorization": f"Bearer {create_access_token({'sub': 'student0'})}"}
+        metrics = client.get("/api/system/metrics", headers=as_admin).json()
+        assert metrics["websocket"]["open_connections"] == 5
+
+        # HTTP requests still get a connection straight away
+        def current_user_override(session: Session = Depends(get_session)):
+            return session.get(User, user_ids[0])
+        app.dependency_overrides[get_current_user] = current_user_override
+        response = client.post(f"/api/v1/community/channels/{channel_id}/messages", json={"content": "hello"})
+        assert response.status_code == 200
+        assert ws.receive_json()["content"] == "hello"
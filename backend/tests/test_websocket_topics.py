@@ -0,0 +1,214 @@
+import sys
+import os
+from uuid import uuid4
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import msgpack
+import pytest
+from fastapi import Depends
+from sqlmodel import Session, select
+from app.main import app, get_session
+from app.schemas import User, Community, CommunityMember, Channel, StudyGroup, Message
+from app.dependencies import get_current_user, create_access_token
+from app.websocket_manager import manager, channel_topic, community_topic, dm_topic
+
+pytestmark = pytest.mark.usefixtures("portal")
+
+def act_as(user_id):
+    def current_user_override(session: Session = Depends(get_session)):
+        return session.get(User, user_id)
+    app.dependency_overrides[get_current_user] = current_user_override
+
+def seed(engine):
+    with Session(engine) as session:
+        alice, bob = [
+            User(id=str(uuid4()), username=name, email=f"{name}@test.com", hashed_password="x")
+            for name in ("alice", "bob")
+        ]
+        session.add_all([alice, bob])
+        session.commit()
+        community = Community(name="Workshop", owner_id=bob.id)
+        session.add(community)
+        session.commit()
+        session.add(CommunityMember(community_id=community.id, user_id=alice.id))
+        group = StudyGroup(name="Private", community_id=community.id, creator_id=bob.id)
+        session.add(group)
+        session.commit()
+        general = Channel(name="general", slug="general", community_id=community.id)
+        private = Channel(name="private", slug="private", community_id=community.id, study_group_id=group.id)
+        session.add_all([general, private])
+        session.commit()
+        return alice.id, bob.id, community.id, general.id, private.id
+
+def test_channel_events_reach_only_subscribers(engine, client):
+    alice, bob, community_id, general, private = seed(engine)
+    token = create_access_token({"sub": "alice"})
+
+    with client.websocket_connect(f"/ws/community/global?token={token}") as ws:
+        ws.send_json({
+            "type": "subscribe",
+            "topics": [channel_topic(general), community_topic(community_id), channel_topic(private), "bogus"],
+        })
+        ack = ws.receive_json()
+        assert ack["type"] == "subscribed"
+        assert ack["topics"] == [channel_topic(general), community_topic(community_id)]
+        # Not a member of the study group behind the private channel
+        assert ack["rejected"] == [channel_topic(private), "bogus"]
+
+        act_as(bob)
+        response = client.post(f"/api/v1/community/channels/{general}/messages", json={"content": "hello"})
+        assert response.status_code == 200
+
+        event = ws.receive_json()
+        assert event["type"] == "message"
+        assert event["content"] == "hello"
+        event = ws.receive_json()
+        assert event["type"] == "unread_delta"
+        assert event["channel_id"] == general
+
+        ws.send_json({"type": "unsubscribe", "topics": [channel_topic(general)]})
+        assert ws.receive_json() == {"type": "unsubscribed", "topics": [channel_topic(general)]}
+        assert alice not in manager.subscribed_users(channel_topic(general))
+
+    # Disconnecting drops every remaining subscription
+    assert alice not in manager.subscribed_users(community_topic(community_id))
+
+def test_msgpack_subprotocol_uses_binary_frames(engine, client):
+    alice, bob, community_id, general, private = seed(engine)
+    token = create_access_token({"sub": "alice"})
+
+    url = f"/ws/community/global?token={token}"
+    with client.websocket_connect(url, subprotocols=["msgpack", "json"]) as ws:
+        assert ws.accepted_subprotocol == "msgpack"
+        ws.send_bytes(msgpack.packb({"type": "subscribe", "topics": [channel_topic(general)]}))
+        ack = msgpack.unpackb(ws.receive_bytes())
+        assert (ack["type"], ack["topics"], ack["rejected"]) == ("subscribed", [channel_topic(general)], [])
+
+    # No subprotocol requested: JSON text frames as before
+    with client.websocket_connect(url) as ws:
+        assert ws.accepted_subprotocol is None
+        ws.send_json({"type": "subscribe", "topics": [channel_topic(general)]})
+        assert ws.receive_json()["topics"] == [channel_topic(general)]
+
+def test_reconnect_replays_only_missed_events(engine, client):
+    alice, bob, community_id, general, private = seed(engine)
+    token = create_access_token({"sub": "alice"})
+    url = f"/ws/community/global?token={token}"
+    topic = channel_topic(general)
+    act_as(bob)
+
+    client.post(f"/api/v1/community/channels/{general}/messages", json={"content": "before"})
+    with client.websocket_connect(url) as ws:
+        ws.send_json({"type": "subscribe", "topics": [topic]})
+        ack = ws.receive_json()
+        epoch, last_seq = ack["epoch"], ack["seq"][topic]
+        client.post(f"/api/v1/community/channels/{general}/messages", json={"content": "seen"})
+        event = ws.receive_json()
+        assert (event["content"], event["topic"], event["seq"]) == ("seen", topic, last_seq + 1)
+        last_seq = event["seq"]
+
+    # Network blip: two messages go out while alice is away
+    for content in ("missed 1", "missed 2"):
+        client.post(f"/api/v1/community/channels/{general}/messages", json={"content": content})
+
+    with client.websocket_connect(url) as ws:
+        ws.send_json({"type": "subscribe", "topics": [topic], "epoch": epoch, "since": {topic: last_seq}})
+        ack = ws.receive_json()
+        assert ack["resync"] == [] and ack["seq"][topic] == last_seq + 2
+        assert [ws.receive_json()["content"] for _ in range(2)] == ["missed 1", "missed 2"]
+
+    # Resuming against another worker's (or a restarted worker's) numbering needs a refetch
+    with client.websocket_connect(url) as ws:
+        ws.send_json({"type": "subscribe", "topics": [topic], "epoch": "elsewhere", "since": {topic: last_seq}})
+        assert ws.receive_json()["resync"] == [topic]
+
+def test_chat_commands_over_socket_are_acknowledged(engine, client):
+    alice, bob, community_id, general, private = seed(engine)
+    token = create_access_token({"sub": "alice"})
+
+    with client.websocket_connect(f"/ws/community/global?token={token}") as ws:
+        ws.send_json({"type": "subscribe", "topics": [channel_topic(general)]})
+        assert ws.receive_json()["type"] == "subscribed"
+
+        command = {"type": "send_message", "client_id": "c1", "channel_id": general, "content": "  hello  "}
+        ws.send_json(command)
+        assert ws.receive_json()["type"] == "message"
+        ack = ws.receive_json()
+        assert ack["type"] == "ack" and ack["client_id"] == "c1" and ack["ok"]
+        # Same validation as the REST handler (content is stripped)
+        assert ack["result"]["content"] == "hello"
+        message_id = ack["result"]["id"]
+
+        # A retried client_id is acknowledged again without a second insert
+        ws.send_json(command)
+        assert ws.receive_json() == ack
+        with Session(engine) as session:
+            assert len(session.exec(select(Message)).all()) == 1
+
+        ws.send_json({"type": "edit_message", "client_id": "c2", "channel_id": general,
+                      "message_id": message_id, "content": "hello again"})
+        assert ws.receive_json()["type"] == "message_edited"
+        assert ws.receive_json()["result"]["content"] == "hello again"
+
+        ws.send_json({"type": "send_message", "client_id": "c3", "channel_id": general, "content": "   "})
+        ack = ws.receive_json()
+        assert not ack["ok"] and ack["status"] == 422
+
+        ws.send_json({"type": "vote", "client_id": "c4", "channel_id": general, "message_id": message_id, "value": 5})
+        ack = ws.receive_json()
+        assert (ack["ok"], ack["status"]) == (False, 400)
+
+        ws.send_json({"type": "typing", "client_id": "c5", "channel_id": private})
+        ack = ws.receive_json()
+        assert (ack["ok"], ack["status"]) == (False, 403)
+
+        ws.send_json({"type": "typing", "client_id": "c6", "channel_id": general})
+        assert ws.receive_json()["result"] == {"emitted": True}
+        ws.send_json({"type": "typing", "client_id": "c7", "channel_id": general})
+        assert ws.receive_json()["result"] == {"emitted": False}
+
+def test_online_users_filtered_by_community(engine, client):
+    alice, bob, community_id, general, private = seed(engine)
+    token = create_access_token({"sub": "alice"})
+    act_as(bob)
+
+    with client.websocket_connect(f"/ws/community/global?token={token}"):
+        assert client.get("/api/v1/community/users/online").json() == [alice]
+        assert client.get("/api/v1/community/users/online", params={"community_id": community_id}).json() == [alice]
+        assert client.get("/api/v1/community/users/online", params={"community_id": "elsewhere"}).json() == []
+
+def test_dm_messages_are_published_to_the_conversation_topic(engine, client):
+    alice, bob, community_id, general, private = seed(engine)
+    act_as(bob)
+    conversation_id = client.post(f"/api/v1/community/dms/{alice}").json()["id"]
+    token = create_access_token({"sub": "alice"})
+
+    with client.websocket_connect(f"/ws/community/global?token={token}") as ws:
+        ws.send_json({"type": "subscribe", "topics": [dm_topic(conversation_id), dm_topic("someone-elses")]})
+        ack = ws.receive_json()
+        assert (ack["topics"], ack["rejected"]) == ([dm_topic(conversation_id)], [dm_topic("someone-elses")])
+
+        response = client.post(f"/api/v1/community/dms/{conversation_id}/messages", json={"content": "hi alice"})
+        assert response.status_code == 200
+        event = ws.receive_json()
+        assert (event["type"], event["content"], event["topic"]) == ("dm_message", "hi alice", dm_topic(conversation_id))
+        # The per-user copy carries the same id, so the open view can drop it
+        copy = ws.receive_json()
+        assert (copy["type"], copy["id"]) == ("dm_message", event["id"]) and "topic" not in copy
+
+def test_dm_recipient_is_notified_without_the_conversation_open(engine, client):
+    alice, bob, community_id, general, private = seed(engine)
+    act_as(bob)
+    conversation_id = client.post(f"/api/v1/community/dms/{alice}").json()["id"]
+    token = create_access_token({"sub": "alice"})
+
+    with client.websocket_connect(f"/ws/community/global?token={token}") as ws:
+        ws.send_json({"type": "subscribe", "topics": [channel_topic(general)]})
+        assert ws.receive_json()["type"] == "subscribed"
+
+        response = client.post(f"/api/v1/community/dms/{conversation_id}/messages", json={"content": "are you there?"})
+        assert response.status_code == 200
+        event = ws.receive_json()
+        assert (event["type"], event["conversation_id"], event["content"]) == (
+            "dm_message", conversation_id, "are you there?"
+        )
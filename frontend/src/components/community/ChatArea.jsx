@@ -13,6 +13,9 @@ const ChatArea = () => {
         currentCommunity,
         messages,
         sendMessage,
+        notifyTyping,
+        typingUsers,
+        members,
         editMessage,
         deleteMessage,
         voteMessage,
@@ -493,6 +496,14 @@ const ChatArea = () => {
                                 ))}
                             </div>
                         )}
+                        {typingUsers.length > 0 && (
+                            <div className="px-6 pt-2 text-xs text-slate-500 italic">
+                                {typingUsers
+                                    .map(id => members?.find(m => m.user_id === id)?.user_email?.split('@')[0] || 'Someone')
+                                    .join(', ')}
+                                {typingUsers.length === 1 ? ' is typing…' : ' are typing…'}
+                            </div>
+                        )}
                         <form className="flex items-end gap-3 px-5 py-3" onSubmit={handleSend}>
                             <button
                                 type="button"
@@ -507,7 +518,7 @@ const ChatArea = () => {
                                 className="flex-1 bg-transparent border-none focus:outline-none text-slate-700 placeholder-slate-500 py-2.5 text-[15px] resize-none max-h-40"
                                 placeholder={`Message #${currentChannel.name}`}
                                 value={inputValue}
-                                onChange={e => setInputValue(e.target.value)}
+                                onChange={e => { setInputValue(e.target.value); notifyTyping(); }}
                                 onKeyDown={handleInputKeyDown}
                                 rows={1}
                             />
@@ -44,6 +44,11 @@ export const CommunityProvider = ({ children }) => {
     const currentChannelRef = useRef(currentChannel);
     const currentDMRef = useRef(currentDM);
     const viewModeRef = useRef(viewMode);
+    // Topics this socket is subscribed to on the server (channel:, community:, dm:)
+    const subscribedTopicsRef = useRef(new Set());
+    // Last event seq seen per subscribed topic, and the server epoch they belong to (for resuming)
+    const lastSeqRef = useRef({});
+    const epochRef = useRef(null);
 
     useEffect(() => { currentChannelRef.current = currentChannel; }, [currentChannel]);
     useEffect(() => { currentDMRef.current = currentDM; }, [currentDM]);
@@ -55,6 +60,13 @@ export const CommunityProvider = ({ children }) => {
 
     // WebSocket ref
     const wsRef = useRef(null);
+    // Commands sent over the socket awaiting their ack, by client_id
+    const pendingCommandsRef = useRef(new Map());
+
+    // Typing indicators: channelId -> user IDs currently typing there (server-throttled, self-expiring)
+    const [typingByChannel, setTypingByChannel] = useState({});
+    const typingTimersRef = useRef(new Map());
+    const lastTypingSentRef = useRef(0);
     const wsReconnectTimeout = useRef(null);
     const wsReconnectDelay = useRef(1000); // Start at 1s, cap at 30s
     const [isConnected, setIsConnected] = useState(false);
@@ -219,8 +231,67 @@ export const CommunityProvider = ({ children }) => {
         }
     };
 
+    const socketOpen = () => wsRef.current?.readyState === WebSocket.OPEN;
+
+    // Send a chat command over the socket; resolves with the server's ack ({ ok, result | status, error })
+    const sendCommand = (command) => new Promise((resolve, reject) => {
+        if (!socketOpen()) {
+            reject(new Error('WebSocket not connected'));
+            return;
+        }
+        const clientId = crypto.randomUUID();
+        const timer = setTimeout(() => {
+            pendingCommandsRef.current.delete(clientId);
+            reject(new Error('Timed out waiting for ack'));
+        }, 10000);
+        pendingCommandsRef.current.set(clientId, { resolve, reject, timer });
+        wsRef.current.send(JSON.stringify({ ...command, client_id: clientId }));
+    });
+
+    const stopTyping = useCallback((channelId, userId) => {
+        const key = `${channelId}:${userId}`;
+        clearTimeout(typingTimersRef.current.get(key));
+        typingTimersRef.current.delete(key);
+        setTypingByChannel(prev => {
+            if (!prev[channelId]?.includes(userId)) return prev;
+            return { ...prev, [channelId]: prev[channelId].filter(id => id !== userId) };
+        });
+    }, []);
+
+    const startTyping = useCallback((channelId, userId, expiresInMs) => {
+        const key = `${channelId}:${userId}`;
+        clearTimeout(typingTimersRef.current.get(key));
+        // Expire locally too in case the typing_stopped event is missed
+        typingTimersRef.current.set(key, setTimeout(() => stopTyping(channelId, userId), expiresInMs || 6000));
+        setTypingByChannel(prev => {
+            if (prev[channelId]?.includes(userId)) return prev;
+            return { ...prev, [channelId]: [...(prev[channelId] || []), userId] };
+        });
+    }, [stopTyping]);
+
+    // Call on keystrokes; the server coalesces, this just avoids sending a frame per key
+    const notifyTyping = () => {
+        if (!currentChannel || !socketOpen()) return;
+        const now = Date.now();
+        if (now - lastTypingSentRef.current < 1000) return;
+        lastTypingSentRef.current = now;
+        wsRef.current.send(JSON.stringify({ type: 'typing', channel_id: currentChannel.id }));
+    };
+
     const sendMessage = async (content) => {
         if (!currentChannel || !content.trim()) return;
+        lastTypingSentRef.current = 0;
+
+        if (socketOpen()) {
+            try {
+                // The message itself arrives through the channel subscription
+                const ack = await sendCommand({ type: 'send_message', channel_id: currentChannel.id, content });
+                if (!ack.ok) console.error("Failed to send message", ack.error);
+            } catch (error) {
+                console.error("Failed to send message", error);
+            }
+            return;
+        }
 
         try {
             // We deliberately do NOT add the message to state here.
@@ -242,6 +313,21 @@ export const CommunityProvider = ({ children }) => {
 
     const editMessage = async (messageId, content) => {
         if (!currentChannel || !content.trim()) return null;
+        if (socketOpen()) {
+            try {
+                const ack = await sendCommand({
+                    type: 'edit_message', channel_id: currentChannel.id, message_id: messageId, content
+                });
+                if (ack.ok) {
+                    setMessages(prev => prev.map(msg => msg.id === messageId ? ack.result : msg));
+                    return ack.result;
+                }
+                console.error("Failed to edit message", ack.error);
+            } catch (error) {
+                console.error("Failed to edit message", error);
+            }
+            return null;
+        }
         try {
             const response = await fetch(`${API_BASE}/channels/${currentChannel.id}/messages/${messageId}`, {
                 method: 'PUT',
@@ -264,6 +350,21 @@ export const CommunityProvider = ({ children }) => {
 
     const deleteMessage = async (messageId) => {
         if (!currentChannel) return false;
+        if (socketOpen()) {
+            try {
+                const ack = await sendCommand({
+                    type: 'delete_message', channel_id: currentChannel.id, message_id: messageId
+                });
+                if (ack.ok) {
+                    setMessages(prev => prev.filter(msg => msg.id !== messageId));
+                    return true;
+                }
+                console.error("Failed to delete message", ack.error);
+            } catch (error) {
+                console.error("Failed to delete message", error);
+            }
+            return false;
+        }
         try {
             const response = await fetch(`${API_BASE}/channels/${currentChannel.id}/messages/${messageId}`, {
                 method: 'DELETE',
@@ -281,6 +382,21 @@ export const CommunityProvider = ({ children }) => {
 
     const voteMessage = async (messageId, value) => {
         if (!currentChannel) return;
+        if (socketOpen()) {
+            try {
+                const ack = await sendCommand({
+                    type: 'vote', channel_id: currentChannel.id, message_id: messageId, value
+                });
+                if (ack.ok) {
+                    setMessages(prev => prev.map(msg => msg.id === messageId ? ack.result : msg));
+                } else {
+                    console.error("Failed to vote", ack.error);
+                }
+            } catch (error) {
+                console.error("Failed to vote", error);
+            }
+            return;
+        }
         try {
             const response = await fetch(
                 `${API_BASE}/channels/${currentChannel.id}/messages/${messageId}/vote?vote_value=${value}`,
@@ -464,6 +580,14 @@ export const CommunityProvider = ({ children }) => {
         }
     }, [currentChannel, token]);
 
+    // Reload what a topic shows when its missed events could not be replayed
+    const resyncTopic = (topic) => {
+        const [kind, id] = topic.split(':');
+        if (kind === 'channel' && id === String(currentChannelRef.current?.id)) fetchMessages(id);
+        else if (kind === 'community') fetchChannels(id);
+        else if (kind === 'dm' && id === String(currentDMRef.current?.id)) fetchDMMessages(id);
+    };
+
     // WebSocket connection for real-time messaging
     const connectWebSocket = useCallback(() => {
         if (!token) return;
@@ -481,6 +605,7 @@ export const CommunityProvider = ({ children }) => {
         wsRef.current = ws;
 
         ws.onopen = () => {
+            subscribedTopicsRef.current = new Set(); // Fresh socket starts with no subscriptions
             setIsConnected(true);
             wsReconnectDelay.current = 1000; // Reset backoff on success
             console.log('[WS] Connected');
@@ -489,8 +614,36 @@ export const CommunityProvider = ({ children }) => {
         ws.onmessage = (event) => {
             try {
                 const data = JSON.parse(event.data);
+                if (data.topic && data.seq) {
+                    lastSeqRef.current[data.topic] = Math.max(lastSeqRef.current[data.topic] || 0, data.seq);
+                }
 
-                if (data.type === 'message' || data.type === 'reply') {
+                if (data.type === 'subscribed') {
+                    epochRef.current = data.epoch;
+                    data.topics.forEach(topic => {
+                        // Resumed topics keep their seq until the replayed events arrive
+                        if (!(topic in lastSeqRef.current) || data.resync.includes(topic)) {
+                            lastSeqRef.current[topic] = data.seq[topic];
+                        }
+                    });
+                    // Missed events are gone from the server's buffer: refetch instead
+                    data.resync.forEach(resyncTopic);
+                } else if (data.type === 'ping') {
+                    // Server heartbeat: answer so this socket is not reaped as idle
+                    ws.send(JSON.stringify({ type: 'pong' }));
+                } else if (data.type === 'ack') {
+                    const pending = pendingCommandsRef.current.get(data.client_id);
+                    if (pending) {
+                        clearTimeout(pending.timer);
+                        pendingCommandsRef.current.delete(data.client_id);
+                        pending.resolve(data);
+                    }
+                } else if (data.type === 'typing') {
+                    startTyping(data.channel_id, data.user_id, data.expires_in_ms);
+                } else if (data.type === 'typing_stopped') {
+                    stopTyping(data.channel_id, data.user_id);
+                } else if (data.type === 'message' || data.type === 'reply') {
+                    stopTyping(data.channel_id, data.user_id);
                     setMessages(prev => {
                         if (prev.some(m => m.id === data.id)) return prev;
                         if (data.channel_id !== currentChannelRef.current?.id || viewModeRef.current !== 'community') {
@@ -511,19 +664,25 @@ export const CommunityProvider = ({ children }) => {
                             reply_count: 0
                         }];
                     });
+                } else if (data.type === 'unread_delta') {
+                    // Published on the community topic for channels we are not viewing
+                    if (data.channel_id !== currentChannelRef.current?.id || viewModeRef.current !== 'community') {
+                        setUnreadChannels(p => new Set([...p, data.channel_id]));
+                    }
                 } else if (data.type === 'message_edited') {
                     setMessages(prev => prev.map(msg =>
                         msg.id === data.id ? { ...msg, content: data.content } : msg
                     ));
                 } else if (data.type === 'message_deleted') {
                     setMessages(prev => prev.filter(msg => msg.id !== data.id));
-                } else if (data.type === 'user_online') {
+                } else if (data.type === 'presence_diff') {
+                    // Batched presence changes: users who came online / went offline since the last diff
                     setOnlineUsers(prev => {
-                        if (prev.includes(data.user_id)) return prev;
-                        return [...prev, data.user_id];
+                        const next = new Set(prev);
+                        data.online.forEach(id => next.add(id));
+                        data.offline.forEach(id => next.delete(id));
+                        return [...next];
                     });
-                } else if (data.type === 'user_offline') {
-                    setOnlineUsers(prev => prev.filter(id => id !== data.user_id));
                 } else if (data.type === 'dm_message') {
                     // Always deduplicate by ID — sender no longer adds to state locally
                     if (data.conversation_id === currentDMRef.current?.id && viewModeRef.current === 'dms') {
@@ -555,6 +714,12 @@ export const CommunityProvider = ({ children }) => {
 
         ws.onclose = (event) => {
             setIsConnected(false);
+            // Commands still waiting for an ack will never get one on this socket
+            pendingCommandsRef.current.forEach(({ reject, timer }) => {
+                clearTimeout(timer);
+                reject(new Error('WebSocket closed'));
+            });
+            pendingCommandsRef.current.clear();
             // Reconnect with exponential backoff — skip on intentional close (1000)
             if (event.code !== 1000 && token) {
                 const delay = wsReconnectDelay.current;
@@ -582,6 +747,32 @@ export const CommunityProvider = ({ children }) => {
         };
     }, [token, connectWebSocket]);
 
+    // Keep server-side topic subscriptions in sync with what is open
+    useEffect(() => {
+        const ws = wsRef.current;
+        if (!isConnected || !ws || ws.readyState !== WebSocket.OPEN) return;
+
+        const wanted = new Set();
+        if (currentCommunity) wanted.add(`community:${currentCommunity.id}`);
+        if (currentChannel) wanted.add(`channel:${currentChannel.id}`);
+        if (currentDM) wanted.add(`dm:${currentDM.id}`);
+
+        const current = subscribedTopicsRef.current;
+        const toAdd = [...wanted].filter(t => !current.has(t));
+        const toRemove = [...current].filter(t => !wanted.has(t));
+        if (toRemove.length) {
+            ws.send(JSON.stringify({ type: 'unsubscribe', topics: toRemove }));
+            toRemove.forEach(t => delete lastSeqRef.current[t]);
+        }
+        if (toAdd.length) {
+            // After a reconnect, ask for only the events missed on the topics we still had open
+            const since = {};
+            toAdd.forEach(t => { if (t in lastSeqRef.current) since[t] = lastSeqRef.current[t]; });
+            ws.send(JSON.stringify({ type: 'subscribe', topics: toAdd, epoch: epochRef.current, since }));
+        }
+        subscribedTopicsRef.current = wanted;
+    }, [isConnected, currentCommunity, currentChannel, currentDM]);
+
     // When DM changes, fetch DM messages
     useEffect(() => {
         if (currentDM && token) {
@@ -1007,6 +1198,8 @@ export const CommunityProvider = ({ children }) => {
         // Messages
         messages,
         sendMessage,
+        notifyTyping,
+        typingUsers: (currentChannel && typingByChannel[currentChannel.id]) || [],
         editMessage,
         deleteMessage,
         voteMessage,
@@ -8,6 +8,10 @@ import { useAuth } from '../context/AuthContext';
 
 const API_BASE = API_BASE_URL;
 
+// PDFs are processed in the background after the upload; stop waiting after a while
+const PROCESSING_POLL_MS = 1500;
+const PROCESSING_WAIT_MS = 3 * 60 * 1000;
+
 const StudySuite = () => {
     const { accessToken: token } = useAuth(); // Use auth context instead of direct localStorage
 
@@ -16,6 +20,8 @@ const StudySuite = () => {
     const [documentContent, setDocumentContent] = useState('');
     const [isLoadingDoc, setIsLoadingDoc] = useState(false);
     const [isUploading, setIsUploading] = useState(false);
+    const [stillProcessing, setStillProcessing] = useState(null); // filename of an upload we stopped waiting for
+    const pollController = useRef(null);
 
     const [isDragging, setIsDragging] = useState(false);
 
@@ -47,6 +53,7 @@ const StudySuite = () => {
     useEffect(() => {
         fetchDocuments();
         fetchSubjects();
+        return () => pollController.current?.abort(); // Stop polling upload status on unmount
     }, []);
 
     const fetchSubjects = async () => {
@@ -81,6 +88,33 @@ const StudySuite = () => {
         }
     };
 
+    // Poll until ready or failed; resolves to the last status seen ("processing" after the deadline), null on error
+    const waitUntilProcessed = async (docId, signal) => {
+        const deadline = Date.now() + PROCESSING_WAIT_MS;
+        let data = { status: 'processing' };
+        while (Date.now() < deadline) {
+            await new Promise((resolve, reject) => {
+                const onAbort = () => {
+                    clearTimeout(timer);
+                    reject(new DOMException('Aborted', 'AbortError'));
+                };
+                const timer = setTimeout(() => {
+                    signal.removeEventListener('abort', onAbort);
+                    resolve();
+                }, PROCESSING_POLL_MS);
+                signal.addEventListener('abort', onAbort, { once: true });
+            });
+            const res = await fetch(`${API_BASE}/api/v1/tutor/documents/${docId}/status`, {
+                headers: { 'Authorization': `Bearer ${token}` },
+                signal
+            });
+            if (!res.ok) return null;
+            data = await res.json();
+            if (data.status !== 'processing') return data;
+        }
+        return data;
+    };
+
     const uploadFile = async (file) => {
         if (!token) {
             alert("Authentication token missing. Please log in again.");
@@ -89,6 +123,7 @@ const StudySuite = () => {
         if (!file) return;
 
         setIsUploading(true);
+        setStillProcessing(null);
         const formData = new FormData();
         formData.append('file', file);
 
@@ -100,6 +135,21 @@ const StudySuite = () => {
             });
             if (res.ok) {
                 const newDoc = await res.json();
+                if (newDoc.status === 'processing') {
+                    fetchDocuments();
+                    pollController.current?.abort();
+                    pollController.current = new AbortController();
+                    const processed = await waitUntilProcessed(newDoc.id, pollController.current.signal);
+                    if (processed?.status === 'processing') {
+                        setStillProcessing(newDoc.filename);
+                        return;
+                    }
+                    if (processed?.status !== 'ready') {
+                        fetchDocuments();
+                        alert(`Upload failed: ${processed?.error || 'Could not process file'}`);
+                        return;
+                    }
+                }
                 fetchDocuments();
                 handleSelectDocument(newDoc.id);
             } else {
@@ -107,6 +157,7 @@ const StudySuite = () => {
                 alert(`Upload failed: ${errData.detail || 'Unknown error'}`);
             }
         } catch (e) {
+            if (e.name === 'AbortError') return; // Left the page
             console.error("Upload error", e);
             alert('Upload failed.');
         } finally {
@@ -184,14 +235,43 @@ const StudySuite = () => {
                 parts: [m.content]
             }));
 
-            const res = await fetch(`${API_BASE}/api/v1/tutor/chat`, {
+            const res = await fetch(`${API_BASE}/api/v1/tutor/chat/stream`, {
                 method: 'POST',
                 headers: { 'Authorization': `Bearer ${token}`, 'Content-Type': 'application/json' },
                 body: JSON.stringify({ document_id: selectedDoc, message: userMessage, history }),
             });
             if (res.ok) {
-                const data = await res.json();
-                setMessages(prev => [...prev, { role: 'model', content: data.response }]);
+                // Server-Sent Events: the reply grows in place as tokens arrive
+                let reply = '';
+                const showReply = (content) => setMessages(prev => [...prev.slice(0, -1), { role: 'model', content }]);
+                setMessages(prev => [...prev, { role: 'model', content: '' }]);
+
+                const reader = res.body.getReader();
+                const decoder = new TextDecoder();
+                let buffer = '';
+                while (true) {
+                    const { value, done } = await reader.read();
+                    if (done) break;
+                    buffer += decoder.decode(value, { stream: true });
+                    let end;
+                    while ((end = buffer.indexOf('\n\n')) !== -1) {
+                        const frame = buffer.slice(0, end);
+                        buffer = buffer.slice(end + 2);
+                        const event = frame.match(/^event: (.*)$/m)?.[1];
+                        const data = JSON.parse(frame.match(/^data: (.*)$/m)?.[1] || '{}');
+                        if (event === 'start' || event === 'token') {
+                            reply += data.text;
+                            showReply(reply);
+                        } else if (event === 'done') {
+                            showReply(data.response);
+                        } else if (event === 'error') {
+                            // Keep whatever arrived before the failure
+                            showReply(data.partial
+                                ? `${data.partial}\n\n[Response interrupted: ${data.detail}]`
+                                : `Error: ${data.detail}`);
+                        }
+                    }
+                }
             } else {
                 const errorData = await res.json();
                 setMessages(prev => [...prev, { role: 'model', content: `Error: ${errorData.detail || 'Sorry, I encountered an error. Please try again.'}` }]);
@@ -206,6 +286,8 @@ const StudySuite = () => {
 
     const handleGenerate = async (type) => {
         if (!selectedDoc || isGenerating) return;
+        // Pressing the button again while its result is shown asks for a new variant
+        const fresh = generatedContent?.type === type;
         setIsGenerating(true);
         setGenType(type);
         setGeneratedContent(null);
@@ -218,7 +300,7 @@ const StudySuite = () => {
             const res = await fetch(`${API_BASE}/api/v1/tutor/generate/${type}`, {
                 method: 'POST',
                 headers: { 'Authorization': `Bearer ${token}`, 'Content-Type': 'application/json' },
-                body: JSON.stringify({ document_id: selectedDoc }),
+                body: JSON.stringify({ document_id: selectedDoc, fresh }),
             });
             if (res.ok) {
                 const data = await res.json();
@@ -378,12 +460,18 @@ const StudySuite = () => {
                     {documents.length > 0 && (
                         <div className="p-2 border-b border-slate-100 flex gap-2 overflow-x-auto">
                             {documents.map(doc => (
-                                <button key={doc.id} onClick={() => handleSelectDocument(doc.id)} className={`px-3 py-1 text-sm rounded-full whitespace-nowrap transition-all ${selectedDoc === doc.id ? 'bg-primary text-white font-bold' : 'bg-slate-100 text-slate-600 hover:bg-slate-200'}`}>
-                                    {doc.filename}
+                                <button key={doc.id} onClick={() => handleSelectDocument(doc.id)} disabled={doc.status && doc.status !== 'ready'} className={`px-3 py-1 text-sm rounded-full whitespace-nowrap transition-all disabled:opacity-50 ${selectedDoc === doc.id ? 'bg-primary text-white font-bold' : 'bg-slate-100 text-slate-600 hover:bg-slate-200'}`}>
+                                    {doc.filename}{doc.status === 'processing' ? ' (processing…)' : doc.status === 'failed' ? ' (failed)' : ''}
                                 </button>
                             ))}
                         </div>
                     )}
+                    {stillProcessing && (
+                        <div className="px-4 py-2 border-b border-slate-100 bg-amber-50 text-amber-800 text-sm flex items-center justify-between gap-2">
+                            <span>"{stillProcessing}" is still being processed. It can be opened once it is ready.</span>
+                            <button onClick={() => { setStillProcessing(null); fetchDocuments(); }} className="font-semibold hover:underline whitespace-nowrap">Check again</button>
+                        </div>
+                    )}
                     {/* Content */}
                     <div className="flex-grow overflow-hidden bg-slate-50/50">
                         {isLoadingDoc ? <div className="flex justify-center items-center h-full"><Loader2 className="animate-spin text-4xl text-primary" /></div> :